@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+"""
+Batch decode benchmark.
+
+Decodes a capture once packet-by-packet with `telemetry.decode(...).as_dict()`
+and once with the vectorized `openloop.batch.decode_batch`. The capture can be
+tiled to simulate a full run.
+
+Run from the repository root:
+
+    python3 -m benchmarks.batch_decode --tile 100
+"""
+import argparse
+import time
+from openloop import telemetry
+from openloop import batch
+
+DEFAULT_CAPTURE = "tests/assets/hyperloop-telemetry.log.bin"
+
+
+def timed(func):
+    start = time.perf_counter()
+    result = func()
+    return result, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Batch decode benchmark")
+    parser.add_argument("capture", nargs="?", default=DEFAULT_CAPTURE,
+                        help="File of concatenated telemetry packets")
+    parser.add_argument("-t", "--tile", type=int, default=100,
+                        help="Repeat the capture this many times")
+    args = parser.parse_args()
+
+    with open(args.capture, "rb") as f:
+        data = f.read() * args.tile
+
+    def per_packet():
+        return [telemetry.decode(p).as_dict()
+                for p in telemetry.iter_packets(data)]
+
+    rows, looped = timed(per_packet)
+    decoded, vectorized = timed(lambda: batch.decode_batch(data))
+    _, exported = timed(lambda: list(batch.to_dicts(decoded)))
+
+    print("%d packets (%.1f MB)" % (len(rows), len(data) / 1e6))
+    print("%-26s %10.1f ms" % ("per-packet decode+as_dict", looped * 1e3))
+    print("%-26s %10.1f ms" % ("decode_batch", vectorized * 1e3))
+    print("%-26s %10.1f ms" % ("decode_batch -> to_dicts",
+                               (vectorized + exported) * 1e3))
+    print("speedup (decode_batch): %.0fx" % (looped / vectorized))
+
+
+if __name__ == "__main__":
+    main()
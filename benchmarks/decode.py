@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+"""
+Telemetry decode microbenchmark.
+
+Compares the original `ODSServer.parse_message` (struct.unpack into locals and
+a hand built dict) against the precompiled schema decoder in
+`openloop.telemetry`, using the packets in a capture file.
+
+Run from the repository root:
+
+    python3 -m benchmarks.decode
+"""
+import struct
+import argparse
+import time
+from openloop import telemetry
+
+DEFAULT_CAPTURE = "tests/assets/hyperloop-telemetry.log.bin"
+
+
+def legacy_parse_message(msg):
+    """The parse_message implementation that shipped before the schema"""
+    (version, size, state, solenoid_mask, timestamp,
+     position_x, position_y, position_z,
+     velocity_x, velocity_y, velocity_z,
+     acceleration_x, acceleration_y, acceleration_z,
+     pusher_0, pusher_1, pusher_2, pusher_3,
+     levitation_0, levitation_1, levitation_2, levitation_3,
+     levitation_4, levitation_5, levitation_6, levitation_7,
+     hp_pressure,
+     reg_pressure_0, reg_pressure_1, reg_pressure_2, reg_pressure_3,
+     clamp_pressure_0, clamp_pressure_1,
+     brake_tank_0, brake_tank_1,
+     hp_thermo,
+     reg_thermo_0, reg_thermo_1, reg_thermo_2, reg_thermo_3,
+     reg_surf_thermo_0, reg_surf_thermo_1,
+     reg_surf_thermo_2, reg_surf_thermo_3,
+     power_thermo_0, power_thermo_1, power_thermo_2, power_thermo_3,
+     clamp_thermo_0, clamp_thermo_1,
+     frame_thermo,
+     voltage_0, voltage_1,
+     current_0, current_1) = struct.unpack("<BHBIQ50f", msg)
+
+    return {
+        "state": state,
+        "version": version,
+        "solenoid_mask": solenoid_mask,
+        "SOL_SKATE_0": 1 if (solenoid_mask & telemetry.SKATE_0_MASK) else 0,
+        "SOL_SKATE_1": 1 if (solenoid_mask & telemetry.SKATE_1_MASK) else 0,
+        "SOL_SKATE_2": 1 if (solenoid_mask & telemetry.SKATE_2_MASK) else 0,
+        "SOL_SKATE_3": 1 if (solenoid_mask & telemetry.SKATE_3_MASK) else 0,
+        "SOL_CLAMP_ENG_0":
+            1 if (solenoid_mask & telemetry.CLAMP_ENG_0_MASK) else 0,
+        "SOL_CLAMP_REL_0":
+            1 if (solenoid_mask & telemetry.CLAMP_REL_0_MASK) else 0,
+        "SOL_CLAMP_ENG_1":
+            1 if (solenoid_mask & telemetry.CLAMP_ENG_1_MASK) else 0,
+        "SOL_CLAMP_REL_1":
+            1 if (solenoid_mask & telemetry.CLAMP_REL_1_MASK) else 0,
+        "PACK_A_ENG": 1 if (solenoid_mask & telemetry.PACK_A_ENG_MASK) else 0,
+        "PACK_B_ENG": 1 if (solenoid_mask & telemetry.PACK_B_ENG_MASK) else 0,
+        "SOL_HPFIL": 1 if (solenoid_mask & telemetry.HPFIL_MASK) else 0,
+        "SOL_VENT": 1 if (solenoid_mask & telemetry.VENT_MASK) else 0,
+        "pusher_present": 1 if (solenoid_mask & telemetry.PUSH_MASK) else 0,
+        "timestamp": timestamp,
+        "position_x": position_x,
+        "position_y": position_y,
+        "position_z": position_z,
+        "velocity_x": velocity_x,
+        "velocity_y": velocity_y,
+        "velocity_z": velocity_z,
+        "acceleration_x": acceleration_x,
+        "acceleration_y": acceleration_y,
+        "acceleration_z": acceleration_z,
+        "levitation_0": levitation_0,
+        "levitation_1": levitation_1,
+        "levitation_2": levitation_2,
+        "levitation_3": levitation_3,
+        "levitation_4": levitation_4,
+        "levitation_5": levitation_5,
+        "levitation_6": levitation_6,
+        "levitation_7": levitation_7,
+        "pusher_0": pusher_0,
+        "pusher_1": pusher_1,
+        "pusher_2": pusher_2,
+        "pusher_3": pusher_3,
+        "hp_pressure": hp_pressure,
+        "reg_pressure_0": reg_pressure_0,
+        "reg_pressure_1": reg_pressure_1,
+        "reg_pressure_2": reg_pressure_2,
+        "reg_pressure_3": reg_pressure_3,
+        "clamp_pressure_0": clamp_pressure_0,
+        "clamp_pressure_1": clamp_pressure_1,
+        "brake_tank_0": brake_tank_0,
+        "brake_tank_1": brake_tank_1,
+        "hp_thermo": hp_thermo,
+        "reg_thermo_0": reg_thermo_0,
+        "reg_thermo_1": reg_thermo_1,
+        "reg_thermo_2": reg_thermo_2,
+        "reg_thermo_3": reg_thermo_3,
+        "reg_surf_thermo_0": reg_surf_thermo_0,
+        "reg_surf_thermo_1": reg_surf_thermo_1,
+        "reg_surf_thermo_2": reg_surf_thermo_2,
+        "reg_surf_thermo_3": reg_surf_thermo_3,
+        "power_thermo_0": power_thermo_0,
+        "power_thermo_1": power_thermo_1,
+        "power_thermo_2": power_thermo_2,
+        "clamp_thermo_0": clamp_thermo_0,
+        "clamp_thermo_1": clamp_thermo_1,
+        "frame_thermo": frame_thermo,
+        "voltage_0": voltage_0,
+        "voltage_1": voltage_1,
+        "current_0": current_0,
+        "current_1": current_1,
+    }
+
+
+def bench(name, func, packets, repeat):
+    """Runs func over every packet repeat times and prints packets/sec"""
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for msg in packets:
+            func(msg)
+        elapsed = time.perf_counter() - start
+        if best is None or elapsed < best:
+            best = elapsed
+
+    rate = len(packets) / best
+    print("%-28s %12.0f packets/sec" % (name, rate))
+    return rate
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Telemetry decode benchmark")
+    parser.add_argument("capture", nargs="?", default=DEFAULT_CAPTURE,
+                        help="File of concatenated telemetry packets")
+    parser.add_argument("-n", "--repeat", type=int, default=20,
+                        help="Number of passes over the capture")
+    args = parser.parse_args()
+
+    with open(args.capture, "rb") as f:
+        data = f.read()
+
+    packets = [bytes(p) for p in telemetry.iter_packets(data)]
+    print("%d packets from %s" % (len(packets), args.capture))
+
+    before = bench("legacy parse_message", legacy_parse_message, packets,
+                   args.repeat)
+    after = bench("telemetry.decode", telemetry.decode, packets, args.repeat)
+    bench("telemetry.decode + as_dict",
+          lambda msg: telemetry.decode(msg).as_dict(), packets, args.repeat)
+
+    print("speedup (decode only): %.1fx" % (after / before))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""
+Heartbeat timing benchmark.
+
+Runs hearts with a callback that takes --work seconds (a ping round trip)
+and compares the original sleep-after-callback loop with the scheduled
+`Heart`: the mean period actually achieved, how far the last beat drifted
+from where it should have been, and the threads used for --hearts hearts.
+
+Run from the repository root:
+
+    python3 -m benchmarks.heart
+"""
+import time
+import argparse
+import threading
+from openloop.heart import Heart, Scheduler
+
+
+class LegacyHeart:
+    """Heart as it shipped before scheduling: sleep after the callback"""
+
+    def __init__(self, interval, callback):
+        self.interval = interval
+        self.callback = callback
+        self.running = False
+
+    def start(self):
+        self.running = True
+        while self.running:
+            self.callback(self)
+            time.sleep(self.interval)
+
+    def stop(self):
+        self.running = False
+
+
+def measure(name, make, args):
+    beats = [[] for _ in range(args.hearts)]
+
+    def callback(index):
+        def beat(_):
+            beats[index].append(time.monotonic())
+            time.sleep(args.work)
+        return beat
+
+    before = threading.active_count()
+    hearts = [make(args.interval, callback(i)) for i in range(args.hearts)]
+    for heart in hearts:
+        if isinstance(heart, LegacyHeart):
+            threading.Thread(target=heart.start, daemon=True).start()
+        else:
+            heart.start()
+    threads = threading.active_count() - before
+
+    time.sleep(args.duration)
+    for heart in hearts:
+        heart.stop()
+
+    times = beats[0]
+    period = (times[-1] - times[0]) / (len(times) - 1)
+    drift = times[-1] - (times[0] + (len(times) - 1) * args.interval)
+    print("%-10s period %7.1f ms   drift after %d beats %7.1f ms   "
+          "%d threads" % (name, period * 1000, len(times), drift * 1000,
+                          threads))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Heartbeat benchmark")
+    parser.add_argument("-i", "--interval", type=float, default=0.1)
+    parser.add_argument("-w", "--work", type=float, default=0.02,
+                        help="Seconds each callback takes")
+    parser.add_argument("-n", "--hearts", type=int, default=4)
+    parser.add_argument("-t", "--duration", type=float, default=3.0)
+    args = parser.parse_args()
+
+    print("%d hearts every %g ms, %g ms callbacks" % (
+        args.hearts, args.interval * 1000, args.work * 1000))
+    measure("legacy", LegacyHeart, args)
+    scheduler = Scheduler()
+    measure("scheduled", lambda interval, callback: Heart(
+        interval, callback, scheduler=scheduler), args)
+
+
+if __name__ == "__main__":
+    main()
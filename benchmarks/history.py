@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+"""
+Telemetry history benchmark.
+
+Fills a TelemetryHistory with the packets in a capture (repeated, with
+advancing timestamps) and reports the cost of an append and the latency of
+/history style queries against a full buffer, raw and downsampled.
+
+Run from the repository root:
+
+    python3 -m benchmarks.history
+"""
+import time
+import argparse
+import replay
+from openloop import telemetry
+from openloop.history import TelemetryHistory, DEFAULT_SIZE
+
+DEFAULT_CAPTURE = "tests/assets/hyperloop-telemetry.log.bin"
+
+
+def timed(func, repeat):
+    """Returns the best time of repeat calls to func in milliseconds"""
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        elapsed = time.perf_counter() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return best * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description="History benchmark")
+    parser.add_argument("capture", nargs="?", default=DEFAULT_CAPTURE)
+    parser.add_argument("-n", "--size", type=int, default=DEFAULT_SIZE,
+                        help="Packets the history holds")
+    parser.add_argument("-r", "--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    captured = [telemetry.decode(payload)
+                for _, payload in replay.load_packets(args.capture)]
+    # One packet per millisecond, wrapping the buffer once
+    packets = [captured[i % len(captured)]._replace(
+        timestamp=1500000000000000 + i * 1000,
+        velocity_x=float(i % 1000)) for i in range(args.size * 2)]
+
+    history = TelemetryHistory(args.size)
+    start = time.perf_counter()
+    for packet in packets:
+        history.append(packet)
+    append = (time.perf_counter() - start) / len(packets) * 1e6
+    print("%-36s %8.2f us" % ("append", append))
+
+    queries = [
+        ("1 field, all", dict(fields=["velocity_x"])),
+        ("4 fields, all", dict(fields=["velocity_x", "position_x",
+                                       "acceleration_x", "hp_pressure"])),
+        ("1 field, last 10 s", dict(fields=["velocity_x"], since=-10)),
+        ("4 fields, all, 500 buckets", dict(
+            fields=["velocity_x", "position_x", "acceleration_x",
+                    "hp_pressure"], buckets=500)),
+    ]
+    for name, kwargs in queries:
+        ms = timed(lambda: history.query(**kwargs), args.repeat)
+        print("%-36s %8.2f ms" % ("query " + name, ms))
+
+    print("%-36s %8.1f MB" % ("memory", history.stats()["bytes"] / 1e6))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+"""
+HTTP load test.
+
+Serves the ODS app from this process with each server under test while
+client processes, each holding one connection (kept alive where the server
+allows it), request a path as fast as they can. Reports requests/s and
+latency percentiles for:
+
+  /state           the latest telemetry
+  /ui/bench.js     a static file of --file-size bytes
+  /state (slow)    /state while one more client keeps a /commands call
+                   that takes --command-time seconds in flight
+
+Servers:
+
+  dev              app.run() as ODS used to start it (one request at a time)
+  dev-threaded     the development server with a thread per connection
+  pool             openloop.http.server with --workers threads
+
+Run from the repository root:
+
+    python3 -m benchmarks.http
+"""
+import os
+import time
+import argparse
+import tempfile
+import threading
+import http.client
+import multiprocessing
+from werkzeug.serving import make_server as make_dev_server
+import replay
+from openloop import telemetry
+from openloop.snapshot import SnapshotPublisher
+from openloop.http import server as http_server
+from openloop.http.app import app, set_ods, set_pod, set_web_root
+
+DEFAULT_CAPTURE = "tests/assets/hyperloop-telemetry.log.bin"
+
+
+class Server:
+    def __init__(self, state):
+        self.state = state
+        self.history = None
+        self.stream = None
+        self.snapshots = SnapshotPublisher(self)
+
+
+class SlowPod:
+    def __init__(self, delay):
+        self.delay = delay
+
+    def run(self, command):
+        time.sleep(self.delay)
+        return command
+
+
+def client(port, method, path, duration, results):
+    """Requests path until duration has passed, returns the latencies"""
+    conn = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+    latencies = []
+    deadline = time.monotonic() + duration
+    while time.monotonic() < deadline:
+        start = time.perf_counter()
+        conn.request(method, path, body=b"{}" if method == "POST" else None,
+                     headers={"Content-Type": "application/json"})
+        response = conn.getresponse()
+        response.read()
+        latencies.append(time.perf_counter() - start)
+        if response.will_close:
+            conn.close()
+    results.put(latencies)
+
+
+def percentile(values, p):
+    return values[min(len(values) - 1, int(len(values) * p))]
+
+
+def load(port, path, args, slow=False):
+    ctx = multiprocessing.get_context("fork")
+    results = ctx.Queue()
+    procs = [ctx.Process(target=client, args=(
+        port, "GET", path, args.duration, results))
+        for _ in range(args.clients)]
+    if slow:
+        procs.append(ctx.Process(target=client, args=(
+            port, "POST", "/commands/ping", args.duration, ctx.Queue())))
+    for proc in procs:
+        proc.start()
+
+    latencies = []
+    for _ in range(args.clients):
+        latencies.extend(results.get())
+    for proc in procs:
+        proc.join()
+
+    latencies.sort()
+    return {
+        "rate": len(latencies) / args.duration,
+        "p50": percentile(latencies, 0.5) * 1000,
+        "p99": percentile(latencies, 0.99) * 1000
+    }
+
+
+def serve(kind, args):
+    if kind == "pool":
+        httpd = http_server.make_server("127.0.0.1", 0, app, args.workers)
+    else:
+        httpd = make_dev_server("127.0.0.1", 0, app,
+                                threaded=kind == "dev-threaded")
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    return httpd
+
+
+def main():
+    parser = argparse.ArgumentParser(description="HTTP load test")
+    parser.add_argument("capture", nargs="?", default=DEFAULT_CAPTURE)
+    parser.add_argument("-c", "--clients", type=int, default=8,
+                        help="Client processes")
+    parser.add_argument("-t", "--duration", type=float, default=5.0,
+                        help="Seconds per run")
+    parser.add_argument("-w", "--workers", type=int,
+                        default=http_server.DEFAULT_WORKERS)
+    parser.add_argument("--file-size", type=int, default=256 * 1024)
+    parser.add_argument("--command-time", type=float, default=0.5)
+    parser.add_argument("-s", "--servers", default="dev,dev-threaded,pool")
+    args = parser.parse_args()
+
+    packets = replay.load_packets(args.capture)
+    set_ods(Server(telemetry.decode(packets[0][1])))
+    set_pod(SlowPod(args.command_time))
+
+    web_root = tempfile.mkdtemp()
+    with open(os.path.join(web_root, "bench.js"), "wb") as f:
+        f.write(os.urandom(args.file_size))
+    set_web_root(web_root)
+
+    print("%d clients, %g s per run" % (args.clients, args.duration))
+    print("%-14s %-14s %10s %9s %9s" % ("server", "path", "requests/s",
+                                        "p50 ms", "p99 ms"))
+    for kind in args.servers.split(","):
+        httpd = serve(kind, args)
+        port = httpd.server_address[1]
+        for name, path, slow in (("/state", "/state", False),
+                                 ("/ui/bench.js", "/ui/bench.js", False),
+                                 ("/state (slow)", "/state", True)):
+            result = load(port, path, args, slow)
+            print("%-14s %-14s %10.0f %9.2f %9.2f" % (
+                kind, name, result["rate"], result["p50"], result["p99"]))
+        httpd.shutdown()
+        httpd.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+Influx storage layout benchmark.
+
+Builds the points for every packet in a capture in both the legacy layout (one
+single-value measurement per field) and the packet layout (one multi-field
+point per packet) and reports the line protocol bytes each would send. When an
+Influx host is given, the points are also written in batches and the write
+latency is reported.
+
+Run from the repository root:
+
+    python3 -m benchmarks.influx_layout --influx-host 127.0.0.1
+"""
+import argparse
+import time
+from datetime import datetime
+from influxdb import InfluxDBClient
+from influxdb.line_protocol import make_lines
+from openloop import telemetry
+from openloop.pod import PodState
+
+DEFAULT_CAPTURE = "tests/assets/hyperloop-telemetry.log.bin"
+
+
+def legacy_points(packet):
+    now = datetime.utcnow().isoformat() + "Z"
+    return [{"measurement": name, "tags": {}, "time": now,
+             "fields": {"value": value}}
+            for name, value in packet.as_dict().items()]
+
+
+def packet_points(packet):
+    tags = {"pod": "127.0.0.1", "state": str(PodState.parse(packet.state))}
+    return [packet.to_point(tags)]
+
+
+def build(packets, make_points, batch_size):
+    """Returns the batches of points for the packets and the build time"""
+    start = time.perf_counter()
+    batches = []
+    for i in range(0, len(packets), batch_size):
+        batch = []
+        for packet in packets[i:i + batch_size]:
+            batch.extend(make_points(packet))
+        batches.append(batch)
+    return batches, time.perf_counter() - start
+
+
+def write(influx, batches):
+    """Writes each batch and returns the per-write latencies"""
+    latencies = []
+    for batch in batches:
+        start = time.perf_counter()
+        influx.write_points(batch, time_precision='n')
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Influx layout benchmark")
+    parser.add_argument("capture", nargs="?", default=DEFAULT_CAPTURE,
+                        help="File of concatenated telemetry packets")
+    parser.add_argument("-b", "--batch-size", type=int, default=500,
+                        help="Packets per write")
+    parser.add_argument("--influx-host", default=None,
+                        help="Influxdb hostname, omit to skip writing")
+    parser.add_argument("--influx-port", default=8086, type=int)
+    parser.add_argument("--influx-name", default="ods_benchmark",
+                        help="Influxdb database to write into")
+    args = parser.parse_args()
+
+    with open(args.capture, "rb") as f:
+        packets = [telemetry.decode(p)
+                   for p in telemetry.iter_packets(f.read())]
+
+    influx = None
+    if args.influx_host:
+        influx = InfluxDBClient(args.influx_host, args.influx_port,
+                                database=args.influx_name)
+        influx.create_database(args.influx_name)
+
+    print("%d packets, %d per write" % (len(packets), args.batch_size))
+    print("%-8s %8s %10s %12s %14s %16s" % ("layout", "points", "build ms",
+                                            "bytes", "bytes/packet",
+                                            "write ms (mean)"))
+
+    for name, make_points in (("legacy", legacy_points),
+                              ("packet", packet_points)):
+        batches, elapsed = build(packets, make_points, args.batch_size)
+        points = sum(len(b) for b in batches)
+        size = sum(len(make_lines({"points": b}, 'n').encode('utf-8'))
+                   for b in batches)
+
+        latency = "-"
+        if influx is not None:
+            latencies = write(influx, batches)
+            latency = "%.1f" % (1e3 * sum(latencies) / len(latencies))
+
+        print("%-8s %8d %10.1f %12d %14.0f %16s" % (
+            name, points, elapsed * 1e3, size, size / len(packets), latency))
+
+
+if __name__ == "__main__":
+    main()
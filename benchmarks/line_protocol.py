@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+"""
+Line protocol encode benchmark.
+
+Compares the `write_points` dict path (build the point dict, then let the
+influxdb client's make_lines escape and format it) against the precomputed
+template in `openloop.line_protocol.TelemetryEncoder`.
+
+Run from the repository root:
+
+    python3 -m benchmarks.line_protocol
+"""
+import argparse
+import time
+from influxdb.line_protocol import make_lines
+from openloop import telemetry
+from openloop.pod import PodState
+from openloop.line_protocol import TelemetryEncoder
+
+DEFAULT_CAPTURE = "tests/assets/hyperloop-telemetry.log.bin"
+POD = "192.168.0.10"
+
+
+def dict_path(packet):
+    tags = {"pod": POD, "state": str(PodState.parse(packet.state))}
+    return make_lines({"points": [packet.to_point(tags)]}, 'n').encode('utf-8')
+
+
+def bench(name, func, packets, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for packet in packets:
+            func(packet)
+        elapsed = time.perf_counter() - start
+        if best is None or elapsed < best:
+            best = elapsed
+
+    per_packet = best / len(packets)
+    print("%-24s %8.2f us/packet" % (name, per_packet * 1e6))
+    return per_packet
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Line protocol benchmark")
+    parser.add_argument("capture", nargs="?", default=DEFAULT_CAPTURE,
+                        help="File of concatenated telemetry packets")
+    parser.add_argument("-n", "--repeat", type=int, default=5,
+                        help="Number of passes over the capture")
+    args = parser.parse_args()
+
+    with open(args.capture, "rb") as f:
+        packets = [telemetry.decode(p)
+                   for p in telemetry.iter_packets(f.read())]
+
+    encoder = TelemetryEncoder()
+    for packet in packets:
+        assert encoder.encode(packet, POD) == dict_path(packet)
+
+    print("%d packets" % len(packets))
+    before = bench("write_points dict path", dict_path, packets, args.repeat)
+    after = bench("TelemetryEncoder", lambda p: encoder.encode(p, POD),
+                  packets, args.repeat)
+    print("speedup: %.1fx" % (before / after))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+Multi-pod ingest benchmark.
+
+Starts an in-process ODSServer (with a stub Influx behind the real
+InfluxWriter) and replays the capture into it from N processes at once, each
+sending from its own loopback address (127.0.0.2, 127.0.0.3, ...) so it is
+tracked as a separate pod. Reports the aggregate ingest rate, loss and the
+per-pod counters.
+
+Run from the repository root (Linux, for the 127.0.0.x source addresses):
+
+    python3 -m benchmarks.multi_pod --pods 1 2 4
+"""
+import time
+import argparse
+import threading
+import multiprocessing
+import ods
+import replay
+from openloop.writer import InfluxWriter
+
+DEFAULT_CAPTURE = "tests/assets/hyperloop-telemetry.log.bin"
+
+
+class NullInflux:
+    def request(self, **kwargs):
+        pass
+
+
+def send(source, port, packets, loop, speed):
+    sender = replay.Sender(("127.0.0.1", port), source=source)
+    for _ in range(loop):
+        replay.replay(packets, sender, speed)
+    sender.close()
+
+
+def run(server, port, packets, pods, loop, speed):
+    """Replays from pods processes, returns (sent, received, elapsed)"""
+    server.pods.clear()
+    before = server.received
+
+    senders = [multiprocessing.Process(
+        target=send, args=("127.0.0.%d" % (i + 2), port, packets, loop, speed))
+        for i in range(pods)]
+
+    start = time.perf_counter()
+    for p in senders:
+        p.start()
+    for p in senders:
+        p.join()
+
+    # Let the receive loop drain the socket buffer
+    last = -1
+    while server.received != last:
+        last = server.received
+        time.sleep(0.2)
+    elapsed = time.perf_counter() - start
+
+    return pods * loop * len(packets), server.received - before, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Multi-pod ingest benchmark")
+    parser.add_argument("capture", nargs="?", default=DEFAULT_CAPTURE,
+                        help="File of concatenated telemetry packets")
+    parser.add_argument("--pods", type=int, nargs="+", default=[1, 2, 4, 8],
+                        help="Numbers of concurrent pods to simulate")
+    parser.add_argument("-l", "--loop", type=int, default=5,
+                        help="Times each pod replays the capture")
+    parser.add_argument("-s", "--speed", type=float, default=None,
+                        help="Replay time multiplier (default: max speed)")
+    parser.add_argument("-p", "--port", type=int, default=17778)
+    args = parser.parse_args()
+
+    packets = replay.load_packets(args.capture)
+
+    writer = InfluxWriter(NullInflux(), "benchmark")
+    threading.Thread(target=writer.run, daemon=True).start()
+    server = ods.ODSServer(("127.0.0.1", args.port), 0, None, writer)
+    threading.Thread(target=server.run, daemon=True).start()
+
+    results = []
+    time.sleep(0.2)
+    for pods in args.pods:
+        sent, received, elapsed = run(server, args.port, packets, pods,
+                                      args.loop, args.speed)
+        counts = sorted(p["received"] for p in server.get_pods().values())
+        results.append((pods, sent, received, elapsed, counts))
+
+    print("%5s %10s %10s %8s %14s  %s" % ("pods", "sent", "received",
+                                          "loss %", "packets/sec",
+                                          "per-pod received"))
+    for pods, sent, received, elapsed, counts in results:
+        print("%5d %10d %10d %8.2f %14.0f  %s" % (
+            pods, sent, received, 100.0 * (sent - received) / sent,
+            received / elapsed, counts))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+"""
+Pod command channel benchmark.
+
+Runs a mock pod in this process that answers each command in order after
+--latency seconds (a slow link) and compares the original lock-per-round-trip
+client with the pipelined `Pod(fence=True)`. The mock splits what it reads on
+newlines, as the fence needs:
+
+  throughput  --callers threads running commands back to back, as the web
+              UI, podctl and the heartbeat do at once
+  stuck       ping latency while one caller waits out a command the pod
+              never answers (the pipelined client sees its fence answered
+              and returns an empty reply)
+
+Run from the repository root:
+
+    python3 -m benchmarks.pod
+"""
+import time
+import select
+import socket
+import queue
+import argparse
+import threading
+import socketserver
+from datetime import timedelta
+from openloop.pod import Pod, MAX_MESSAGE_SIZE
+
+
+class LegacyPod:
+    """Pod.run as it shipped before pipelining: one command at a time"""
+
+    def __init__(self, addr):
+        self.addr = addr
+        self.sock = None
+        self.lock = threading.Lock()
+
+    def connect(self):
+        self.sock = socket.create_connection(self.addr, 1)
+
+    def close(self):
+        if self.sock is not None:
+            self.sock.close()
+            self.sock = None
+
+    def is_connected(self):
+        return self.sock is not None
+
+    def run(self, cmd, timeout=None):
+        if timeout is None:
+            timeout = timedelta(seconds=1)
+        with self.lock:
+            if not self.is_connected():
+                return None
+            self.sock.send((cmd + "\n").encode('utf-8'))
+            ready, _, _ = select.select([self.sock], [], [],
+                                        timeout.total_seconds())
+            if self.sock in ready:
+                return self.sock.recv(MAX_MESSAGE_SIZE).decode('utf-8')
+            self.close()
+            return None
+
+
+def mock_pod(latency):
+    """Returns a server answering in order, each response latency seconds
+    after its command arrived; 'stuck' is never answered"""
+
+    class Handler(socketserver.BaseRequestHandler):
+        def handle(self):
+            replies = queue.Queue()
+            threading.Thread(target=self.reply, args=(replies,),
+                             daemon=True).start()
+            for line in self.request.makefile('rb'):
+                cmd = line.strip()
+                if cmd == b"stuck":
+                    continue
+                response = b"PONG:4\n" if cmd == b"ping" else b"OK\n"
+                replies.put((time.monotonic() + latency, response))
+            replies.put((None, None))
+
+        def reply(self, replies):
+            while True:
+                due, response = replies.get()
+                if due is None:
+                    return
+                time.sleep(max(0, due - time.monotonic()))
+                try:
+                    self.request.sendall(response)
+                except OSError:
+                    return
+
+    class Server(socketserver.ThreadingTCPServer):
+        daemon_threads = True
+        allow_reuse_address = True
+
+    server = Server(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def throughput(pod, callers, duration):
+    counts = [0] * callers
+    deadline = time.monotonic() + duration
+
+    def caller(index):
+        while time.monotonic() < deadline:
+            if pod.run("status") is not None:
+                counts[index] += 1
+
+    threads = [threading.Thread(target=caller, args=(i,))
+               for i in range(callers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return sum(counts) / duration
+
+
+def stuck(pod, pings):
+    """Returns the worst ping time while a command is stuck"""
+    blocked = threading.Thread(target=pod.run, args=("stuck",))
+    blocked.start()
+    time.sleep(0.05)
+    worst = 0.0
+    for _ in range(pings):
+        start = time.perf_counter()
+        response = pod.run("ping")
+        worst = max(worst, time.perf_counter() - start)
+        if response is None:
+            break
+    blocked.join()
+    return worst, pod.is_connected()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Pod channel benchmark")
+    parser.add_argument("-l", "--latency", type=float, default=0.005,
+                        help="Seconds before the mock pod answers")
+    parser.add_argument("-c", "--callers", type=int, default=8)
+    parser.add_argument("-t", "--duration", type=float, default=3.0)
+    args = parser.parse_args()
+
+    server = mock_pod(args.latency)
+    addr = server.server_address
+    print("%g ms link latency, %d callers" % (args.latency * 1000,
+                                              args.callers))
+
+    for name, pod in (("legacy", LegacyPod(addr)),
+                      ("pipelined", Pod(addr, fence=True))):
+        pod.connect()
+        rate = throughput(pod, args.callers, args.duration)
+        worst, connected = stuck(pod, 10)
+        print("%-10s %8.0f commands/s   worst ping with a stuck command "
+              "%7.1f ms (%s)" % (name, rate, worst * 1000,
+                                 "still connected" if connected
+                                 else "disconnected"))
+        pod.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+PodState lookup microbenchmark.
+
+Compares the original metaclass PodState (names found by scanning MAP and
+SHORT_MAP, attributes through the metaclass __getattr__) with the IntEnum
+for what podctl's prompt and per packet state tagging do: build a state
+from a number (with `PodState.parse`), then take its name, short name and
+whether it is moving.
+
+Run from the repository root:
+
+    python3 -m benchmarks.pod_state
+"""
+import time
+import argparse
+from openloop.pod import PodState
+
+
+class LegacyPodStateType(type):
+    MAP = {
+        'POST': 0, 'BOOT': 1, 'HPFILL': 2, 'LOAD': 3, 'STANDBY': 4,
+        'ARMED': 5, 'PUSHING': 6, 'COASTING': 7, 'BRAKING': 8, 'VENT': 9,
+        'RETRIEVAL': 10, 'EMERGENCY': 11, 'SHUTDOWN': 12
+    }
+
+    SHORT_MAP = {
+        'POST': 0, 'BOOT': 1, 'HPFL': 2, 'LOAD': 3, 'STBY': 4, 'ARMD': 5,
+        'PUSH': 6, 'COAS': 7, 'BRKE': 8, 'VENT': 9, 'RETR': 10, 'EMRG': 11,
+        'SDWN': 12
+    }
+
+    def __getattr__(cls, name):
+        if name in cls.MAP:
+            return cls.MAP[name]
+        raise AttributeError(name)
+
+
+class LegacyPodState(metaclass=LegacyPodStateType):
+    """PodState as it shipped before the IntEnum"""
+
+    def __init__(self, state):
+        self.state = int(state)
+
+    def is_moving(self):
+        return self.state in (LegacyPodState.BRAKING,
+                              LegacyPodState.COASTING,
+                              LegacyPodState.PUSHING)
+
+    def __str__(self):
+        keys = [key for key, val in LegacyPodState.MAP.items()
+                if val == self.state]
+        if not keys:
+            return "UNKNOWN"
+        else:
+            return keys[0]
+
+    def short(self):
+        keys = [key for key, val in LegacyPodState.SHORT_MAP.items()
+                if val == self.state]
+        if not keys:
+            return "----"
+        else:
+            return keys[0]
+
+
+def measure(make, states, rounds):
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for number in states:
+            state = make(number)
+            str(state)
+            state.short()
+            state.is_moving()
+    return (time.perf_counter() - start) / (rounds * len(states))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="PodState benchmark")
+    parser.add_argument("-n", "--rounds", type=int, default=20000)
+    args = parser.parse_args()
+
+    # Every state and one the pod should never send
+    states = list(range(14))
+    for number in states:
+        assert str(LegacyPodState(number)) == str(PodState.parse(number))
+        assert LegacyPodState(number).short() == \
+            PodState.parse(number).short()
+
+    for name, make in (("legacy", LegacyPodState),
+                       ("enum", PodState.parse)):
+        print("%-8s %6.2f us per state" % (
+            name, measure(make, states, args.rounds) * 1e6))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+Raw serial reader throughput benchmark.
+
+Writes --samples lines of an IMU style stream (six named columns, as an
+MPU6050 sketch prints them) to a file and reads it with the original
+line-at-a-time RawReader and with the chunked one. Reports samples per second
+for the reader itself and for the writer thread encoding what was submitted
+into line protocol. A 1 kHz board needs both well above 1000.
+
+Run from the repository root:
+
+    python3 -m benchmarks.raw_reader
+"""
+import os
+import time
+import random
+import argparse
+import tempfile
+from datetime import datetime
+from openloop.writer import InfluxWriter
+from raw_reader import RawReader
+
+COLUMNS = ("ax", "ay", "az", "gx", "gy", "gz")
+
+
+class LegacyRawReader:
+    """RawReader.run as it shipped before chunked reads, one submit per
+    line"""
+
+    def __init__(self, filename, writer=None):
+        self.filename = filename
+        self.writer = writer
+
+    def run(self):
+        with open(self.filename) as f:
+            for line in f:
+                if line:
+                    data = {}
+                    for i, v in enumerate(line.split()):
+                        name = "raw_%d" % i
+                        if '=' in v:
+                            name = v.split('=')[0]
+                            v = v.split('=')[1]
+                        data[name] = float(v)
+                    self.store_metrics(data)
+
+    def store_metrics(self, data):
+        measurements = []
+        for name, value in list(data.items()):
+            measurements.append({
+                    "measurement": name,
+                    "tags": {},
+                    "time":  datetime.utcnow().isoformat() + "Z",
+                    "fields": {"value": value}})
+        self.writer.submit(measurements)
+
+
+class Collector:
+    """Keeps submissions for the writer's encode step"""
+
+    def __init__(self):
+        self.batch = []
+
+    def submit(self, points):
+        self.batch.append(points)
+
+    def submit_lines(self, lines, points=1):
+        self.batch.append(lines)
+
+
+def measure(name, reader, collector, samples):
+    start = time.perf_counter()
+    reader.run()
+    read = time.perf_counter() - start
+
+    start = time.perf_counter()
+    body = InfluxWriter(None, None).encode(collector.batch)
+    encode = time.perf_counter() - start
+
+    print("%-8s read %9.0f samples/s   encode %9.0f samples/s   "
+          "%6d submits   %d bytes" % (name, samples / read, samples / encode,
+                                      len(collector.batch), len(body)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="RawReader benchmark")
+    parser.add_argument("-n", "--samples", type=int, default=50000)
+    args = parser.parse_args()
+
+    fd, path = tempfile.mkstemp(suffix=".txt")
+    with os.fdopen(fd, "w") as f:
+        for _ in range(args.samples):
+            f.write(" ".join("%s=%.4f" % (column, random.uniform(-2, 2))
+                             for column in COLUMNS) + "\n")
+
+    try:
+        collector = Collector()
+        measure("legacy", LegacyRawReader(path, collector), collector,
+                args.samples)
+        collector = Collector()
+        measure("chunked", RawReader(path, writer=collector), collector,
+                args.samples)
+    finally:
+        os.unlink(path)
+
+
+if __name__ == "__main__":
+    main()
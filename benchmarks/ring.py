@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""
+Receive path allocation benchmark.
+
+Sends bursts of telemetry over loopback and measures, with tracemalloc, how
+much memory the receive path allocates per packet:
+
+* recvfrom: a new bytes object (and address tuple) per datagram, as the
+  server did before the ring, kept until the burst has been handed on
+* ring: DatagramReceiver writing into PacketRing slots
+* pipeline: receive, decode, encode and queue for Influx, once through
+  recvfrom + bytes and once in place from the ring
+
+Peak traced memory above the starting point is divided by the packets in
+the burst; throughput is timed separately without tracemalloc. Run from the
+repository root:
+
+    python3 -m benchmarks.ring
+"""
+import time
+import socket
+import argparse
+import tracemalloc
+import ods
+import replay
+from openloop.ring import PacketRing
+from openloop.udp import DatagramReceiver, configure_socket
+from openloop.writer import InfluxWriter
+from openloop.telemetry import PACKET_LENGTH
+
+DEFAULT_CAPTURE = "tests/assets/hyperloop-telemetry.log.bin"
+
+
+class NullInflux:
+    def request(self, **kwargs):
+        pass
+
+
+def measure(sender, payloads, rounds, receive):
+    """Runs receive(count) on bursts of payloads, returns (bytes/packet,
+    packets/sec)"""
+    count = len(payloads)
+    # Warm up caches (addresses, formatted tags) outside the measurement
+    sender.send(payloads)
+    receive(count)
+
+    peaks = []
+    for _ in range(rounds):
+        sender.send(payloads)
+        tracemalloc.start()
+        before = tracemalloc.get_traced_memory()[0]
+        receive(count)
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        peaks.append(peak - before)
+
+    # tracemalloc slows every allocation down, time without it
+    elapsed = 0.0
+    for _ in range(rounds):
+        sender.send(payloads)
+        start = time.perf_counter()
+        receive(count)
+        elapsed += time.perf_counter() - start
+
+    return min(peaks) / count, rounds * count / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Receive path allocations")
+    parser.add_argument("capture", nargs="?", default=DEFAULT_CAPTURE)
+    parser.add_argument("-n", "--burst", type=int, default=1000,
+                        help="Packets per measured burst")
+    parser.add_argument("-r", "--rounds", type=int, default=5)
+    args = parser.parse_args()
+
+    payloads = [p for _, p in replay.load_packets(args.capture)]
+    payloads = (payloads * (args.burst // len(payloads) + 1))[:args.burst]
+
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    configure_socket(sock, 16 * 1024 * 1024)
+    sock.bind(("127.0.0.1", 0))
+    sender = replay.Sender(sock.getsockname())
+
+    ring = PacketRing(args.burst + 64)
+    receiver = DatagramReceiver(sock, ring)
+
+    # Nothing drains the queue, so every submission after the first is
+    # dropped and the encoded lines are freed straight away
+    writer = InfluxWriter(NullInflux(), "benchmark", max_queue=1)
+    server = ods.ODSServer(("127.0.0.1", 0), 0, None, writer)
+
+    def recvfrom(count):
+        received = [None] * count
+        for i in range(count):
+            received[i] = sock.recvfrom(PACKET_LENGTH)
+
+    def ring_receive(count):
+        done = 0
+        while done < count:
+            done += receiver.receive()
+        ring.release(ring.head)
+
+    def pipeline_bytes(count):
+        for _ in range(count):
+            message, addr = sock.recvfrom(PACKET_LENGTH)
+            server.handle_datagram(message, addr)
+
+    def pipeline_ring(count):
+        done = 0
+        seq = ring.head
+        while done < count:
+            done += receiver.receive()
+        for seq in range(seq, ring.head):
+            index = seq % ring.slots
+            server.handle_datagram(ring.buffer, ring.addrs[index],
+                                   index * ring.slot_size,
+                                   ring.lengths[index])
+        ring.release(ring.head)
+
+    results = []
+    for name, receive in [("recvfrom", recvfrom),
+                          ("ring", ring_receive),
+                          ("pipeline (recvfrom)", pipeline_bytes),
+                          ("pipeline (ring)", pipeline_ring)]:
+        results.append((name,) + measure(sender, payloads, args.rounds,
+                                         receive))
+
+    print("%-22s %10s %14s" % ("stage", "bytes/pkt", "packets/sec"))
+    for name, per_packet, rate in results:
+        print("%-22s %10.1f %14.0f" % (name, per_packet, rate))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""
+SpaceX status encoding microbenchmark.
+
+Compares the original per-send path (state_mapper list rebuilt, a
+SpaceXPacket built and packed with a re-parsed format string) against
+`SpaceXEncoder`, which packs into one reused buffer with a precompiled
+struct, using the packets in a capture file.
+
+Run from the repository root:
+
+    python3 -m benchmarks.spacex
+"""
+import struct
+import argparse
+import time
+import replay
+from openloop import telemetry
+from openloop.spacex import SpaceXEncoder
+
+DEFAULT_CAPTURE = "tests/assets/hyperloop-telemetry.log.bin"
+
+
+class LegacySpaceXPacket:
+    """The SpaceXPacket that shipped before the encoder, without its print"""
+
+    def __init__(self, team_id, status=None, position=None, velocity=None,
+                 acceleration=None, battery_voltage=None,
+                 battery_current=None, battery_temperature=None,
+                 pod_temperature=None, stripe_count=None):
+        self.team_id = team_id
+        self.status = status
+        self.position = position
+        self.velocity = velocity
+        self.acceleration = acceleration
+        self.battery_voltage = battery_voltage
+        self.battery_current = battery_current
+        self.battery_temperature = battery_temperature
+        self.pod_temperature = pod_temperature
+        self.stripe_count = stripe_count
+        self.current_sender = None
+
+    def to_bytes(self):
+        pattern = '!BB7iI'
+        accel = self.acceleration
+        if accel >= 1073741823 or accel <= -1073741823:
+            accel = 0
+
+        v = self.velocity
+        if v >= 1073741823 or v <= -1073741823:
+            v = 0
+
+        x = self.position
+        if x >= 1073741823 or x <= -1073741823:
+            x = 0
+
+        try:
+            b = struct.pack(pattern, self.team_id, self.status, accel,
+                            x, v, 0,
+                            0, 0,
+                            0, 0)
+        except Exception as e:
+            return b'\0'
+        return b
+
+
+def legacy_encode(state, team_id=11):
+    """make_spacex_packet().to_bytes() as it shipped before the encoder"""
+    state_mapper = [1, 1, 1, 1, 1, 1, 2, 3, 4, 5, 1, 1, 0, 1]
+
+    spacex_status = 0
+    if state.state in state_mapper:
+        spacex_status = state_mapper[state.state]
+
+    return LegacySpaceXPacket(
+        team_id=team_id,
+        status=spacex_status,
+        position=int(state.position_x) * 100,
+        velocity=int(state.velocity_x) * 100,
+        acceleration=int(state.acceleration_x) * 100,
+        battery_voltage=int(state.voltage_0) * 1000,
+        battery_current=int(state.current_0) * 1000,
+        battery_temperature=int(state.power_thermo_0) * 10,
+        pod_temperature=int(state.frame_thermo) * 10,
+        stripe_count=int(0)
+    ).to_bytes()
+
+
+def bench(name, func, packets, repeat):
+    """Runs func over every packet repeat times and prints the cost"""
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for state in packets:
+            func(state)
+        elapsed = time.perf_counter() - start
+        if best is None or elapsed < best:
+            best = elapsed
+
+    per_packet = best / len(packets) * 1e6
+    print("%-28s %8.2f us/packet" % (name, per_packet))
+    return per_packet
+
+
+def main():
+    parser = argparse.ArgumentParser(description="SpaceX encode benchmark")
+    parser.add_argument("capture", nargs="?", default=DEFAULT_CAPTURE,
+                        help="Capture or file of concatenated packets")
+    parser.add_argument("-r", "--repeat", type=int, default=20,
+                        help="Passes over the capture, the best is reported")
+    args = parser.parse_args()
+
+    packets = [telemetry.decode(payload)
+               for _, payload in replay.load_packets(args.capture)]
+    encoder = SpaceXEncoder(11)
+
+    before = bench("legacy make + to_bytes", legacy_encode, packets,
+                   args.repeat)
+    after = bench("SpaceXEncoder.encode", encoder.encode, packets,
+                  args.repeat)
+    print("%.1fx faster" % (before / after))
+
+
+if __name__ == "__main__":
+    main()
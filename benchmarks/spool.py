@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+Spool benchmark.
+
+Appends encoded telemetry to a spool while Influx is "down" (every post
+fails), then brings it back and measures how fast the drainer replays the
+backlog. Without --influx-host the drainer posts to a no-op sink, which
+measures the spool's own read/checkpoint overhead.
+
+Run from the repository root:
+
+    python3 -m benchmarks.spool --tile 50
+"""
+import argparse
+import tempfile
+import threading
+import time
+from influxdb import InfluxDBClient
+from openloop import telemetry
+from openloop.line_protocol import TelemetryEncoder
+from openloop.spool import Spool
+from openloop.writer import InfluxWriter
+
+DEFAULT_CAPTURE = "tests/assets/hyperloop-telemetry.log.bin"
+
+
+class Sink:
+    """Fails every post until healthy is set"""
+
+    def __init__(self, post=None):
+        self.healthy = False
+        self.forward = post
+
+    def post(self, body):
+        if not self.healthy:
+            raise IOError("influx is down")
+        if self.forward is not None:
+            self.forward(body)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Spool benchmark")
+    parser.add_argument("capture", nargs="?", default=DEFAULT_CAPTURE,
+                        help="File of concatenated telemetry packets")
+    parser.add_argument("-t", "--tile", type=int, default=50,
+                        help="Repeat the capture this many times")
+    parser.add_argument("-b", "--batch-size", type=int, default=500,
+                        help="Packets per spool append")
+    parser.add_argument("--influx-host", default=None,
+                        help="Influxdb hostname, omit to drain to a no-op")
+    parser.add_argument("--influx-port", default=8086, type=int)
+    parser.add_argument("--influx-name", default="ods_benchmark")
+    args = parser.parse_args()
+
+    encoder = TelemetryEncoder()
+    with open(args.capture, "rb") as f:
+        lines = [encoder.encode(telemetry.decode(p), "127.0.0.1")
+                 for p in telemetry.iter_packets(f.read())] * args.tile
+    bodies = [b"".join(lines[i:i + args.batch_size])
+              for i in range(0, len(lines), args.batch_size)]
+    total = sum(len(b) for b in bodies)
+
+    sink = Sink()
+    if args.influx_host:
+        influx = InfluxDBClient(args.influx_host, args.influx_port,
+                                database=args.influx_name)
+        influx.create_database(args.influx_name)
+        sink = Sink(InfluxWriter(influx, args.influx_name).post)
+
+    with tempfile.TemporaryDirectory() as directory:
+        spool = Spool(directory, sink.post, retry_interval=0.01)
+        drainer = threading.Thread(target=spool.run)
+        drainer.start()
+
+        start = time.perf_counter()
+        for body in bodies:
+            spool.append(body)
+        appended = time.perf_counter() - start
+
+        start = time.perf_counter()
+        sink.healthy = True
+        while spool.backlog() > 0:
+            time.sleep(0.001)
+        drained = time.perf_counter() - start
+
+        spool.stop()
+        drainer.join()
+
+    print("%d packets, %.1f MB spooled" % (len(lines), total / 1e6))
+    print("append: %10.0f packets/sec %8.1f MB/s" % (
+        len(lines) / appended, total / appended / 1e6))
+    print("replay: %10.0f packets/sec %8.1f MB/s" % (
+        len(lines) / drained, total / drained / 1e6))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+"""
+/state benchmark.
+
+Calls the /state view in a request context while the state changes every
+--change requests, comparing the original handler (jsonify of a fresh
+as_dict() on every request) against the snapshot handler, for plain polls
+and for polls that send back the last ETag. The WSGI and HTTP costs both
+handlers share are left out.
+
+Run from the repository root:
+
+    python3 -m benchmarks.state
+"""
+import time
+import argparse
+from flask import jsonify
+import replay
+from openloop import telemetry
+from openloop.snapshot import SnapshotPublisher
+from openloop.http.app import app, set_ods, state
+
+DEFAULT_CAPTURE = "tests/assets/hyperloop-telemetry.log.bin"
+
+
+class Server:
+    def __init__(self):
+        self.state = None
+        self.snapshots = SnapshotPublisher(self, 0)
+
+    def get_state(self):
+        return self.state.as_dict()
+
+
+def bench(name, view, server, packets, args, conditional=False):
+    etag = None
+    start = time.perf_counter()
+    for i in range(args.requests):
+        if i % args.change == 0:
+            server.state = packets[(i // args.change) % len(packets)]
+        headers = {}
+        if conditional and etag:
+            headers["If-None-Match"] = etag
+        with app.test_request_context("/state", headers=headers):
+            response = view()
+        etag = response.headers.get("ETag")
+    elapsed = time.perf_counter() - start
+    print("%-32s %8.0f requests/s" % (name, args.requests / elapsed))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="/state benchmark")
+    parser.add_argument("capture", nargs="?", default=DEFAULT_CAPTURE)
+    parser.add_argument("-n", "--requests", type=int, default=5000)
+    parser.add_argument("-c", "--change", type=int, default=10,
+                        help="Requests between state changes")
+    args = parser.parse_args()
+
+    packets = [telemetry.decode(payload)
+               for _, payload in replay.load_packets(args.capture)]
+    server = Server()
+    set_ods(server)
+
+    def legacy():
+        return jsonify(server.get_state())
+
+    bench("jsonify", legacy, server, packets, args)
+    bench("snapshot", state, server, packets, args)
+    bench("snapshot + If-None-Match", state, server, packets, args,
+          conditional=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+"""
+Live telemetry fan-out benchmark.
+
+Simulates dashboard clients watching the pod while telemetry updates at
+--packet-rate, and compares the CPU ODS spends on them:
+
+  poll    every client serializes its own copy of the state each interval,
+          as a /state poll through jsonify does
+  stream  clients subscribe to a StreamHub, which encodes one delta frame per
+          (fields, rate) group and hands the same bytes to every subscriber
+
+Run from the repository root:
+
+    python3 -m benchmarks.stream
+"""
+import json
+import time
+import argparse
+import threading
+import replay
+from openloop import telemetry
+from openloop.stream import StreamHub
+
+DEFAULT_CAPTURE = "tests/assets/hyperloop-telemetry.log.bin"
+
+# Field subsets the simulated dashboards ask for, spread over the clients
+VIEWS = (
+    ("state", "position_x", "velocity_x", "acceleration_x"),
+    ("hp_pressure", "reg_pressure_0", "reg_pressure_1", "reg_pressure_2",
+     "reg_pressure_3"),
+    ("voltage_0", "voltage_1", "current_0", "current_1"),
+    ("frame_thermo", "hp_thermo", "power_thermo_0", "power_thermo_1"),
+    (),
+)
+
+
+class Pod:
+    """Stands in for ODSServer: a thread replacing state at a fixed rate"""
+
+    def __init__(self, packets, rate):
+        self.packets = packets
+        self.rate = rate
+        self.state = None
+        self.running = True
+
+    def run(self):
+        i = 0
+        while self.running:
+            packet = self.packets[i % len(self.packets)]
+            self.state = packet._replace(
+                timestamp=i * 1000, position_x=i * 0.01,
+                velocity_x=float(i % 300), hp_pressure=float(i % 50),
+                voltage_0=float(i % 7), frame_thermo=float(i % 11))
+            i += 1
+            time.sleep(1.0 / self.rate)
+
+
+def poll_client(pod, fields, rate, deadline, counts, index):
+    """Encodes its own subset of the state every interval"""
+    while time.monotonic() < deadline:
+        state = pod.state
+        if state is not None:
+            data = state.as_dict()
+            if fields:
+                data = dict((name, data[name]) for name in fields)
+            # jsonify pretty prints outside of XHR requests by default
+            json.dumps(data, indent=2, sort_keys=True).encode()
+            counts[index] += 1
+        time.sleep(1.0 / rate)
+
+
+def stream_client(hub, fields, rate, deadline, counts, index):
+    """Reads frames from a hub subscription"""
+    events = hub.events(hub.subscribe(list(fields), rate))
+    for data in events:
+        if data.startswith(b"id:"):
+            counts[index] += 1
+        if time.monotonic() >= deadline:
+            events.close()
+            break
+
+
+def measure(mode, packets, args):
+    pod = Pod(packets, args.packet_rate)
+    threading.Thread(target=pod.run, daemon=True).start()
+    time.sleep(0.1)
+
+    hub = None
+    if mode == "stream":
+        hub = StreamHub(pod)
+        threading.Thread(target=hub.run, daemon=True).start()
+
+    counts = [0] * args.clients
+    deadline = time.monotonic() + args.duration
+    threads = []
+    cpu = time.process_time()
+    for i in range(args.clients):
+        fields = VIEWS[i % len(VIEWS)]
+        if mode == "poll":
+            target = poll_client
+            first = pod
+        else:
+            target = stream_client
+            first = hub
+        thread = threading.Thread(target=target, args=(
+            first, fields, args.rate, deadline, counts, i))
+        thread.start()
+        threads.append(thread)
+
+    for thread in threads:
+        thread.join()
+    cpu = time.process_time() - cpu
+
+    pod.running = False
+    result = {"cpu": cpu, "updates": sum(counts), "encoded": sum(counts)}
+    if hub is not None:
+        result["encoded"] = hub.frames
+        hub.stop()
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Stream fan-out benchmark")
+    parser.add_argument("capture", nargs="?", default=DEFAULT_CAPTURE)
+    parser.add_argument("-c", "--clients", type=int, default=50,
+                        help="Simulated subscribers")
+    parser.add_argument("-r", "--rate", type=float, default=20.0,
+                        help="Updates per second each client asks for")
+    parser.add_argument("--packet-rate", type=float, default=100.0,
+                        help="Telemetry packets per second")
+    parser.add_argument("-t", "--duration", type=float, default=5.0)
+    args = parser.parse_args()
+
+    packets = [telemetry.decode(payload)
+               for _, payload in replay.load_packets(args.capture)]
+
+    print("%d clients at %g Hz, %d field sets, %g packets/s, %g s" % (
+        args.clients, args.rate, len(VIEWS), args.packet_rate,
+        args.duration))
+    results = {}
+    for mode in ("poll", "stream"):
+        result = results[mode] = measure(mode, packets, args)
+        print("%-8s %6.2f s CPU %8d updates delivered %8d encoded" % (
+            mode, result["cpu"], result["updates"], result["encoded"]))
+    print("%.1fx less CPU" % (results["poll"]["cpu"] /
+                             results["stream"]["cpu"]))
+
+
+if __name__ == "__main__":
+    main()
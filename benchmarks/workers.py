@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""
+Multi-process ingest benchmark.
+
+For each worker count, starts a WorkerPool of ODSServers (with a stub Influx
+behind the real InfluxWriter) sharing one port through SO_REUSEPORT, then
+replays the capture into it from several sender processes at once. The kernel
+picks a worker per sender address and port, so there should be at least as
+many senders as workers. Reports the aggregate ingest rate and loss as merged
+by the parent, and how the packets were spread across the workers.
+
+Run from the repository root (Linux, for SO_REUSEPORT and the 127.0.0.x
+source addresses):
+
+    python3 -m benchmarks.workers --workers 1 2 4 --senders 8
+"""
+import time
+import argparse
+import threading
+import multiprocessing
+import ods
+import replay
+from openloop.writer import InfluxWriter
+from openloop.workers import WorkerPool
+
+DEFAULT_CAPTURE = "tests/assets/hyperloop-telemetry.log.bin"
+
+
+class NullInflux:
+    def request(self, **kwargs):
+        pass
+
+
+def send(source, port, packets, loop, speed):
+    sender = replay.Sender(("127.0.0.1", port), source=source)
+    for _ in range(loop):
+        replay.replay(packets, sender, speed)
+    sender.close()
+
+
+def make_worker(port):
+    def make_server(index):
+        writer = InfluxWriter(NullInflux(), "benchmark")
+        threading.Thread(target=writer.run, daemon=True).start()
+        return ods.ODSServer(("127.0.0.1", port), 0, None, writer,
+                             reuse_port=True)
+    return make_server
+
+
+def run(workers, port, packets, senders, loop, speed):
+    """Replays into a pool of workers, returns (sent, received, elapsed,
+    per-worker received)"""
+    pool = WorkerPool(workers, make_worker(port))
+    pool.start()
+    server = ods.ODSServer(("127.0.0.1", port), 0, None,
+                           InfluxWriter(NullInflux(), "benchmark"))
+    threading.Thread(target=pool.run, args=(server,), daemon=True).start()
+    time.sleep(0.5)
+
+    processes = [multiprocessing.Process(
+        target=send, args=("127.0.0.%d" % (i + 2), port, packets, loop, speed))
+        for i in range(senders)]
+
+    start = time.perf_counter()
+    for p in processes:
+        p.start()
+    for p in processes:
+        p.join()
+
+    # Let the workers drain their socket buffers
+    last = -1
+    while server.received != last:
+        last = server.received
+        time.sleep(0.2)
+    elapsed = time.perf_counter() - start
+
+    counts = [w["received"] for w in pool.stats()]
+    pool.stop()
+    return senders * loop * len(packets), server.received, elapsed, counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Multi-process ingest "
+                                                 "benchmark")
+    parser.add_argument("capture", nargs="?", default=DEFAULT_CAPTURE,
+                        help="File of concatenated telemetry packets")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4],
+                        help="Numbers of worker processes to try")
+    parser.add_argument("--senders", type=int, default=8,
+                        help="Concurrent sender processes")
+    parser.add_argument("-l", "--loop", type=int, default=5,
+                        help="Times each sender replays the capture")
+    parser.add_argument("-s", "--speed", type=float, default=None,
+                        help="Replay time multiplier (default: max speed)")
+    parser.add_argument("-p", "--port", type=int, default=17779)
+    args = parser.parse_args()
+
+    packets = replay.load_packets(args.capture)
+
+    print("%7s %10s %10s %8s %14s  %s" % ("workers", "sent", "received",
+                                          "loss %", "packets/sec",
+                                          "per-worker received"))
+    for workers in args.workers:
+        sent, received, elapsed, counts = run(workers, args.port, packets,
+                                              args.senders, args.loop,
+                                              args.speed)
+        print("%7d %10d %10d %8.2f %14.0f  %s" % (
+            workers, sent, received, 100.0 * (sent - received) / sent,
+            received / elapsed, counts))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,291 +1,353 @@
 #!/usr/bin/env python3
+import os
+import sys
 import socket
-import struct
 import logging
 import argparse
 import threading
 import time
-from datetime import datetime, timedelta
+from datetime import datetime
 from influxdb import InfluxDBClient
 from raw_reader import RawReader
-from openloop.http.app import set_ods, set_pod, app, WEB_ROOT
-from openloop.pod import Pod
+from openloop.http.app import set_ods, set_pod, set_web_root, app, \
+    WEB_ROOT
+from openloop.http import server as http_server
+from openloop.pod import Pod, PodState
+from openloop.metrics import MetricsExporter
 from openloop.heart import Heart
+from openloop import telemetry
+from openloop.writer import InfluxWriter, create_database
+from openloop.spool import Spool
+from openloop.capture import CaptureRecorder
+from openloop import log
+from openloop.spacex import SpaceXEncoder, SpaceXForwarder, \
+    DEFAULT_INTERVAL
+from openloop.workers import WorkerPool
+from openloop.udp import DatagramReceiver, configure_socket
+from openloop.ring import PacketRing
+from openloop import history
+from openloop.stream import StreamHub, MAX_RATE
+from openloop.snapshot import SnapshotPublisher, DEFAULT_RATE
+from openloop.line_protocol import TelemetryEncoder
+from openloop.telemetry import PACKET_LENGTH
+
+# Influx storage layouts
+LAYOUT_PACKET = 'packet'    # One multi-field point per packet
+LAYOUT_LEGACY = 'legacy'    # One single-value measurement per field
+
+
+class PodTelemetry:
+    """The latest state and counters for one telemetry sender"""
+
+    def __init__(self, name):
+        self.name = name
+        self.addr = None
+        self.state = None
+        self.received = 0
+        self.invalid = 0
+        self.first_seen = time.time()
+        self.last_seen = None
+
+    def update(self, packet, addr):
+        self.state = packet
+        self.addr = addr
+        self.last_seen = time.time()
 
-PACKET_LENGTH = 216
-
-SKATE_0_MASK = 0x0001
-SKATE_1_MASK = 0x0002
-SKATE_2_MASK = 0x0004
-SKATE_3_MASK = 0x0008
-CLAMP_ENG_0_MASK = 0x0010
-CLAMP_REL_0_MASK = 0x0020
-CLAMP_ENG_1_MASK = 0x0040
-CLAMP_REL_1_MASK = 0x0080
-WHEEL_CAL_0_MASK = 0x0080
-HPFIL_MASK = 0x0100
-VENT_MASK = 0x0200
-PUSH_MASK = 0x0400
-PACK_A_ENG_MASK = 0x0800
-PACK_B_ENG_MASK = 0x1000
-
-SPACEX_INTERVAL = timedelta(seconds=0.3)
-
-
-class SpaceXStatus:
-    FAULT = 0
-    IDLE = 1
-    READY = 2
-    PUSHING = 3
-    COASTING = 4
-    BRAKING = 5
-
-
-class SpaceXPacket:
-    def __init__(self, team_id, status=None, position=None, velocity=None,
-                 acceleration=None, battery_voltage=None,
-                 battery_current=None, battery_temperature=None,
-                 pod_temperature=None, stripe_count=None):
-        self.team_id = team_id
-        self.status = status
-        self.position = position
-        self.velocity = velocity
-        self.acceleration = acceleration
-        self.battery_voltage = battery_voltage
-        self.battery_current = battery_current
-        self.battery_temperature = battery_temperature
-        self.pod_temperature = pod_temperature
-        self.stripe_count = stripe_count
-        self.current_sender = None
-
-    def to_bytes(self):
-        """Convert to bytes"""
-        pattern = '!BB7iI'
-        accel = self.acceleration
-        if accel >= 1073741823 or accel <= -1073741823:
-            accel = 0
-
-        v = self.velocity
-        if v >= 1073741823 or v <= -1073741823:
-            v = 0
-
-        x = self.position
-        if x >= 1073741823 or x <= -1073741823:
-            x = 0
-
-        print("{} {} {} {} {} {}".format(pattern, self.team_id, self.status, accel, x, v))
-        try:
-            b = struct.pack(pattern, self.team_id, self.status, accel,
-                            x, v, 0,
-                            0, 0,
-                            0, 0)
-        except Exception as e:
-            print(e)
-            return b'\0'
-        return b
+    def get_state(self):
+        if self.state is None:
+            return {}
+        return self.state.as_dict()
+
+    def get_stats(self):
+        return {
+            "addr": "%s:%d" % self.addr if self.addr else None,
+            "received": self.received,
+            "invalid": self.invalid,
+            "first_seen": self.first_seen,
+            "last_seen": self.last_seen
+        }
 
 
 class ODSServer:
-    def __init__(self, addrport, team_id, spacex_addr, influx):
+    def __init__(self, addrport, team_id, spacex_addr, writer,
+                 layout=LAYOUT_PACKET, recorder=None, reuse_port=False,
+                 rcvbuf=None, batch_size=64, ring_size=4096):
         self.addrport = addrport
-        self.influx = influx
+        self.reuse_port = reuse_port
+        self.rcvbuf = rcvbuf
+        self.batch_size = batch_size
+        self.ring_size = ring_size
+        self.ring = None
+        self.receiver = None
+        self.writer = writer
+        self.layout = layout
+        self.recorder = recorder
+        self.received = 0
+        self.invalid = 0
+        self.errors = 0
+        self.encoder = TelemetryEncoder()
         self.spacex_addr = spacex_addr
         self.team_id = team_id
+        self.spacex_encoder = SpaceXEncoder(team_id)
         self.spacex_sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-        self.last_spacex_packet = datetime.now()
-        self.state = {}
+        self.forwarder = None
+        self.state = None
+        self.pods = {}
+        self.workers = None
+        self.history = None
+        self.stream = None
+        self.snapshots = SnapshotPublisher(self)
+        self.http = None
+        self.heart = None
+        self.raw = None
 
     def get_state(self):
-        return self.state
-
-    def parse_message(self, msg):
-        (version, size, state, solenoid_mask, timestamp,
-         position_x, position_y, position_z,
-         velocity_x, velocity_y, velocity_z,
-         acceleration_x, acceleration_y, acceleration_z,
-         pusher_0, pusher_1, pusher_2, pusher_3,
-         levitation_0, levitation_1, levitation_2, levitation_3,
-         levitation_4, levitation_5, levitation_6, levitation_7,
-         hp_pressure,
-         reg_pressure_0, reg_pressure_1, reg_pressure_2, reg_pressure_3,
-         clamp_pressure_0, clamp_pressure_1,
-         brake_tank_0, brake_tank_1,
-         hp_thermo,
-         reg_thermo_0, reg_thermo_1, reg_thermo_2, reg_thermo_3,
-         reg_surf_thermo_0, reg_surf_thermo_1,
-         reg_surf_thermo_2, reg_surf_thermo_3,
-         power_thermo_0, power_thermo_1, power_thermo_2, power_thermo_3,
-         clamp_thermo_0, clamp_thermo_1,
-         frame_thermo,
-         voltage_0, voltage_1,
-         current_0, current_1) = struct.unpack("<BHBIQ50f", msg)
-
-        params = {
-            "state": state,
-            "version": version,
-            "solenoid_mask": solenoid_mask,
-            "SOL_SKATE_0": 1 if (solenoid_mask & SKATE_0_MASK) else 0,
-            "SOL_SKATE_1": 1 if (solenoid_mask & SKATE_1_MASK) else 0,
-            "SOL_SKATE_2": 1 if (solenoid_mask & SKATE_2_MASK) else 0,
-            "SOL_SKATE_3": 1 if (solenoid_mask & SKATE_3_MASK) else 0,
-            "SOL_CLAMP_ENG_0": 1 if (solenoid_mask & CLAMP_ENG_0_MASK) else 0,
-            "SOL_CLAMP_REL_0": 1 if (solenoid_mask & CLAMP_REL_0_MASK) else 0,
-            "SOL_CLAMP_ENG_1": 1 if (solenoid_mask & CLAMP_ENG_1_MASK) else 0,
-            "SOL_CLAMP_REL_1": 1 if (solenoid_mask & CLAMP_REL_1_MASK) else 0,
-            "PACK_A_ENG": 1 if (solenoid_mask & PACK_A_ENG_MASK) else 0,
-            "PACK_B_ENG": 1 if (solenoid_mask & PACK_B_ENG_MASK) else 0,
-            "SOL_HPFIL": 1 if (solenoid_mask & HPFIL_MASK) else 0,
-            "SOL_VENT": 1 if (solenoid_mask & VENT_MASK) else 0,
-            "pusher_present": 1 if (solenoid_mask & PUSH_MASK) else 0,
-            "timestamp": timestamp,
-            "position_x": position_x,
-            "position_y": position_y,
-            "position_z": position_z,
-            "velocity_x": velocity_x,
-            "velocity_y": velocity_y,
-            "velocity_z": velocity_z,
-            "acceleration_x": acceleration_x,
-            "acceleration_y": acceleration_y,
-            "acceleration_z": acceleration_z,
-            "levitation_0": levitation_0,
-            "levitation_1": levitation_1,
-            "levitation_2": levitation_2,
-            "levitation_3": levitation_3,
-            "levitation_4": levitation_4,
-            "levitation_5": levitation_5,
-            "levitation_6": levitation_6,
-            "levitation_7": levitation_7,
-            "pusher_0": pusher_0,
-            "pusher_1": pusher_1,
-            "pusher_2": pusher_2,
-            "pusher_3": pusher_3,
-            "hp_pressure": hp_pressure,
-            "reg_pressure_0": reg_pressure_0,
-            "reg_pressure_1": reg_pressure_1,
-            "reg_pressure_2": reg_pressure_2,
-            "reg_pressure_3": reg_pressure_3,
-            "clamp_pressure_0": clamp_pressure_0,
-            "clamp_pressure_1": clamp_pressure_1,
-            "brake_tank_0": brake_tank_0,
-            "brake_tank_1": brake_tank_1,
-            "hp_thermo": hp_thermo,
-            "reg_thermo_0": reg_thermo_0,
-            "reg_thermo_1": reg_thermo_1,
-            "reg_thermo_2": reg_thermo_2,
-            "reg_thermo_3": reg_thermo_3,
-            "reg_surf_thermo_0": reg_surf_thermo_0,
-            "reg_surf_thermo_1": reg_surf_thermo_1,
-            "reg_surf_thermo_2": reg_surf_thermo_2,
-            "reg_surf_thermo_3": reg_surf_thermo_3,
-            "power_thermo_0": power_thermo_0,
-            "power_thermo_1": power_thermo_1,
-            "power_thermo_2": power_thermo_2,
-            "clamp_thermo_0": clamp_thermo_0,
-            "clamp_thermo_1": clamp_thermo_1,
-            "frame_thermo": frame_thermo,
-            "voltage_0": voltage_0,
-            "voltage_1": voltage_1,
-            "current_0": current_0,
-            "current_1": current_1,
-
+        if self.state is None:
+            return {}
+        return self.state.as_dict()
+
+    def is_moving(self):
+        """Returns whether the latest telemetry reports a moving state"""
+        return self.state is not None and \
+            PodState.parse(self.state.state).is_moving()
+
+    def get_pod(self, name):
+        """Returns the PodTelemetry for a sender, or None if it is unknown"""
+        return self.pods.get(name)
+
+    def get_pods(self):
+        return dict((name, pod.get_stats())
+                    for name, pod in list(self.pods.items()))
+
+    def get_sender(self, addr):
+        """Returns the PodTelemetry tracking the sender of addr"""
+        pod = self.pods.get(addr[0])
+        if pod is None:
+            pod = self.pods[addr[0]] = PodTelemetry(addr[0])
+        return pod
+
+    def get_stats(self):
+        stats = {
+            "packets": {
+                "received": self.received,
+                "invalid": self.invalid,
+                "errors": self.errors
+            },
+            "pods": self.get_pods(),
+            "socket": self.get_socket_stats(),
+            "snapshots": self.snapshots.stats(),
+            "writer": self.writer.stats()
         }
+        if self.forwarder is not None:
+            stats["spacex"] = self.forwarder.stats()
+        if self.history is not None:
+            stats["history"] = self.history.stats()
+        if self.stream is not None:
+            stats["stream"] = self.stream.stats()
+        if self.workers is not None:
+            stats["workers"] = self.workers.stats()
+        if self.http is not None:
+            stats["http"] = self.http.stats()
+        if self.heart is not None:
+            stats["heart"] = self.heart.stats()
+        if self.raw is not None:
+            stats["serial"] = self.raw.stats()
+        return stats
+
+    def get_socket_stats(self):
+        if self.receiver is None:
+            return None
+        return self.receiver.stats()
 
-        return params
+    def parse_message(self, msg):
+        return telemetry.decode(msg)
 
     def run(self):
         sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        if self.reuse_port:
+            # Lets every worker process bind the telemetry port
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
 
+        configure_socket(sock, self.rcvbuf)
         sock.bind(self.addrport)
 
+        self.ring = PacketRing(self.ring_size)
+        self.receiver = DatagramReceiver(sock, self.ring, self.batch_size)
+        threading.Thread(target=self.consume, args=(self.ring,),
+                         daemon=True).start()
+
+        while True:
+            self.receiver.receive()
+
+    def consume(self, ring):
+        """Decodes and stores datagrams from the ring in place"""
+        seq = ring.tail
         while True:
-            message, addr = sock.recvfrom(PACKET_LENGTH)
+            head = ring.wait(seq)
+            while seq < head:
+                index = seq % ring.slots
+                try:
+                    self.handle_datagram(ring.buffer, ring.addrs[index],
+                                         index * ring.slot_size,
+                                         ring.lengths[index])
+                except Exception:
+                    # One bad packet must not stop the consumer thread
+                    self.errors += 1
+                    logging.exception("[ODSServer] Error handling packet "
+                                      "from %s", ring.addrs[index][0])
+                seq += 1
+            ring.release(seq)
+
+    def handle_datagram(self, message, addr, offset=0, length=None):
+        """Records, decodes and stores the datagram at offset in message,
+        returns the packet or None if it was invalid"""
+        if length is None:
             length = len(message)
-            if length == PACKET_LENGTH:
-                results = self.parse_message(message)
-                self.store_metrics(results)
-                print(results)
-                self.state = results
-
-                if datetime.now() - self.last_spacex_packet > SPACEX_INTERVAL:
-                    pkt = self.make_spacex_packet()
-                    self.send_to_spacex(pkt)
-
-                self.current_sender = addr
-            elif length == 0:
-                break
-            else:
-                print("Incorrect message length: %d" % length)
-
-    def store_metrics(self, data):
+
+        self.received += 1
+        if self.recorder is not None:
+            self.recorder.record_from(message, offset, length, addr)
+
+        sender = self.get_sender(addr)
+        sender.received += 1
+
+        if length != PACKET_LENGTH:
+            self.invalid += 1
+            sender.invalid += 1
+            logging.debug("[ODSServer] Incorrect message length from %s: %d",
+                          addr[0], length)
+            return None
+
+        packet = telemetry.decode_from(message, offset)
+        self.store_metrics(packet, addr)
+        if self.history is not None:
+            self.history.append(packet, addr[0])
+        logging.debug("[ODSServer] %s", packet)
+        sender.update(packet, addr)
+        self.state = packet
+        self.current_sender = addr
+        return packet
+
+    def store_metrics(self, packet, addr=None):
+        pod = addr[0] if addr is not None else None
+        if self.layout == LAYOUT_LEGACY:
+            self.writer.submit(self.make_legacy_points(packet, pod))
+            return
+
+        self.writer.submit_lines(self.encoder.encode(packet, pod))
+
+    def make_legacy_points(self, packet, pod=None):
+        now = datetime.utcnow().isoformat() + "Z"
+        tags = {"pod": pod} if pod is not None else {}
         measurements = []
-        for name, value in list(data.items()):
+        for name, value in packet.as_dict().items():
             measurements.append({
                     "measurement": name,
-                    "tags": {},
-                    "time":  datetime.utcnow().isoformat() + "Z",
+                    "tags": tags,
+                    "time": now,
                     "fields": {"value": value}})
-        self.influx.write_points(measurements)
+        return measurements
 
-    def send_to_spacex(self, pkt):
+    def send_to_spacex(self, data):
         """Send to SpaceX over UDP"""
         if self.spacex_sock and self.spacex_addr:
-            self.spacex_sock.sendto(pkt.to_bytes(), self.spacex_addr)
+            self.spacex_sock.sendto(data, self.spacex_addr)
 
     def make_spacex_packet(self):
-        state_mapper = [
-            SpaceXStatus.IDLE,      # POST = 0,
-            SpaceXStatus.IDLE,      # Boot = 1,
-            SpaceXStatus.IDLE,      # LPFill = 2,
-            SpaceXStatus.IDLE,      # HPFill = 3,
-            SpaceXStatus.IDLE,      # Load = 4,
-            SpaceXStatus.IDLE,      # Standby = 5,
-            SpaceXStatus.READY,     # Armed = 6,
-            SpaceXStatus.PUSHING,   # Pushing = 7,
-            SpaceXStatus.COASTING,  # Coasting = 8,
-            SpaceXStatus.BRAKING,   # Braking = 9,
-            SpaceXStatus.IDLE,      # Vent = 10,
-            SpaceXStatus.IDLE,      # Retrieval = 11,
-            SpaceXStatus.FAULT,     # Emergency = 12,
-            SpaceXStatus.IDLE       # Shutdown = 13,
-        ]
-
-        spacex_status = 0
-        if self.state['state'] in state_mapper:
-            spacex_status = state_mapper[self.state['state']]
-
-        return SpaceXPacket(
-            team_id=self.team_id,
-            status=spacex_status,
-            position=int(self.state['position_x']) * 100,
-            velocity=int(self.state['velocity_x']) * 100,
-            acceleration=int(self.state['acceleration_x']) * 100,
-            battery_voltage=int(self.state['voltage_0']) * 1000,
-            battery_current=int(self.state['current_0']) * 1000,
-            battery_temperature=int(self.state['power_thermo_0']) * 10,
-            pod_temperature=int(self.state['frame_thermo']) * 10,
-            stripe_count=int(0)
-        )
+        """Returns the latest state packed for SpaceX. The buffer is reused
+        by the next call."""
+        return self.spacex_encoder.encode(self.state)
+
+
+def make_writer(args, influx, writer_class=InfluxWriter, spool="spool"):
+    """Creates the Influx writer and starts its spool thread (and its batching
+    thread, unless it runs on an event loop)"""
+    writer = writer_class(influx, args.influx_name,
+                          batch_size=args.influx_batch_size,
+                          flush_interval=args.influx_flush_interval / 1000.0,
+                          max_queue=args.influx_queue_size)
+
+    if args.spool:
+        spool_dir = os.path.join(args.directory, spool)
+        logging.info("[ODS] Spooling telemetry to %s", spool_dir)
+        # Influx may have been down at startup, create the database before
+        # draining into it
+        writer.spool = Spool(spool_dir, writer.post,
+                             prepare=writer.create_database)
+        threading.Thread(target=writer.spool.run).start()
+
+    if writer_class is InfluxWriter:
+        threading.Thread(target=writer.run).start()
+    return writer
+
+
+def make_recorder(args, suffix=""):
+    """Creates and starts the capture recorder if --capture was given"""
+    if not args.capture:
+        return None
+
+    capture_path = os.path.join(
+        args.directory,
+        datetime.now().strftime("ods-%Y%m%d-%H%M%S") + suffix + ".cap")
+    logging.info("[ODS] Recording datagrams to %s", capture_path)
+    recorder = CaptureRecorder(capture_path)
+    threading.Thread(target=recorder.run).start()
+    return recorder
 
 
 def main():
     parser = argparse.ArgumentParser(description="Paradigm (formerly "
                                                  "Openloop) Data Shuttle")
 
-    parser.add_argument("-v", "--verbose", action="store_true")
+    parser.add_argument("-v", "--verbose", action="store_true",
+                        help="Log every packet")
+
+    parser.add_argument("--summary-interval", type=float, default=1.0,
+                        help="Seconds between telemetry summary lines "
+                             "(0 to disable)")
 
     parser.add_argument("-p", "--port", type=int, default=7778,
                         help="Server listen port")
 
+    parser.add_argument("--async", dest="use_async", action="store_true",
+                        help="Run telemetry, storage and the pod link on an "
+                             "asyncio event loop instead of threads (Python "
+                             "3.5+)")
+
+    parser.add_argument("--workers", type=int, default=0,
+                        help="Receive telemetry in this many processes, "
+                             "sharing the port with SO_REUSEPORT")
+
+    parser.add_argument("--rcvbuf", type=int, default=4 * 1024 * 1024,
+                        help="Telemetry socket receive buffer (bytes)")
+
+    parser.add_argument("--recv-batch", type=int, default=64,
+                        help="Datagrams to read per receive call")
+
+    parser.add_argument("--ring-slots", type=int, default=4096,
+                        help="Received datagrams to buffer for decoding")
+
     parser.add_argument("-d", "--directory", default='.',
                         help="directory to store raw log and data files in")
+    parser.add_argument("--capture", action="store_true",
+                        help="Record every received datagram to a capture "
+                             "file in DIRECTORY")
+    parser.add_argument("--spool", action="store_true",
+                        help="Spool telemetry to DIRECTORY/spool before "
+                             "writing it to Influxdb")
     parser.add_argument("-s", "--serial", default=None,
                         help="Serial device that spits out raw data")
+    parser.add_argument("--baudrate", default=115200, type=int,
+                        help="Baud rate of the serial device")
 
     # Used for the SpaceX data stream format
     parser.add_argument("--spacex-host", default=None,
                         help="IP of the SpaceX data reciever (192.168.0.1)")
     parser.add_argument("--spacex-port", default=3000, type=int,
                         help="The SpaceX data reciever port")
+    parser.add_argument("--spacex-interval", default=DEFAULT_INTERVAL,
+                        type=float,
+                        help="Seconds between packets sent to SpaceX")
     parser.add_argument("--team-id", default=0, type=int,
                         help="The team id assigned by spacex")
 
@@ -294,6 +356,17 @@ def main():
                         help="The hostname/ip to bind the HTTP Server to")
     parser.add_argument("--http-port", default=7777, type=int,
                         help="The port to bind the HTTP Server to")
+    parser.add_argument("--http-workers", default=http_server.DEFAULT_WORKERS,
+                        type=int,
+                        help="Threads serving HTTP connections (0 to use "
+                             "the Flask development server)")
+    parser.add_argument("--http-keepalive",
+                        default=http_server.DEFAULT_KEEPALIVE, type=float,
+                        help="Seconds an idle HTTP connection is kept open")
+    parser.add_argument("--http-streams",
+                        default=http_server.DEFAULT_STREAMS, type=int,
+                        help="Max /stream responses served at once, each on "
+                             "its own thread")
 
     # Influx arguments
     parser.add_argument("--influx-host", default='127.0.0.1',
@@ -311,7 +384,34 @@ def main():
     parser.add_argument("--influx-name", default='example',
                         help="Influxdb database name")
 
-    parser.add_argument("--web-root", default='../web/src',
+    parser.add_argument("--influx-layout", default=LAYOUT_PACKET,
+                        choices=[LAYOUT_PACKET, LAYOUT_LEGACY],
+                        help="Store each packet as one point in the "
+                             "'telemetry' measurement, or each field as its "
+                             "own measurement (legacy)")
+
+    parser.add_argument("--influx-batch-size", default=500, type=int,
+                        help="Packets to buffer before writing to Influxdb")
+
+    parser.add_argument("--influx-flush-interval", default=100, type=int,
+                        help="Max age of buffered packets before writing to "
+                             "Influxdb (ms)")
+
+    parser.add_argument("--influx-queue-size", default=10000, type=int,
+                        help="Packets to queue for Influxdb before dropping")
+
+    parser.add_argument("--history-size", default=history.DEFAULT_SIZE,
+                        type=int,
+                        help="Packets of telemetry to keep in memory for "
+                             "/history (0 to disable, needs NumPy)")
+    parser.add_argument("--state-max-rate", default=DEFAULT_RATE, type=float,
+                        help="Max times per second /state is re-encoded "
+                             "(0 for every change)")
+    parser.add_argument("--stream-max-rate", default=MAX_RATE, type=float,
+                        help="Max updates per second sent to /stream "
+                             "clients (0 to disable streaming)")
+
+    parser.add_argument("--web-root", default=WEB_ROOT,
                         help="Path to the Pod Web Static Files")
 
     parser.add_argument("--pod-addr", default='192.168.0.10',
@@ -319,64 +419,184 @@ def main():
 
     parser.add_argument("--pod-port", default=7779, type=int,
                         help="Command Port on the pod")
+    parser.add_argument("--pod-fence", action="store_true",
+                        help="Pipeline pod commands, each followed by a "
+                             "ping to mark the end of its reply (needs pod "
+                             "firmware that splits commands on newlines)")
+    parser.add_argument("--heartbeat-interval", type=float, default=10.0,
+                        help="Seconds between pings to the pod")
+    parser.add_argument("--heartbeat-moving-interval", type=float,
+                        default=0.5,
+                        help="Seconds between pings while the pod is moving "
+                             "(0 to always use --heartbeat-interval)")
+    parser.add_argument("--pod-metrics-interval", type=float, default=1.0,
+                        help="Seconds between pod link metrics written to "
+                             "Influxdb (0 to disable)")
 
     args = parser.parse_args()
 
-    if args.verbose:
-        logging.basicConfig(level=logging.DEBUG)
+    if args.workers and args.use_async:
+        parser.error("--workers can not be combined with --async")
+
+    # Plain console logging until log.setup, whose listener thread has to
+    # wait until the workers have forked
+    logging.basicConfig(level=logging.DEBUG if args.verbose else logging.INFO,
+                        format=log.FORMAT, stream=sys.stdout)
 
     # Create connection to influx database
     influx = InfluxDBClient(args.influx_host, args.influx_port,
                             args.influx_user, args.influx_pass,
                             args.influx_name)
 
-    if {'name': args.influx_name} not in influx.get_list_database():
-        influx.create_database(args.influx_name)
-
-    if args.serial:
-        print("Starting raw serial reader on: %s" % args.serial)
-        raw = RawReader(filename=args.serial, influx=influx)
-        threading.Thread(target=raw.run_safe).start()
+    try:
+        create_database(influx, args.influx_name)
+    except Exception as e:
+        if not args.spool:
+            raise
+        logging.warning("[ODS] Influxdb is unavailable, spooling "
+                        "telemetry: %s", e)
 
     spacex_addr = None
     # Setup the data handler, tell it about the spacex server
     if args.spacex_host:
-        print(("Forwarding Telemetry to %s:%d" % (args.spacex_host,
-                                                  args.spacex_port)))
+        logging.info("[ODS] Forwarding Telemetry to %s:%d", args.spacex_host,
+                     args.spacex_port)
         spacex_addr = (args.spacex_host, args.spacex_port)
 
-    print(("Starting ODS Server on udp://0.0.0.0:%d" % args.port))
-    server = ODSServer(("", args.port), args.team_id, spacex_addr, influx)
+    pool = None
+    if args.workers:
+        def make_worker(index):
+            log.setup(args.verbose)
+            worker_influx = InfluxDBClient(args.influx_host, args.influx_port,
+                                           args.influx_user, args.influx_pass,
+                                           args.influx_name)
+            return ODSServer(("", args.port), args.team_id, None,
+                             make_writer(args, worker_influx,
+                                         spool="spool-worker-%d" % index),
+                             layout=args.influx_layout,
+                             recorder=make_recorder(args, "-w%d" % index),
+                             reuse_port=True, rcvbuf=args.rcvbuf,
+                             batch_size=args.recv_batch,
+                             ring_size=args.ring_slots)
+
+        # Fork before any threads are started in this process
+        logging.info("[ODS] Starting %d ODS workers on udp://0.0.0.0:%d",
+                     args.workers, args.port)
+        pool = WorkerPool(args.workers, make_worker)
+        pool.start()
+
+    log.setup(args.verbose)
+
+    loop = None
+    writer_class = InfluxWriter
+    if args.use_async:
+        # Python 3.5 syntax, only imported when asked for
+        import asyncio
+        from openloop import aio
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        writer_class = aio.AsyncInfluxWriter
+
+    writer = make_writer(args, influx, writer_class)
+
+    raw = None
+    if args.serial:
+        logging.info("[ODS] Starting raw serial reader on: %s", args.serial)
+        raw = RawReader(filename=args.serial, baudrate=args.baudrate,
+                        writer=writer)
+        threading.Thread(target=raw.run_safe).start()
+
+    if pool is not None:
+        # The workers own the telemetry port, this server only holds their
+        # merged state for the HTTP API and SpaceX
+        server = ODSServer(("", args.port), args.team_id, spacex_addr, writer,
+                           layout=args.influx_layout)
+        server.workers = pool
+        threading.Thread(target=pool.run, args=(server,)).start()
+    else:
+        logging.info("[ODS] Starting ODS Server on udp://0.0.0.0:%d",
+                     args.port)
+        server = ODSServer(("", args.port), args.team_id, spacex_addr, writer,
+                           layout=args.influx_layout,
+                           recorder=make_recorder(args), rcvbuf=args.rcvbuf,
+                           batch_size=args.recv_batch,
+                           ring_size=args.ring_slots)
+    server.snapshots = SnapshotPublisher(server, args.state_max_rate)
+    server.raw = raw
+    if args.history_size > 0 and not history.AVAILABLE:
+        logging.warning("[ODS] NumPy is not installed, /history is disabled")
+    elif args.history_size > 0:
+        server.history = history.TelemetryHistory(args.history_size)
+    if args.stream_max_rate > 0:
+        server.stream = StreamHub(server, args.stream_max_rate)
+        threading.Thread(target=server.stream.run, daemon=True).start()
     set_ods(server)
 
+    if spacex_addr:
+        server.forwarder = SpaceXForwarder(server, args.spacex_interval)
+        if not args.use_async:
+            threading.Thread(target=server.forwarder.run).start()
+
+    if args.summary_interval > 0:
+        summary = log.TelemetrySummary(server, args.summary_interval)
+        threading.Thread(target=summary.run, daemon=True).start()
+
     pod_addr = (args.pod_addr, args.pod_port)
-    pod = Pod(pod_addr)
+    if args.use_async:
+        pod = aio.AsyncPod(pod_addr, fence=args.pod_fence)
+    else:
+        pod = Pod(pod_addr, fence=args.pod_fence)
 
     set_pod(pod)
 
+    if args.pod_metrics_interval > 0:
+        exporter = MetricsExporter(pod, writer, args.pod_metrics_interval)
+        threading.Thread(target=exporter.run, daemon=True).start()
+
     http_addr = (args.http_host, args.http_port)
-    print("Starting HTTP Server on tcp://%s:%d" % http_addr)
+    logging.info("[ODS] Starting HTTP Server on tcp://%s:%d", *http_addr)
+
+    set_web_root(args.web_root)
+
+    if args.http_workers > 0:
+        httpd = http_server.make_server(args.http_host, args.http_port, app,
+                                        args.http_workers,
+                                        args.http_keepalive,
+                                        args.http_streams)
+        server.http = httpd
+        t2 = threading.Thread(target=httpd.serve_forever)
+    else:
+        # Threaded so /stream clients do not block other requests
+        t2 = threading.Thread(target=app.run, args=list(http_addr),
+                              kwargs={"threaded": True})
+    t2.start()
 
-    WEB_ROOT = args.web_root
+    def pod_is_moving():
+        # Telemetry notices movement well before the next idle ping
+        return pod.is_moving() or server.is_moving()
 
-    t2 = threading.Thread(target=app.run, args=list(http_addr))
-    t2.start()
+    heart = Heart(args.heartbeat_interval, pod.ping,
+                  args.heartbeat_moving_interval, pod_is_moving)
+    server.heart = heart
 
-    print("Connecting to pod tcp://%s:%d" % pod_addr)
+    if args.use_async:
+        logging.info("[ODS] Connecting to pod tcp://%s:%d", *pod_addr)
+        loop.run_until_complete(aio.serve(server, pod, writer, heart))
+        return
+
+    logging.info("[ODS] Connecting to pod tcp://%s:%d", *pod_addr)
     while not pod.is_connected():
         try:
             pod.connect()
         except Exception as e:
-            print(e)
+            logging.error("[ODS] Pod connection failed: %s", e)
         time.sleep(1)
 
-    heart = Heart(10, pod.ping)
-
-    t1 = threading.Thread(target=server.run)
-    t1.start()
+    if pool is None:
+        t1 = threading.Thread(target=server.run)
+        t1.start()
 
-    t3 = threading.Thread(target=heart.start)
-    t3.start()
+    heart.start()
 
     # Maintain Connection if it fails
     while True:
@@ -384,7 +604,7 @@ def main():
             if not pod.is_connected():
                 pod.connect()
         except Exception as e:
-            print(e)
+            logging.error("[ODS] Pod connection failed: %s", e)
         time.sleep(1)
 
 
@@ -0,0 +1,335 @@
+"""
+asyncio runtime for ODS.
+
+Runs telemetry ingest, Influx batching, SpaceX forwarding and the pod command
+link as tasks on one event loop instead of a thread per subsystem:
+
+* `TelemetryProtocol` receives datagrams and hands them to
+  `ODSServer.handle_datagram`
+* `AsyncInfluxWriter` batches submissions from an asyncio queue and runs the
+  blocking HTTP post in the default executor
+* `AsyncPod` keeps the TCP command link up with backoff and pings it
+* `forward` runs a `SpaceXForwarder`, sending the latest state to SpaceX on
+  a timer
+
+The Flask app still runs in its WSGI server thread; it reaches the pod through
+`AsyncPod.run`, which schedules the command on the loop.
+"""
+import time
+import socket
+import asyncio
+import logging
+import threading
+from datetime import timedelta
+from openloop.pod import ReplyFramer, MAX_MESSAGE_SIZE, PING_TIMEOUT, \
+    parse_pong, quickack
+from openloop.writer import InfluxWriter
+from openloop.udp import configure_socket
+from openloop.metrics import LinkMetrics
+
+
+class AsyncInfluxWriter(InfluxWriter):
+    """
+    InfluxWriter whose queue and batching loop live on the event loop.
+
+    Create it with the loop `run_async` will run on set as the current one.
+    Submissions from any other thread, or from before the loop runs, are
+    handed to the loop with call_soon_threadsafe, as asyncio queues are not
+    thread safe.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.queue = asyncio.Queue(maxsize=self.queue.maxsize)
+        self.loop = asyncio.get_event_loop()
+        self.loop_thread = None
+
+    def _put(self, item, points):
+        if threading.get_ident() != self.loop_thread:
+            # e.g. the RawReader, which starts before the loop does
+            self.loop.call_soon_threadsafe(self._put, item, points)
+            return True
+
+        try:
+            self.queue.put_nowait((item, points))
+        except asyncio.QueueFull:
+            with self.lock:
+                self.dropped += points
+            return False
+
+        with self.lock:
+            self.submitted += points
+            depth = self.queue.qsize()
+            if depth > self.high_water:
+                self.high_water = depth
+        return True
+
+    async def run_async(self):
+        """Batches submissions and flushes them in the executor until stop()
+        is called"""
+        loop = asyncio.get_event_loop()
+        self.loop = loop
+        self.loop_thread = threading.get_ident()
+        self.running = True
+        batch = []
+        points = 0
+        deadline = None
+
+        while self.running or not self.queue.empty():
+            timeout = self.flush_interval
+            if deadline is not None:
+                timeout = max(0, deadline - time.monotonic())
+
+            try:
+                item, count = await asyncio.wait_for(self.queue.get(),
+                                                     timeout)
+            except asyncio.TimeoutError:
+                item = None
+
+            if item is not None:
+                if deadline is None:
+                    deadline = time.monotonic() + self.flush_interval
+                batch.append(item)
+                points += count
+
+            if batch and (len(batch) >= self.batch_size or
+                          time.monotonic() >= deadline):
+                await loop.run_in_executor(None, self.flush, batch, points)
+                batch = []
+                points = 0
+                deadline = None
+
+        if batch:
+            await loop.run_in_executor(None, self.flush, batch, points)
+
+
+class TelemetryProtocol(asyncio.DatagramProtocol):
+    """Feeds received datagrams to the ODSServer"""
+
+    def __init__(self, server):
+        self.server = server
+
+    def datagram_received(self, data, addr):
+        self.server.handle_datagram(data, addr)
+
+    def error_received(self, exc):
+        logging.error("[TelemetryProtocol] %s", exc)
+
+
+class AsyncPod:
+    """
+    asyncio client for the pod command server.
+
+    Mirrors the `Pod` interface used by the HTTP app (`run`, `is_connected`,
+    `state`) so it can be handed to `set_pod`, and frames commands the same
+    way: each waits on a future that a reader task resolves through the
+    `ReplyFramer`. By default commands go one at a time and a timeout drops
+    the link; with `fence` each is written as soon as it is issued, a
+    command that times out keeps its place in line, and only a ping
+    timeout drops the link.
+    """
+
+    def __init__(self, addr, backoff=1.0, max_backoff=30.0, fence=False):
+        self.addr = addr
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.reader = None
+        self.writer = None
+        self.state = None
+        self.loop = None
+        self.closed = asyncio.Event()
+        self.framer = ReplyFramer(fence)
+        self.timeout_handler = None
+        self.metrics = LinkMetrics()
+
+    def is_connected(self):
+        return self.writer is not None
+
+    def is_moving(self):
+        return self.state is not None and self.state.is_moving()
+
+    async def connect(self):
+        start = time.monotonic()
+        try:
+            self.reader, self.writer = await asyncio.wait_for(
+                asyncio.open_connection(*self.addr), 1)
+        except Exception:
+            self.metrics.connect_failed(time.monotonic() - start)
+            raise
+        self.metrics.connected(time.monotonic() - start)
+
+        sock = self.writer.get_extra_info("socket")
+        if sock is not None:
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.closed.clear()
+        asyncio.ensure_future(self.read(self.reader))
+
+    async def read(self, reader):
+        """Reads responses from reader until it closes"""
+        sock = self.writer.get_extra_info("socket")
+        try:
+            while True:
+                data = await reader.read(MAX_MESSAGE_SIZE)
+                if not data or self.reader is not reader:
+                    break
+                if sock is not None:
+                    quickack(sock)
+                self.metrics.received(len(data))
+                replies = self.framer.feed(data)
+                self.write(self.framer.next_message())
+                for reply in replies:
+                    self.dispatch(*reply)
+        except OSError as e:
+            logging.debug("[AsyncPod] Reader stopped: %s", e)
+
+        if self.reader is reader:
+            self.close()
+
+    def dispatch(self, kind, future, sent, reply):
+        """Resolves the future for one complete reply"""
+        if kind != ReplyFramer.COMMAND:
+            self.state = parse_pong(reply)
+        if future is None or future.done():
+            return
+        rtt = self.metrics.ping if kind == ReplyFramer.PING else \
+            self.metrics.command
+        rtt.observe(time.monotonic() - sent)
+        future.set_result(reply)
+
+    def close(self):
+        if self.writer is not None:
+            self.state = None
+            self.writer.close()
+            self.writer = None
+            self.reader = None
+            self.closed.set()
+            self.metrics.closed()
+
+        # Nothing more will be answered
+        for future in self.framer.clear():
+            if not future.done():
+                future.set_result(None)
+
+    async def maintain(self):
+        """Keeps the connection up, backing off exponentially on failure"""
+        self.loop = asyncio.get_event_loop()
+        delay = self.backoff
+        while True:
+            try:
+                await self.connect()
+            except Exception as e:
+                logging.error("[AsyncPod] Connection to %s:%d failed: %s",
+                              *(self.addr + (e,)))
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, self.max_backoff)
+                continue
+
+            logging.info("[AsyncPod] Connected to pod tcp://%s:%d",
+                         *self.addr)
+            delay = self.backoff
+            await self.closed.wait()
+
+    async def heartbeat(self, heart):
+        """Pings the pod on heart's schedule while connected"""
+        heart.running = True
+        heart.deadline = time.monotonic()
+        while heart.running:
+            now = time.monotonic()
+            if heart.due(now):
+                heart.begin(now)
+                if self.is_connected():
+                    await self.ping()
+                heart.end(time.monotonic())
+                now = time.monotonic()
+            await asyncio.sleep(max(heart.wake(now) - now, 0))
+
+    async def ping(self):
+        response = await self.command("ping", timeout=PING_TIMEOUT)
+        if response is None:
+            if self.timeout_handler is not None:
+                self.timeout_handler()
+            self.close()
+        elif 'PONG:' in response:
+            self.state = parse_pong(response)
+
+    async def command(self, cmd, timeout=None):
+        """Sends a command and returns the response, or None on timeout or
+        disconnect"""
+        if timeout is None:
+            timeout = timedelta(seconds=1)
+        if not self.is_connected():
+            return None
+
+        future = asyncio.Future()
+        try:
+            self.write(self.framer.expect(cmd, future))
+            await self.writer.drain()
+            # Cancelled on timeout, its late reply is then discarded
+            return await asyncio.wait_for(future, timeout.total_seconds())
+        except asyncio.TimeoutError:
+            logging.debug("[AsyncPod] %s timed out", cmd)
+            self.metrics.timed_out(cmd == "ping")
+            if not self.framer.fence:
+                self.close()
+            return None
+        except OSError as e:
+            logging.debug("[AsyncPod] %s failed: %s", cmd, e)
+            self.close()
+            return None
+
+    def write(self, message):
+        if message and self.writer is not None:
+            self.writer.write(message)
+            self.metrics.sent(len(message))
+
+    def run(self, cmd, timeout=None):
+        """Runs a command from another thread, blocking until it completes"""
+        if self.loop is None or not self.is_connected():
+            return None
+        future = asyncio.run_coroutine_threadsafe(self.command(cmd, timeout),
+                                                  self.loop)
+        return future.result()
+
+    def stats(self):
+        waiting = self.framer.outstanding()
+        abandoned = sum(1 for future in waiting if future.cancelled())
+        stats = self.metrics.stats()
+        stats.update({
+            "addr": "%s:%d" % self.addr,
+            "connected": self.is_connected(),
+            "in_flight": len(waiting) - abandoned,
+            "abandoned": abandoned,
+            "unsolicited": self.framer.unsolicited
+        })
+        return stats
+
+    def __str__(self):
+        return "%s:%d" % self.addr
+
+
+async def forward(forwarder):
+    """Runs forwarder's ticks on the event loop"""
+    loop = asyncio.get_event_loop()
+    forwarder.running = True
+    # loop.time() is monotonic
+    forwarder.schedule.deadline = loop.time()
+    while forwarder.running:
+        delay = forwarder.schedule.delay(loop.time())
+        if delay > 0:
+            await asyncio.sleep(delay)
+        forwarder.step(loop.time())
+
+
+async def serve(server, pod, writer, heart):
+    """Runs ODS on the current event loop"""
+    loop = asyncio.get_event_loop()
+    host, port = server.addrport
+    transport, _ = await loop.create_datagram_endpoint(
+        lambda: TelemetryProtocol(server),
+        local_addr=(host or "0.0.0.0", port))
+    configure_socket(transport.get_extra_info("socket"), server.rcvbuf)
+
+    tasks = [writer.run_async(), pod.maintain(), pod.heartbeat(heart)]
+    if server.forwarder is not None:
+        tasks.append(forward(server.forwarder))
+    await asyncio.gather(*tasks)
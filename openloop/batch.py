@@ -0,0 +1,140 @@
+"""
+Vectorized decoding of whole telemetry captures.
+
+A buffer of concatenated packets is viewed through a NumPy structured dtype
+that mirrors `openloop.telemetry.FORMAT`, so decoding a run is a handful of
+array copies instead of one `struct.unpack` per packet. The solenoid flags are
+expanded from `solenoid_mask` into boolean columns in a single broadcast.
+
+`load_capture` reads ODS capture files as well, and `to_lines` encodes a
+decoded run into the same line protocol ODS writes, so a capture can be
+loaded into Influx without replaying it over UDP (`replay.py --influx`).
+"""
+import numpy as np
+from numpy.lib.stride_tricks import as_strided
+from openloop import telemetry, capture
+from openloop.telemetry import PACKET_LENGTH
+from openloop.line_protocol import TelemetryEncoder
+
+_NUMPY_CODES = {
+    "B": "u1",
+    "H": "<u2",
+    "I": "<u4",
+    "Q": "<u8",
+    "f": "<f4",
+}
+
+SOLENOID_NAMES = tuple(name for name, _ in telemetry.SOLENOIDS)
+SOLENOID_MASKS = np.array([mask for _, mask in telemetry.SOLENOIDS],
+                          dtype=np.uint32)
+
+
+def _make_dtype(solenoid_format):
+    """Packet fields followed by one solenoid_format column per solenoid"""
+    names, formats, offsets = [], [], []
+    offset = 0
+    for name, code, _ in telemetry.FIELDS:
+        names.append(name)
+        formats.append(_NUMPY_CODES[code])
+        offsets.append(offset)
+        offset += np.dtype(_NUMPY_CODES[code]).itemsize
+
+    for name in SOLENOID_NAMES:
+        names.append(name)
+        formats.append(solenoid_format)
+        offsets.append(offset)
+        offset += 1
+
+    return np.dtype({"names": names, "formats": formats, "offsets": offsets})
+
+
+# Raw on-the-wire packet
+PACKET_DTYPE = np.dtype([(name, _NUMPY_CODES[code])
+                         for name, code, _ in telemetry.FIELDS])
+
+# Decoded packet: the raw fields followed by one boolean per solenoid
+BATCH_DTYPE = _make_dtype(np.bool_)
+
+# Same memory as BATCH_DTYPE with the solenoids as 0/1 integers, which is how
+# they are stored in Influx
+EXPORT_DTYPE = _make_dtype(np.uint8)
+
+assert PACKET_DTYPE.itemsize == PACKET_LENGTH
+
+
+def decode_batch(buf, stride=None):
+    """
+    Decodes every packet in a buffer of concatenated records.
+
+    Returns an array of BATCH_DTYPE with one row per packet. Records may be
+    padded beyond PACKET_LENGTH; see `telemetry.record_stride`.
+    """
+    if stride is None:
+        stride = telemetry.record_stride(buf)
+
+    raw = np.frombuffer(buf, dtype=np.uint8)
+    count = 0
+    if len(raw) >= PACKET_LENGTH:
+        count = (len(raw) - PACKET_LENGTH) // stride + 1
+
+    rows = as_strided(raw, shape=(count, PACKET_LENGTH), strides=(stride, 1),
+                      writeable=False)
+
+    batch = np.empty(count, dtype=BATCH_DTYPE)
+    out = batch.view(np.uint8).reshape(count, BATCH_DTYPE.itemsize)
+    out[:, :PACKET_LENGTH] = rows
+    out[:, PACKET_LENGTH:] = \
+        (batch["solenoid_mask"][:, None] & SOLENOID_MASKS) != 0
+    return batch
+
+
+def load_capture(path, stride=None):
+    """
+    Memory maps a capture and decodes it with decode_batch. The capture is
+    either a file of concatenated packets or an ODS capture file, of which
+    only the records holding a whole packet are kept.
+    """
+    data = np.memmap(path, dtype=np.uint8, mode="r")
+    if len(data) < capture.HEADER_SIZE or \
+            data[:len(capture.MAGIC)].tobytes() != capture.MAGIC:
+        return decode_batch(data, stride)
+
+    _, _, record_size, _, _, count = capture.HEADER.unpack_from(
+        data[:capture.HEADER.size].tobytes())
+    # The file may be preallocated past the last record
+    count = min(count, (len(data) - capture.HEADER_SIZE) // record_size)
+    records = data[capture.HEADER_SIZE:
+                   capture.HEADER_SIZE + count * record_size]
+
+    batch = decode_batch(records[capture.RECORD_HEADER.size:], record_size)
+    # Datagram length, the last field of each record header
+    offset = capture.RECORD_HEADER.size - 2
+    lengths = records.reshape(count, record_size)[:, offset:offset + 2]
+    lengths = np.ascontiguousarray(lengths).view("<u2")[:, 0]
+    return batch[lengths == PACKET_LENGTH]
+
+
+def columns(batch):
+    """Returns a dict of field name to column array for the batch"""
+    return dict((name, batch[name]) for name in batch.dtype.names)
+
+
+def to_rows(batch):
+    """Returns each row as a tuple of the packet fields followed by the
+    solenoid flags as 0/1"""
+    return batch.view(EXPORT_DTYPE).tolist()
+
+
+def to_dicts(batch):
+    """Yields the same dict view as `TelemetryPacket.as_dict` for each row"""
+    names = BATCH_DTYPE.names
+    for row in to_rows(batch):
+        yield dict(zip(names, row))
+
+
+def to_lines(batch, pod=None, encoder=None):
+    """Yields the line protocol ODS writes for each row's packet"""
+    if encoder is None:
+        encoder = TelemetryEncoder()
+    for row in to_rows(batch):
+        yield encoder.encode_row(row, pod)
@@ -0,0 +1,305 @@
+"""
+Raw datagram capture files.
+
+A capture is a fixed-size header followed by fixed-size records, one per
+received datagram:
+
+    header: magic, version, record size, payload size, index interval, count
+    record: receive time (float seconds), sender IPv4, sender port,
+            datagram length, payload padded to PACKET_LENGTH
+
+Every `index_interval` records, (receive time, record number) is appended to a
+sidecar `<capture>.idx` file. Readers `mmap` both files and binary search the
+index to seek to a time in O(log n) without scanning the capture.
+"""
+import os
+import mmap
+import time
+import socket
+import struct
+import threading
+from openloop.telemetry import PACKET_LENGTH
+
+MAGIC = b"ODSCAP01"
+VERSION = 1
+
+HEADER = struct.Struct("<8sHHHIQ")
+HEADER_SIZE = 64
+RECORD_HEADER = struct.Struct("<d4sHH")
+RECORD_SIZE = RECORD_HEADER.size + PACKET_LENGTH
+INDEX_ENTRY = struct.Struct("<dQ")
+INDEX_SUFFIX = ".idx"
+
+# Offset of the record count within the header
+_COUNT_OFFSET = HEADER.size - 8
+
+
+class CaptureRecorder:
+    """
+    Appends datagrams to a capture file.
+
+    Records are packed into a preallocated buffer, so `record` is a couple of
+    pack_into calls on the receive thread. A full buffer is handed to the
+    background thread (`run`) and swapped for a spare one; only that thread
+    writes to disk, so the receive thread never waits on I/O. It also writes
+    out partially filled buffers every `flush_interval` seconds. Disk space
+    is reserved `preallocate` bytes at a time where the OS supports it.
+
+    Receive times come from the wall clock, which can step backwards, so
+    each is raised to at least the one before it to keep the index sorted.
+    """
+
+    def __init__(self, path, index_interval=1024, buffer_records=512,
+                 flush_interval=1.0, preallocate=64 * 1024 * 1024):
+        self.path = path
+        self.index_interval = index_interval
+        self.buffer_records = buffer_records
+        self.flush_interval = flush_interval
+        self.preallocate = preallocate
+        # Guards the buffers, taken by record_from
+        self.lock = threading.Lock()
+        # Signalled when a buffer fills
+        self.cond = threading.Condition(self.lock)
+        # Guards the files, only held while writing
+        self.io_lock = threading.Lock()
+        self.running = False
+
+        self.buffer = bytearray(buffer_records * RECORD_SIZE)
+        self.view = memoryview(self.buffer)
+        self.buffered = 0
+        self.count = 0
+        self.written = 0
+        self.last_time = 0.0
+        self.index = bytearray()
+        self.full = []
+        self.spare = []
+        self.allocated = 0
+        self.addresses = {}
+
+        self.file = open(path, "w+b")
+        self.file.write(HEADER.pack(MAGIC, VERSION, RECORD_SIZE,
+                                    PACKET_LENGTH, index_interval, 0)
+                        .ljust(HEADER_SIZE, b"\0"))
+        self.index_file = open(path + INDEX_SUFFIX, "wb")
+        self.reserve(HEADER_SIZE)
+
+    def reserve(self, size):
+        """Makes sure the file has at least size bytes allocated"""
+        if size <= self.allocated or not hasattr(os, "posix_fallocate"):
+            return
+        self.allocated = size + self.preallocate
+        try:
+            os.posix_fallocate(self.file.fileno(), 0, self.allocated)
+        except OSError:
+            pass
+
+    def record(self, payload, addr, timestamp=None):
+        """Appends one datagram received from addr"""
+        self.record_from(payload, 0, len(payload), addr, timestamp)
+
+    def record_from(self, buf, start, size, addr, timestamp=None):
+        """Appends the size byte datagram at start in buf, e.g. a PacketRing
+        slot, without copying it out first"""
+        if timestamp is None:
+            timestamp = time.time()
+
+        with self.lock:
+            if timestamp < self.last_time:
+                timestamp = self.last_time
+            self.last_time = timestamp
+
+            offset = self.buffered * RECORD_SIZE
+            length = min(size, PACKET_LENGTH)
+            ip = self.addresses.get(addr[0])
+            if ip is None:
+                ip = self.addresses[addr[0]] = socket.inet_aton(addr[0])
+            RECORD_HEADER.pack_into(self.buffer, offset, timestamp, ip,
+                                    addr[1], size)
+            dest = offset + RECORD_HEADER.size
+            self.view[dest:dest + length] = \
+                memoryview(buf)[start:start + length]
+            if length < PACKET_LENGTH:
+                self.buffer[dest + length:offset + RECORD_SIZE] = \
+                    bytes(PACKET_LENGTH - length)
+
+            if self.count % self.index_interval == 0:
+                self.index += INDEX_ENTRY.pack(timestamp, self.count)
+
+            self.buffered += 1
+            self.count += 1
+
+            if self.buffered == self.buffer_records:
+                self._hand_off()
+                self.cond.notify()
+
+    def _hand_off(self):
+        """Queues the current buffer for writing and starts a spare one.
+        Called with the lock held."""
+        self.full.append((self.buffer, self.buffered,
+                          self.count - self.buffered, self.index))
+        if self.spare:
+            self.buffer = self.spare.pop()
+        else:
+            # The disk is behind, grow rather than block the receive thread
+            self.buffer = bytearray(self.buffer_records * RECORD_SIZE)
+        self.view = memoryview(self.buffer)
+        self.buffered = 0
+        self.index = bytearray()
+
+    def run(self):
+        """Writes out full buffers as they are handed over, and partial ones
+        every flush_interval, until stop()"""
+        self.running = True
+        deadline = time.monotonic() + self.flush_interval
+        while self.running:
+            with self.lock:
+                timeout = deadline - time.monotonic()
+                if not self.full and timeout > 0:
+                    self.cond.wait(timeout)
+            partial = time.monotonic() >= deadline
+            if partial:
+                deadline = time.monotonic() + self.flush_interval
+            self._write(partial)
+
+    def stop(self):
+        with self.lock:
+            self.running = False
+            self.cond.notify()
+
+    def flush(self):
+        """Writes out everything recorded so far"""
+        self._write(True)
+
+    def _write(self, partial=False):
+        """Writes the handed off buffers, and the current one if partial,
+        to the file and returns them to the spares"""
+        with self.io_lock:
+            # Taken under io_lock so buffers reach the files in order
+            with self.lock:
+                if partial and self.buffered:
+                    self._hand_off()
+                full, self.full = self.full, []
+            if not full or self.file.closed:
+                return
+
+            for buffer, records, first, index in full:
+                end = HEADER_SIZE + (first + records) * RECORD_SIZE
+                self.reserve(end)
+                self.file.seek(HEADER_SIZE + first * RECORD_SIZE)
+                self.file.write(memoryview(buffer)[:records * RECORD_SIZE])
+                if index:
+                    self.index_file.write(index)
+                self.written = first + records
+
+            # Written after the records it counts
+            self.file.seek(_COUNT_OFFSET)
+            self.file.write(struct.pack("<Q", self.written))
+            self.file.flush()
+            self.index_file.flush()
+
+        with self.lock:
+            self.spare.extend(buffer for buffer, _, _, _ in full)
+
+    def close(self):
+        self.stop()
+        self.flush()
+        with self.io_lock:
+            self.file.truncate(HEADER_SIZE + self.written * RECORD_SIZE)
+            self.file.close()
+            self.index_file.close()
+
+
+class CaptureRecord:
+    __slots__ = ("timestamp", "addr", "payload")
+
+    def __init__(self, timestamp, addr, payload):
+        self.timestamp = timestamp
+        self.addr = addr
+        self.payload = payload
+
+
+class CaptureReader:
+    """Random access to a capture file through mmap"""
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as f:
+            self.data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        (magic, version, self.record_size, self.payload_size,
+         self.index_interval, self.count) = HEADER.unpack_from(self.data)
+        if magic != MAGIC:
+            raise ValueError("%s is not an ODS capture" % path)
+
+        available = (len(self.data) - HEADER_SIZE) // self.record_size
+        self.count = min(self.count, available)
+
+        self.index = b""
+        if os.path.exists(path + INDEX_SUFFIX) and \
+                os.path.getsize(path + INDEX_SUFFIX) > 0:
+            with open(path + INDEX_SUFFIX, "rb") as f:
+                self.index = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self.index_count = len(self.index) // INDEX_ENTRY.size
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, i):
+        if i < 0:
+            i += self.count
+        if not 0 <= i < self.count:
+            raise IndexError(i)
+
+        offset = HEADER_SIZE + i * self.record_size
+        timestamp, ip, port, length = \
+            RECORD_HEADER.unpack_from(self.data, offset)
+        start = offset + RECORD_HEADER.size
+        length = min(length, self.payload_size)
+        payload = memoryview(self.data)[start:start + length]
+        return CaptureRecord(timestamp, (socket.inet_ntoa(ip), port), payload)
+
+    def __iter__(self):
+        for i in range(self.count):
+            yield self[i]
+
+    def timestamp(self, i):
+        return struct.unpack_from("<d", self.data,
+                                  HEADER_SIZE + i * self.record_size)[0]
+
+    def find(self, timestamp):
+        """Returns the number of the first record received at or after
+        timestamp"""
+        lo, hi = 0, self.index_count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if INDEX_ENTRY.unpack_from(self.index,
+                                       mid * INDEX_ENTRY.size)[0] < timestamp:
+                lo = mid + 1
+            else:
+                hi = mid
+
+        # lo is the first indexed record at or after timestamp, so the answer
+        # lies between the previous index entry and this one
+        start = 0
+        if lo > 0:
+            start = INDEX_ENTRY.unpack_from(self.index,
+                                            (lo - 1) * INDEX_ENTRY.size)[1]
+        i = start
+        while i < self.count and self.timestamp(i) < timestamp:
+            i += 1
+        return i
+
+    def between(self, start=None, end=None):
+        """Yields the records received in [start, end)"""
+        i = 0 if start is None else self.find(start)
+        while i < self.count:
+            record = self[i]
+            if end is not None and record.timestamp >= end:
+                break
+            yield record
+            i += 1
+
+    def close(self):
+        self.data.close()
+        if self.index:
+            self.index.close()
@@ -1,23 +1,195 @@
+"""
+Heartbeats scheduled on the monotonic clock.
+
+A `Schedule` keeps the deadlines and their lateness for anything that runs
+every so often: hearts and the SpaceX forwarder. A `Heart` calls its callback every `interval` seconds, or every
+`fast_interval` seconds while its `fast` predicate is true (e.g. while the
+pod is moving). Deadlines advance from the previous deadline rather than from
+when the callback returned, so the period does not stretch by the callback's
+run time. Beats that are already a whole interval late are skipped and
+counted as missed rather than fired back to back.
+
+Hearts are driven by a `Scheduler`: one thread serving any number of them.
+`Heart.start()` registers with a shared scheduler unless given its own.
+Callbacks run on the scheduler thread, so a slow one delays the others and
+shows up as their lateness and missed beats.
+
+The predicate is checked every `fast_interval` seconds even while idle, so
+a heart tightens as soon as the pod starts moving instead of after its next
+idle beat.
+"""
 import time
-import traceback
+import logging
+import threading
+from collections import deque
+
 
+class Schedule:
+    """
+    Deadlines every `interval` seconds on the monotonic clock, and how late
+    the last `window` of them were met
+    """
 
-class Heart:
-    def __init__(self, interval, callback):
+    def __init__(self, interval, window=1000):
         self.interval = interval
+        self.deadline = time.monotonic()
+        self.lateness = deque(maxlen=window)
+        self.missed = 0
+
+    def current_interval(self):
+        return self.interval
+
+    def delay(self, now):
+        """Returns the seconds left until the deadline"""
+        return max(self.deadline - now, 0)
+
+    def begin(self, now):
+        """Records the deadline being met at now"""
+        self.lateness.append(now - self.deadline)
+
+    def end(self, now):
+        """Moves the deadline on once the work has finished at now,
+        skipping deadlines that have already passed"""
+        interval = self.current_interval()
+        deadline = self.deadline + interval
+        if now - deadline >= interval:
+            skipped = int((now - deadline) // interval)
+            self.missed += skipped
+            deadline += skipped * interval
+        self.deadline = deadline
+
+    def jitter(self):
+        """Returns the mean, 99th percentile and max lateness"""
+        lateness = sorted(self.lateness)
+        if not lateness:
+            return {"mean": 0.0, "p99": 0.0, "max": 0.0}
+        return {
+            "mean": sum(lateness) / len(lateness),
+            "p99": lateness[min(len(lateness) - 1,
+                                int(len(lateness) * 0.99))],
+            "max": lateness[-1]
+        }
+
+
+class Heart(Schedule):
+    def __init__(self, interval, callback, fast_interval=None, fast=None,
+                 scheduler=None, window=1000):
+        Schedule.__init__(self, interval, window)
         self.callback = callback
+        self.fast_interval = fast_interval
+        self.fast = fast if fast_interval else None
+        self.scheduler = scheduler
+        self.fast_mode = False
+        self.beats = 0
         self.running = False
 
-    def start(self):
-        self.running = True
+    def current_interval(self):
+        return self.fast_interval if self.fast_mode else self.interval
 
-        while self.running:
+    def due(self, now):
+        """Updates the mode from the predicate and returns whether a beat
+        is due"""
+        if self.fast is not None:
             try:
-                self.callback(self)
+                fast = bool(self.fast())
             except Exception as e:
-                print("[Heart] Exception: {}".format(e))
+                logging.error("[Heart] Predicate failed: %s", e)
+                fast = False
+            if fast and not self.fast_mode:
+                # Beat now rather than at the end of the idle interval
+                self.deadline = min(self.deadline, now)
+            self.fast_mode = fast
+        return self.deadline <= now
+
+    def wake(self, now):
+        """Returns when the scheduler next needs to look at this heart"""
+        if self.fast is not None and not self.fast_mode:
+            return min(self.deadline, now + self.fast_interval)
+        return self.deadline
+
+    def begin(self, now):
+        """Records the start of a beat"""
+        Schedule.begin(self, now)
+        self.beats += 1
 
-            time.sleep(self.interval)
+    def beat(self, now):
+        self.begin(now)
+        try:
+            self.callback(self)
+        except Exception:
+            logging.exception("[Heart] Beat failed")
+        self.end(time.monotonic())
+
+    def start(self):
+        """Starts beating on the scheduler (the shared one by default)"""
+        if self.scheduler is None:
+            self.scheduler = shared_scheduler()
+        self.running = True
+        self.deadline = time.monotonic()
+        self.scheduler.add(self)
 
     def stop(self):
         self.running = False
+        if self.scheduler is not None:
+            self.scheduler.remove(self)
+
+    def stats(self):
+        return {
+            "interval": self.current_interval(),
+            "mode": "fast" if self.fast_mode else "idle",
+            "beats": self.beats,
+            "missed": self.missed,
+            "jitter": self.jitter()
+        }
+
+
+class Scheduler:
+    """Runs any number of Hearts from one thread"""
+
+    def __init__(self):
+        self.hearts = []
+        self.cond = threading.Condition()
+        self.thread = None
+
+    def add(self, heart):
+        with self.cond:
+            if heart not in self.hearts:
+                self.hearts.append(heart)
+            if self.thread is None:
+                self.thread = threading.Thread(target=self.run, daemon=True)
+                self.thread.start()
+            self.cond.notify()
+
+    def remove(self, heart):
+        with self.cond:
+            if heart in self.hearts:
+                self.hearts.remove(heart)
+            self.cond.notify()
+
+    def run(self):
+        while True:
+            with self.cond:
+                now = time.monotonic()
+                due = [heart for heart in self.hearts
+                       if heart.running and heart.due(now)]
+                if not due:
+                    wake = [heart.wake(now) for heart in self.hearts]
+                    self.cond.wait(min(wake) - now if wake else None)
+                    continue
+
+            # Outside the lock so hearts can be added and stopped meanwhile
+            for heart in due:
+                heart.beat(time.monotonic())
+
+
+_shared = None
+_shared_lock = threading.Lock()
+
+
+def shared_scheduler():
+    """Returns the process wide Scheduler"""
+    global _shared
+    with _shared_lock:
+        if _shared is None:
+            _shared = Scheduler()
+        return _shared
@@ -0,0 +1,155 @@
+"""
+In-memory telemetry history.
+
+`TelemetryHistory` keeps the last `size` decoded packets in one preallocated
+NumPy array with a row per telemetry field, so appending a packet is a single
+column write and a query reads each requested field as a contiguous slice.
+Memory is fixed at `size * len(FIELD_NAMES) * 8` bytes however long ODS runs.
+
+Each packet is stored with the pod that sent it, and a query reads one pod,
+by default the one that sent the newest packet, so packets from several pods
+are never mixed into one series. Queries select packets by their own
+timestamp (in seconds) and can downsample into equal-width time buckets,
+returning the min, max and mean of each field in every bucket that holds
+data. Readings that are NaN or infinite come back as None, which JSON encodes
+as null.
+
+NumPy is optional for ODS as a whole; without it `AVAILABLE` is False and
+/history is left disabled.
+"""
+import threading
+from openloop.telemetry import FIELD_NAMES
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+AVAILABLE = np is not None
+
+DEFAULT_SIZE = 60000
+
+_TIME = FIELD_NAMES.index("timestamp")
+
+
+class TelemetryHistory:
+    def __init__(self, size=DEFAULT_SIZE):
+        self.size = size
+        self.values = np.zeros((len(FIELD_NAMES), size))
+        self.rows = dict((name, i) for i, name in enumerate(FIELD_NAMES))
+        # Index into pods of the sender of each packet
+        self.senders = np.zeros(size, dtype=np.int32)
+        self.pods = []
+        self.pod_index = {}
+        self.count = 0
+        self.lock = threading.Lock()
+
+    def append(self, packet, pod=None):
+        """Stores packet as sent by pod (its IP)"""
+        with self.lock:
+            sender = self.pod_index.get(pod)
+            if sender is None:
+                sender = self.pod_index[pod] = len(self.pods)
+                self.pods.append(pod)
+            i = self.count % self.size
+            self.values[:, i] = packet
+            self.senders[i] = sender
+            self.count += 1
+
+    def __len__(self):
+        return min(self.count, self.size)
+
+    def query(self, fields, since=None, until=None, buckets=None, pod=None):
+        """
+        Returns {"pod": pod, "time": [...], field: [...]} for the packets
+        from pod with a timestamp in [since, until] seconds, pod being the
+        sender of the newest packet if not given. A negative since is
+        relative to the pod's newest packet, e.g. -60 for the last minute.
+
+        With buckets, the range is split into that many equal-width buckets
+        and each field maps to {"min": [...], "max": [...], "mean": [...]},
+        with "time" holding the start of each non-empty bucket.
+
+        Raises KeyError for an unknown field.
+        """
+        rows = [self.rows[name] for name in fields]
+
+        with self.lock:
+            n = len(self)
+            if pod is None and n:
+                pod = self.pods[self.senders[(self.count - 1) % self.size]]
+            times = self.values[_TIME, :n] / 1e6
+            selected = self.senders[:n] == self.pod_index.get(pod, -1)
+            if since is not None and since < 0 and selected.any():
+                since = times[selected].max() + since
+
+            if since is not None:
+                selected &= times >= since
+            if until is not None:
+                selected &= times <= until
+
+            # Oldest first
+            order = np.nonzero(selected)[0]
+            if self.count > self.size:
+                order = np.roll(order, -np.searchsorted(
+                    order, self.count % self.size))
+            times = times[order]
+            data = self.values[np.ix_(rows, order)]
+
+        if buckets is None:
+            result = {"pod": pod, "time": times.tolist()}
+            for name, column in zip(fields, data):
+                result[name] = finite_list(column)
+            return result
+
+        result = self.downsample(fields, times, data, buckets)
+        result["pod"] = pod
+        return result
+
+    def downsample(self, fields, times, data, buckets):
+        result = {"time": []}
+        for name in fields:
+            result[name] = {"min": [], "max": [], "mean": []}
+        if not len(times):
+            return result
+
+        # Datagrams can arrive out of order, or from several workers
+        order = np.argsort(times, kind="mergesort")
+        times = times[order]
+        data = data[:, order]
+
+        start = times[0]
+        width = (times[-1] - start) / buckets or 1.0
+        bucket = np.minimum(((times - start) / width).astype(np.int64),
+                            buckets - 1)
+        # Index of the first packet in every non-empty bucket
+        starts = np.flatnonzero(np.concatenate(
+            ([True], bucket[1:] != bucket[:-1])))
+        counts = np.diff(np.append(starts, len(times)))
+
+        result["time"] = (start + bucket[starts] * width).tolist()
+        for name, column in zip(fields, data):
+            result[name] = {
+                "min": finite_list(np.minimum.reduceat(column, starts)),
+                "max": finite_list(np.maximum.reduceat(column, starts)),
+                "mean": finite_list(np.add.reduceat(column, starts) / counts)
+            }
+        return result
+
+    def stats(self):
+        return {
+            "size": self.size,
+            "stored": len(self),
+            "pods": len(self.pods),
+            "bytes": self.values.nbytes + self.senders.nbytes
+        }
+
+
+def finite_list(column):
+    """Returns column as a list with NaN and infinities as None"""
+    finite = np.isfinite(column)
+    if finite.all():
+        return column.tolist()
+    column = column.astype(object)
+    column[~finite] = None
+    return column.tolist()
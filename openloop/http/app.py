@@ -1,6 +1,7 @@
 import os
 from flask import Flask, g, jsonify, current_app, request, send_from_directory
-from flask import redirect
+from flask import redirect, Response
+from openloop.stream import DEFAULT_RATE
 
 app = Flask(__name__)
 _ods = None
@@ -9,6 +10,11 @@ _pod = None
 WEB_ROOT = os.environ.get('WEB_ROOT', '../web/src')
 DATA_SERVICES = os.path.realpath(os.path.join(__file__, '../../data_services'))
 
+# Seconds browsers may reuse static files before revalidating them against
+# their ETag / Last-Modified
+UI_MAX_AGE = 300
+app.config['SEND_FILE_MAX_AGE_DEFAULT'] = UI_MAX_AGE
+
 
 def get_ods():
     """Returns the ODS server"""
@@ -32,6 +38,12 @@ def set_pod(pod):
     _pod = pod
 
 
+def set_web_root(path):
+    """Tells flask where the Pod Web static files are"""
+    global WEB_ROOT
+    WEB_ROOT = path
+
+
 def send_path(path):
     if os.path.isdir(path):
         path = os.path.join(path, 'index.html')
@@ -56,7 +68,116 @@ def index():
 
 @app.route("/state")
 def state():
-    return jsonify(get_ods().get_state())
+    """
+    The latest telemetry, optionally limited with ?fields=a,b. Served from
+    the current snapshot's pre-encoded bytes, with an ETag so an unchanged
+    state answers If-None-Match with 304.
+    """
+    fields = tuple(f for f in request.args.get('fields', '').split(',') if f)
+    compress = 'gzip' in request.headers.get('Accept-Encoding', '')
+    try:
+        body, etag, gzipped = get_ods().snapshots.latest().encode(
+            fields or None, compress)
+    except KeyError as e:
+        return jsonify({"msg": "Unknown field {}".format(e)}), 400
+
+    headers = {
+        'ETag': '"%s"' % etag,
+        'Cache-Control': 'no-cache',
+        'Vary': 'Accept-Encoding'
+    }
+    if request.if_none_match.contains_weak(etag):
+        return Response(status=304, headers=headers)
+    if gzipped:
+        headers['Content-Encoding'] = 'gzip'
+    return Response(body, mimetype='application/json', headers=headers)
+
+
+@app.route("/history")
+def history():
+    """
+    Recent telemetry from memory:
+
+        /history?fields=velocity_x,hp_pressure&since=-60&buckets=200
+
+    since and until are packet timestamps in seconds, a negative since is
+    relative to the newest packet. buckets downsamples to min/max/mean. pod
+    selects the sender by IP, by default the one that sent the newest
+    packet. Readings that are not finite are null.
+    """
+    history = get_ods().history
+    if history is None:
+        return jsonify({"msg": "History is disabled"}), 404
+
+    fields = [f for f in request.args.get('fields', '').split(',') if f]
+    if not fields:
+        return jsonify({"msg": "fields is required"}), 400
+
+    try:
+        since = request.args.get('since', None, type=float)
+        until = request.args.get('until', None, type=float)
+        buckets = request.args.get('buckets', None, type=int)
+        if buckets is not None and buckets < 1:
+            raise ValueError(buckets)
+        pod = request.args.get('pod', None)
+        return jsonify(history.query(fields, since, until, buckets, pod))
+    except KeyError as e:
+        return jsonify({"msg": "Unknown field {}".format(e)}), 400
+    except ValueError:
+        return jsonify({"msg": "buckets must be a positive integer"}), 400
+
+
+@app.route("/stream")
+def stream():
+    """
+    Live telemetry as Server-Sent Events:
+
+        /stream?fields=velocity_x,state&rate=20
+
+    Each event holds the fields that changed since the last one, at most
+    rate times a second (default 10, all fields if none are given).
+    """
+    hub = get_ods().stream
+    if hub is None:
+        return jsonify({"msg": "Streaming is disabled"}), 404
+
+    fields = [f for f in request.args.get('fields', '').split(',') if f]
+    try:
+        rate = request.args.get('rate', DEFAULT_RATE, type=float)
+        group = hub.subscribe(fields, rate)
+    except KeyError as e:
+        return jsonify({"msg": "Unknown field {}".format(e)}), 400
+    except ValueError:
+        return jsonify({"msg": "rate must be positive"}), 400
+
+    return Response(hub.events(group), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache',
+                             'X-Accel-Buffering': 'no'})
+
+
+@app.route("/pods")
+def pods():
+    return jsonify(get_ods().get_pods())
+
+
+@app.route("/pods/<name>/state")
+def pod_state(name):
+    pod = get_ods().get_pod(name)
+    if pod is None:
+        msg = "{} has not sent any telemetry".format(name)
+        return jsonify({"msg": msg}), 404
+    return jsonify(pod.get_state())
+
+
+@app.route("/stats")
+def stats():
+    return jsonify(get_ods().get_stats())
+
+
+@app.route("/pod/stats")
+def pod_stats():
+    """Command link round trips, timeouts, reconnects and bytes"""
+    return jsonify(get_pod().stats())
 
 
 @app.route("/sensors")
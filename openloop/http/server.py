@@ -0,0 +1,373 @@
+"""
+Thread pool HTTP/1.1 server for the ODS WSGI app.
+
+The Flask development server handles one request at a time unless threaded,
+and then starts an unbounded thread per connection. `WSGIServer` accepts
+connections on one thread and serves them from a fixed pool of `workers`,
+so a slow /commands call only ties up one worker.
+
+Connections are kept alive between requests until the client closes them or
+sits idle for `keepalive` seconds. A worker only holds a connection while it
+has a request to serve: between requests the socket is parked in a selector,
+which hands it back to the pool when the next request arrives. File
+responses, such as the static files under /ui/, are written with sendfile(2)
+instead of being read through Python.
+
+Responses without a Content-Length (such as /stream) close the connection
+when they end, and are written from a thread of their own so a subscriber
+does not keep a worker for as long as it stays connected. At most `streams`
+of them run at once; past that new ones are answered with a 503.
+"""
+import io
+import time
+import queue
+import socket
+import logging
+import selectors
+import threading
+from wsgiref import simple_server
+
+DEFAULT_WORKERS = 64
+DEFAULT_KEEPALIVE = 15.0
+DEFAULT_STREAMS = 32
+
+# Seconds between checks for parked connections idle past keepalive
+EXPIRE_INTERVAL = 1.0
+
+# Responses that never carry a body
+_BODYLESS = (204, 304)
+
+
+class ServerHandler(simple_server.ServerHandler):
+    http_version = "1.1"
+
+    def cleanup_headers(self):
+        super().cleanup_headers()
+        request = self.request_handler
+        if 'Content-Length' not in self.headers:
+            status = int(self.status[:3])
+            if self.environ['REQUEST_METHOD'] == 'HEAD' or \
+                    status in _BODYLESS or status < 200:
+                pass
+            elif self.result_length() == 0:
+                self.headers['Content-Length'] = '0'
+            else:
+                # The body ends when the connection does
+                request.close_connection = True
+        if request.close_connection:
+            self.headers['Connection'] = 'close'
+
+    def result_length(self):
+        try:
+            return len(self.result)
+        except (TypeError, AttributeError, NotImplementedError):
+            return None
+
+    def sendfile(self):
+        """Writes a file response with socket.sendfile"""
+        body = self.result.filelike
+        if not hasattr(self.request_handler.connection, 'sendfile'):
+            # Before Python 3.5
+            return False
+        try:
+            body.fileno()
+            offset = body.tell()
+        except (AttributeError, OSError, io.UnsupportedOperation):
+            return False
+
+        length = self.headers.get('Content-Length')
+        count = int(length) if length is not None else None
+        if not self.headers_sent:
+            self.send_headers()
+        self._flush()
+        if self.environ['REQUEST_METHOD'] != 'HEAD':
+            self.bytes_sent += self.request_handler.connection.sendfile(
+                body, offset, count)
+        return True
+
+    def finish_response(self):
+        if self.is_stream():
+            if self.request_handler.server.detach(self):
+                return
+            self.refuse()
+        super().finish_response()
+
+    def is_stream(self):
+        """Whether the body is unbounded, only ending with the connection"""
+        if self.headers_sent or 'Content-Length' in self.headers:
+            return False
+        if self.environ['REQUEST_METHOD'] == 'HEAD' or \
+                int(self.status[:3]) in _BODYLESS:
+            return False
+        return not self.result_is_file() and self.result_length() is None
+
+    def stream(self):
+        """Writes the rest of a detached response, then closes the
+        connection"""
+        try:
+            super().finish_response()
+        except (ConnectionAbortedError, BrokenPipeError,
+                ConnectionResetError):
+            pass
+        except Exception:
+            try:
+                self.handle_error()
+            except Exception:
+                self.close()
+        finally:
+            self.request_handler.server.close(self.request_handler)
+
+    def refuse(self):
+        """Replaces the response with a 503, for streams over the cap"""
+        if hasattr(self.result, 'close'):
+            self.result.close()
+        body = b"Too many streams\n"
+        self.status = "503 Service Unavailable"
+        self.headers = self.headers_class([
+            ('Content-Type', 'text/plain'),
+            ('Content-Length', str(len(body))),
+            ('Retry-After', '1')])
+        self.result = [body]
+
+    def handle_error(self):
+        # Part of a response may already be on the wire
+        self.request_handler.close_connection = True
+        super().handle_error()
+
+    def log_exception(self, exc_info):
+        logging.error("[HTTP] Error serving %s %s",
+                      self.environ.get('REQUEST_METHOD'),
+                      self.environ.get('PATH_INFO'), exc_info=exc_info)
+
+
+class RequestHandler(simple_server.WSGIRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # Headers and body are separate writes, which Nagle would hold back
+    # behind the client's delayed ACK on a kept-alive connection
+    disable_nagle_algorithm = True
+
+    def __init__(self, request, client_address, server):
+        # Unlike BaseRequestHandler, only sets up: the server calls serve()
+        # each time a request arrives and finish() when the connection closes
+        self.request = request
+        self.client_address = client_address
+        self.server = server
+        self.detached = False
+        self.deadline = None
+        self.setup()
+
+    def setup(self):
+        self.timeout = self.server.keepalive
+        super().setup()
+
+    def serve(self):
+        """Serves the requests that have arrived. Returns True if the
+        connection should be parked until the next one does."""
+        while True:
+            self.close_connection = True
+            self.handle_request()
+            if self.close_connection or self.detached:
+                return False
+            if not self.buffered():
+                return True
+
+    def buffered(self):
+        """Whether more of the next request has already arrived"""
+        self.connection.settimeout(0)
+        try:
+            return bool(self.rfile.peek(1))
+        except (OSError, ValueError):
+            return False
+        finally:
+            self.connection.settimeout(self.timeout)
+
+    def handle_request(self):
+        try:
+            self.raw_requestline = self.rfile.readline(65537)
+        except (OSError, ValueError):
+            # Idle past keepalive, or reset by the client
+            self.close_connection = True
+            return
+        if not self.raw_requestline:
+            self.close_connection = True
+            return
+        if len(self.raw_requestline) > 65536:
+            self.requestline = ''
+            self.request_version = ''
+            self.command = ''
+            self.send_error(414)
+            return
+        if not self.parse_request():
+            return
+
+        if self.headers.get('Content-Length', '0') != '0' or \
+                'Transfer-Encoding' in self.headers:
+            # Whatever the app leaves unread would be parsed as the next
+            # request
+            self.close_connection = True
+
+        self.server.count_request()
+        handler = ServerHandler(self.rfile, self.wfile, self.get_stderr(),
+                                self.get_environ(), multithread=True)
+        handler.request_handler = self
+        handler.run(self.server.get_app())
+
+    def log_message(self, format, *args):
+        logging.debug("[HTTP] %s %s", self.address_string(), format % args)
+
+
+class WSGIServer(simple_server.WSGIServer):
+    allow_reuse_address = True
+    request_queue_size = 128
+
+    def __init__(self, addr, app, workers=DEFAULT_WORKERS,
+                 keepalive=DEFAULT_KEEPALIVE, streams=DEFAULT_STREAMS):
+        super().__init__(addr, RequestHandler)
+        self.set_app(app)
+        self.workers = workers
+        self.keepalive = keepalive
+        self.max_streams = streams
+        self.pending = queue.Queue()
+        self.lock = threading.Lock()
+        self.connections = 0
+        self.active = 0
+        self.streams = 0
+        self.refused = 0
+        self.requests = 0
+
+        # Connections waiting for their next request, registered by the
+        # watcher thread itself so it never changes under select()
+        self.selector = selectors.DefaultSelector()
+        self.parking = []
+        self.waker, self.wake_sock = socket.socketpair()
+        self.waker.setblocking(False)
+        self.wake_sock.setblocking(False)
+        self.selector.register(self.waker, selectors.EVENT_READ)
+
+        threading.Thread(target=self.watch, daemon=True).start()
+        for _ in range(workers):
+            threading.Thread(target=self.work, daemon=True).start()
+
+    def process_request(self, request, client_address):
+        handler = self.RequestHandlerClass(request, client_address, self)
+        with self.lock:
+            self.connections += 1
+        # Its first request may not have been sent yet
+        self.park(handler)
+
+    def work(self):
+        """Serves the requests of connections that have one waiting"""
+        while True:
+            handler = self.pending.get()
+            with self.lock:
+                self.active += 1
+            park = False
+            try:
+                park = handler.serve()
+            except Exception:
+                handler.close_connection = True
+                self.handle_error(handler.request, handler.client_address)
+            finally:
+                with self.lock:
+                    self.active -= 1
+
+            if park:
+                self.park(handler)
+            elif not handler.detached:
+                self.close(handler)
+
+    def park(self, handler):
+        """Hands handler's connection to the watcher until its next request
+        arrives"""
+        with self.lock:
+            self.parking.append(handler)
+        try:
+            self.wake_sock.send(b"\0")
+        except BlockingIOError:
+            # Already woken
+            pass
+
+    def watch(self):
+        """Queues parked connections for the workers as their requests
+        arrive, and closes those idle for longer than keepalive"""
+        expire = time.monotonic() + EXPIRE_INTERVAL
+        while True:
+            events = self.selector.select(EXPIRE_INTERVAL)
+            now = time.monotonic()
+            for key, _ in events:
+                if key.fileobj is self.waker:
+                    try:
+                        self.waker.recv(4096)
+                    except BlockingIOError:
+                        pass
+                    continue
+                self.selector.unregister(key.fileobj)
+                self.pending.put(key.data)
+
+            with self.lock:
+                parking, self.parking = self.parking, []
+            for handler in parking:
+                handler.deadline = now + self.keepalive
+                try:
+                    self.selector.register(handler.connection,
+                                           selectors.EVENT_READ, handler)
+                except (OSError, ValueError):
+                    self.close(handler)
+
+            if now >= expire:
+                expire = now + EXPIRE_INTERVAL
+                for key in list(self.selector.get_map().values()):
+                    handler = key.data
+                    if handler is not None and handler.deadline <= now:
+                        self.selector.unregister(key.fileobj)
+                        self.close(handler)
+
+    def detach(self, handler):
+        """Moves a streaming response onto its own thread, unless there are
+        already max_streams. Returns whether it was moved."""
+        with self.lock:
+            if self.streams >= self.max_streams:
+                self.refused += 1
+                return False
+            self.streams += 1
+
+        handler.request_handler.detached = True
+        threading.Thread(target=handler.stream, daemon=True).start()
+        return True
+
+    def close(self, handler):
+        """Closes handler's connection"""
+        try:
+            handler.finish()
+        except (OSError, ValueError):
+            pass
+        finally:
+            self.shutdown_request(handler.request)
+            with self.lock:
+                self.connections -= 1
+                if handler.detached:
+                    self.streams -= 1
+
+    def handle_error(self, request, client_address):
+        logging.exception("[HTTP] Error on connection from %s:%d",
+                          *client_address)
+
+    def count_request(self):
+        with self.lock:
+            self.requests += 1
+
+    def stats(self):
+        return {
+            "workers": self.workers,
+            "connections": self.connections,
+            "active": self.active,
+            "streams": self.streams,
+            "refused_streams": self.refused,
+            "queued": self.pending.qsize(),
+            "requests": self.requests
+        }
+
+
+def make_server(host, port, app, workers=DEFAULT_WORKERS,
+                keepalive=DEFAULT_KEEPALIVE, streams=DEFAULT_STREAMS):
+    return WSGIServer((host, port), app, workers, keepalive, streams)
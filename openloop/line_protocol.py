@@ -0,0 +1,98 @@
+"""
+Influx line protocol encoding for telemetry packets.
+
+The telemetry schema never changes, so the escaped measurement, tag set and
+field keys are rendered once into a %-format template. Encoding a packet is
+then a single string format of its values, producing the same line the
+influxdb client would for `TelemetryPacket.to_point`.
+"""
+import math
+import operator
+from openloop import telemetry
+from openloop.pod import PodState
+
+
+def escape_tag(value):
+    """Escapes a tag key or value (or a measurement name)"""
+    return str(value).replace("\\", "\\\\").replace(" ", "\\ ") \
+        .replace(",", "\\,").replace("=", "\\=")
+
+
+def _field_template(name, code):
+    if code == "f":
+        return "%s=%%r" % name
+    return "%s=%%di" % name
+
+
+class TelemetryEncoder:
+    """Encodes TelemetryPackets into line protocol for the telemetry
+    measurement"""
+
+    def __init__(self, measurement=telemetry.MEASUREMENT):
+        self.measurement = escape_tag(measurement)
+
+        fields = [(name, code) for name, code, _ in telemetry.FIELDS]
+        fields.extend((name, "B") for name, _ in telemetry.SOLENOIDS)
+
+        # The client sorts field keys, do the same so the output matches it
+        order = sorted(range(len(fields)), key=lambda i: fields[i][0])
+        self.reorder = operator.itemgetter(*order)
+        self.template = ",".join(_field_template(*fields[i]) for i in order)
+        self.masks = [mask for _, mask in telemetry.SOLENOIDS]
+        self.readings = slice(min(i for i, (_, code) in enumerate(fields)
+                                  if code == "f"), len(telemetry.FIELDS))
+        self.state_index = telemetry.FIELD_NAMES.index("state")
+        self.time_index = telemetry.FIELD_NAMES.index("timestamp")
+        self.prefixes = {}
+
+    def prefix(self, pod, state):
+        """Returns the cached 'measurement,tags ' prefix for a pod and
+        state"""
+        key = (pod, state)
+        prefix = self.prefixes.get(key)
+        if prefix is None:
+            tags = []
+            if pod is not None:
+                tags.append(("pod", pod))
+            tags.append(("state", str(PodState.parse(state))))
+            prefix = self.measurement + "".join(
+                ",%s=%s" % (escape_tag(k), escape_tag(v)) for k, v in tags)
+            prefix += " "
+            self.prefixes[key] = prefix
+        return prefix
+
+    def encode(self, packet, pod=None):
+        """Returns one newline terminated line of line protocol as bytes"""
+        if not all(map(math.isfinite, packet[self.readings])):
+            return self.encode_slow(packet, pod)
+
+        mask = packet.solenoid_mask
+        return self.encode_finite(
+            packet + tuple([1 if mask & bit else 0 for bit in self.masks]),
+            pod)
+
+    def encode_row(self, row, pod=None):
+        """Encodes a packet given as its fields followed by its solenoid
+        flags as 0/1, as `batch.to_rows` yields them"""
+        if not all(map(math.isfinite, row[self.readings])):
+            packet = telemetry.TelemetryPacket._make(
+                row[:len(telemetry.FIELDS)])
+            return self.encode_slow(packet, pod)
+        return self.encode_finite(row, pod)
+
+    def encode_finite(self, row, pod=None):
+        return (self.prefix(pod, row[self.state_index]) +
+                self.template % self.reorder(row) +
+                " %d\n" % (row[self.time_index] * 1000)).encode("ascii")
+
+    def encode_slow(self, packet, pod=None):
+        """Encodes a packet with NaN or infinite readings, which Influx
+        rejects, by leaving those fields out"""
+        fields = packet.as_dict()
+        body = ",".join(
+            _field_template(name, "f" if isinstance(value, float) else "B")
+            % value
+            for name, value in sorted(fields.items())
+            if not isinstance(value, float) or math.isfinite(value))
+        return (self.prefix(pod, packet.state) + body +
+                " %d\n" % (packet.timestamp * 1000)).encode("ascii")
@@ -0,0 +1,97 @@
+"""
+Non-blocking console logging.
+
+`setup` routes every log record through a bounded queue to a listener thread
+that owns the console handler, so threads on the telemetry path only pay for
+a `put_nowait`. Records that arrive while the queue is full are dropped and
+counted rather than blocking the caller.
+
+`TelemetrySummary` replaces per-packet printing with one INFO line every
+`interval` seconds; full packet dumps are only logged at DEBUG.
+"""
+import sys
+import time
+import queue
+import atexit
+import logging
+import logging.handlers
+from openloop.pod import PodState
+
+FORMAT = "%(asctime)s %(levelname)s %(message)s"
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that drops records instead of blocking or raising when
+    the queue is full"""
+
+    def __init__(self, records):
+        super().__init__(records)
+        self.dropped = 0
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+def setup(verbose=False, max_queue=10000, stream=None):
+    """
+    Sends root logging through a queue to a console listener thread. Returns
+    the DroppingQueueHandler; the listener is stopped (and the queue flushed)
+    at exit.
+    """
+    records = queue.Queue(max_queue)
+    console = logging.StreamHandler(stream or sys.stdout)
+    console.setFormatter(logging.Formatter(FORMAT))
+    listener = logging.handlers.QueueListener(records, console)
+
+    handler = DroppingQueueHandler(records)
+    root = logging.getLogger()
+    for old in list(root.handlers):
+        root.removeHandler(old)
+    root.addHandler(handler)
+    root.setLevel(logging.DEBUG if verbose else logging.INFO)
+
+    listener.start()
+    atexit.register(listener.stop)
+    return handler
+
+
+class TelemetrySummary:
+    """Logs the packet rate and key fields of the latest packet every
+    interval seconds"""
+
+    FIELDS = ("position_x", "velocity_x", "acceleration_x")
+
+    def __init__(self, server, interval=1.0):
+        self.server = server
+        self.interval = interval
+        self.running = False
+
+    def run(self):
+        self.running = True
+        last = self.server.received
+        last_time = time.monotonic()
+        while self.running:
+            time.sleep(self.interval)
+            now = time.monotonic()
+            received = self.server.received
+            rate = (received - last) / (now - last_time)
+            last, last_time = received, now
+            logging.info("[ODS] %s", self.format(rate))
+
+    def format(self, rate):
+        server = self.server
+        writer = server.writer.stats()
+        line = "%.1f packets/s, %d received, %d invalid, %d dropped" % (
+            rate, server.received, server.invalid, writer["dropped"])
+
+        state = server.state
+        if state is None:
+            return line + ", no telemetry"
+        return line + ", state=%s " % PodState.parse(state.state) + " ".join(
+            "%s=%.2f" % (name, getattr(state, name)) for name in self.FIELDS)
+
+    def stop(self):
+        self.running = False
@@ -0,0 +1,212 @@
+"""
+Pod control link instrumentation.
+
+`Histogram` counts observations into fixed, roughly logarithmic buckets, so
+recording one is a bisect and an increment and memory does not grow with
+the length of a run. Percentiles are estimated as the upper bound of the
+bucket they fall in.
+
+`LinkMetrics` gathers the histograms and counters for one pod connection:
+ping and command round trips, connect attempts and their duration, time
+spent disconnected, timeouts and bytes each way. Its counters are updated by
+the pod's reader and callers and read by the exporter, so like the histograms
+they are only touched under a lock. `MetricsExporter` writes
+them to Influx every `interval` seconds as one point in the 'pod_link'
+measurement.
+"""
+import time
+import logging
+import threading
+from bisect import bisect_left
+
+# Upper bounds in seconds, from 100 us to 10 s
+DEFAULT_BOUNDS = (
+    0.0001, 0.0002, 0.0005,
+    0.001, 0.002, 0.005,
+    0.01, 0.02, 0.05,
+    0.1, 0.2, 0.5,
+    1.0, 2.0, 5.0,
+    10.0,
+)
+
+MEASUREMENT = "pod_link"
+
+
+class Histogram:
+    def __init__(self, bounds=DEFAULT_BOUNDS):
+        self.bounds = bounds
+        # The last bucket holds everything above the largest bound
+        self.counts = [0] * (len(bounds) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.min = None
+        self.max = None
+        self.lock = threading.Lock()
+
+    def observe(self, value):
+        with self.lock:
+            self.counts[bisect_left(self.bounds, value)] += 1
+            self.count += 1
+            self.total += value
+            if self.min is None or value < self.min:
+                self.min = value
+            if self.max is None or value > self.max:
+                self.max = value
+
+    def percentile(self, p):
+        """Returns the upper bound of the bucket holding the p quantile (0 to
+        1), or the largest value seen if that is above every bound"""
+        if not self.count:
+            return 0.0
+        rank = p * self.count
+        seen = 0
+        for bound, count in zip(self.bounds, self.counts):
+            seen += count
+            if seen >= rank and count:
+                return min(bound, self.max)
+        return self.max
+
+    def stats(self):
+        with self.lock:
+            return {
+                "count": self.count,
+                "mean": self.total / self.count if self.count else 0.0,
+                "min": self.min or 0.0,
+                "max": self.max or 0.0,
+                "p50": self.percentile(0.5),
+                "p90": self.percentile(0.9),
+                "p99": self.percentile(0.99),
+                "buckets": dict(("le_%g" % bound, count) for bound, count
+                                in zip(self.bounds, self.counts) if count)
+            }
+
+
+class LinkMetrics:
+    def __init__(self):
+        self.ping = Histogram()
+        self.command = Histogram()
+        self.connect_time = Histogram()
+        self.downtime = Histogram()
+        self.connects = 0
+        self.connect_failures = 0
+        self.disconnects = 0
+        self.ping_timeouts = 0
+        self.command_timeouts = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.connected_at = None
+        self.disconnected_at = None
+        self.lock = threading.Lock()
+
+    def connected(self, duration):
+        """Records a successful connect that took duration seconds"""
+        now = time.monotonic()
+        self.connect_time.observe(duration)
+        with self.lock:
+            self.connects += 1
+            if self.disconnected_at is not None:
+                self.downtime.observe(now - self.disconnected_at)
+                self.disconnected_at = None
+            self.connected_at = now
+
+    def connect_failed(self, duration):
+        self.connect_time.observe(duration)
+        with self.lock:
+            self.connect_failures += 1
+
+    def closed(self):
+        with self.lock:
+            if self.connected_at is not None:
+                self.disconnects += 1
+                self.connected_at = None
+                self.disconnected_at = time.monotonic()
+
+    def timed_out(self, ping):
+        """Records a ping (or other command) that was not answered in
+        time"""
+        with self.lock:
+            if ping:
+                self.ping_timeouts += 1
+            else:
+                self.command_timeouts += 1
+
+    def received(self, count):
+        with self.lock:
+            self.bytes_in += count
+
+    def sent(self, count):
+        with self.lock:
+            self.bytes_out += count
+
+    def counters(self):
+        """Returns the counters as they are now"""
+        with self.lock:
+            return {
+                "connects": self.connects,
+                "connect_failures": self.connect_failures,
+                "disconnects": self.disconnects,
+                "ping_timeouts": self.ping_timeouts,
+                "command_timeouts": self.command_timeouts,
+                "bytes_in": self.bytes_in,
+                "bytes_out": self.bytes_out,
+                "connected_at": self.connected_at
+            }
+
+    def stats(self):
+        counters = self.counters()
+        connected_at = counters.pop("connected_at")
+        uptime = 0.0
+        if connected_at is not None:
+            uptime = time.monotonic() - connected_at
+        stats = {
+            "ping": self.ping.stats(),
+            "command": self.command.stats(),
+            "connect_time": self.connect_time.stats(),
+            "downtime": self.downtime.stats(),
+            "reconnects": max(counters["connects"] - 1, 0),
+            "uptime": uptime
+        }
+        stats.update(counters)
+        return stats
+
+    def to_point(self, tags=None):
+        """Returns the counters and round trip summaries as one Influx point,
+        timed now in nanoseconds"""
+        fields = {}
+        for name in ("ping", "command", "connect_time"):
+            stats = getattr(self, name).stats()
+            fields["%s_count" % name] = stats["count"]
+            for key in ("mean", "p50", "p99", "max"):
+                fields["%s_%s" % (name, key)] = float(stats[key])
+        fields.update(self.counters())
+        fields["connected"] = fields.pop("connected_at") is not None
+
+        return {
+            "measurement": MEASUREMENT,
+            "tags": tags or {},
+            "time": int(time.time() * 1e9),
+            "fields": fields
+        }
+
+
+class MetricsExporter:
+    """Submits the pod's link metrics to a writer every interval seconds"""
+
+    def __init__(self, pod, writer, interval=1.0, tags=None):
+        self.pod = pod
+        self.writer = writer
+        self.interval = interval
+        self.tags = tags or {"pod": "%s:%d" % pod.addr}
+        self.running = False
+
+    def run(self):
+        self.running = True
+        while self.running:
+            time.sleep(self.interval)
+            try:
+                self.writer.submit([self.pod.metrics.to_point(self.tags)])
+            except Exception as e:
+                logging.error("[MetricsExporter] %s", e)
+
+    def stop(self):
+        self.running = False
@@ -1,93 +1,300 @@
+import time
 import socket
 import logging
-import select
 import threading
+from enum import IntEnum
+from collections import deque
+from concurrent.futures import Future, TimeoutError
 from datetime import datetime, timedelta
+from openloop.metrics import LinkMetrics
 
 
 MAX_MESSAGE_SIZE = 2048
 PING_TIMEOUT = timedelta(seconds=1)
-
-
-class PodStateType(type):
-    MAP = {
-        'POST': 0,
-        'BOOT': 1,
-        'HPFILL': 2,
-        'LOAD': 3,
-        'STANDBY': 4,
-        'ARMED': 5,
-        'PUSHING': 6,
-        'COASTING': 7,
-        'BRAKING': 8,
-        'VENT': 9,
-        'RETRIEVAL': 10,
-        'EMERGENCY': 11,
-        'SHUTDOWN': 12
-    }
-
-    SHORT_MAP = {
-        'POST': 0,
-        'BOOT': 1,
-        'HPFL': 2,
-        'LOAD': 3,
-        'STBY': 4,
-        'ARMD': 5,
-        'PUSH': 6,
-        'COAS': 7,
-        'BRKE': 8,
-        'VENT': 9,
-        'RETR': 10,
-        'EMRG': 11,
-        'SDWN': 12
-    }
-
-    def __getattr__(cls, name):
-        if name in cls.MAP:
-            return cls.MAP[name]
-        raise AttributeError(name)
-
-
-class PodState(metaclass=PodStateType):
-    def __init__(self, state):
-        self.state = int(state)
+QUICKACK = getattr(socket, 'TCP_QUICKACK', None)
+
+
+class PodState(IntEnum):
+    """
+    The pod's state machine states.
+
+    Members are singletons and compare and hash as their state numbers, so
+    `PodState.ARMED == 5` and either can key the tables below. Use
+    `PodState.parse` for states received from the pod: it is a dict lookup
+    that returns UNKNOWN for anything that is not a known state, where
+    `PodState(value)` raises ValueError.
+    """
+    UNKNOWN = -1
+    POST = 0
+    BOOT = 1
+    HPFILL = 2
+    LOAD = 3
+    STANDBY = 4
+    ARMED = 5
+    PUSHING = 6
+    COASTING = 7
+    BRAKING = 8
+    VENT = 9
+    RETRIEVAL = 10
+    EMERGENCY = 11
+    SHUTDOWN = 12
+
+    @classmethod
+    def parse(cls, value):
+        """Returns the state for a number or a string ("5", "ARMED"), or
+        UNKNOWN for anything that is not a known state. Names are matched
+        exactly; the four letter short names are not accepted."""
+        state = BY_NUMBER.get(value)
+        if state is not None:
+            return state
+        if isinstance(value, str):
+            value = value.strip()
+            if value in cls.__members__:
+                return cls.__members__[value]
+            try:
+                value = int(value)
+            except ValueError:
+                return cls.UNKNOWN
+        return BY_NUMBER.get(value, cls.UNKNOWN)
 
     def is_fault(self):
-        return self.state == PodState.EMERGENCY
+        return self is PodState.EMERGENCY
 
     def is_moving(self):
-        return self.state in (PodState.BRAKING, PodState.COASTING,
-                              PodState.PUSHING)
+        return self in MOVING_STATES
+
+    def short(self):
+        return SHORT_NAMES[self]
 
     def __str__(self):
-        keys = [key for key, val in PodState.MAP.items() if val == self.state]
-        if not keys:
-            return "UNKNOWN"
+        return self._name_
+
+    def __format__(self, spec):
+        return format(self._name_, spec)
+
+
+BY_NUMBER = dict((int(state), state) for state in PodState)
+
+# Four letter names for the podctl prompt
+SHORT_NAMES = {
+    PodState.UNKNOWN: '----',
+    PodState.POST: 'POST',
+    PodState.BOOT: 'BOOT',
+    PodState.HPFILL: 'HPFL',
+    PodState.LOAD: 'LOAD',
+    PodState.STANDBY: 'STBY',
+    PodState.ARMED: 'ARMD',
+    PodState.PUSHING: 'PUSH',
+    PodState.COASTING: 'COAS',
+    PodState.BRAKING: 'BRKE',
+    PodState.VENT: 'VENT',
+    PodState.RETRIEVAL: 'RETR',
+    PodState.EMERGENCY: 'EMRG',
+    PodState.SHUTDOWN: 'SDWN'
+}
+
+MOVING_STATES = frozenset((PodState.PUSHING, PodState.COASTING,
+                           PodState.BRAKING))
+
+
+class ReplyFramer:
+    """
+    Splits what the pod sends back into the replies to the commands sent.
+
+    The pod answers commands in order but marks neither where a reply ends
+    nor how long it is: a reply may be several lines, or none, with or
+    without a final newline. Only a ping's reply is recognisable, a single
+    `PONG:<state>` line.
+
+    By default commands go one at a time, as the pod reads each segment it
+    receives as one command: the next is only sent once the last is
+    answered, and a command's reply is the next read from the pod. With
+    `fence` every other command is sent followed by a ping as a fence, and
+    the reply to the command is everything received before the fence's
+    PONG, so commands can be pipelined. That needs pod firmware that splits
+    what it reads on newlines.
+
+    `expect` records each command and returns the bytes to send now, if
+    any; `next_message` returns the next queued command once the link is
+    free. `feed` takes the bytes read and returns (kind, waiter, sent,
+    reply) for each reply now complete, in the order the commands were
+    sent, with sent the monotonic time the command went out. Anything
+    received while nothing is waiting, or before a PONG that answers a
+    ping, is counted as unsolicited and dropped rather than passed to the
+    next command. A fenced reply that itself contained "PONG:" would be cut
+    short there.
+    """
+    COMMAND = "command"
+    PING = "ping"
+    FENCE = "fence"
+
+    def __init__(self, fence=False):
+        self.fence = fence
+        self.waiting = deque()
+        self.queued = deque()
+        self.buffer = b""
+        self.unsolicited = 0
+
+    def message(self, cmd):
+        """Returns the bytes to send for cmd, with a fence if it needs one"""
+        if cmd == "ping" or not self.fence:
+            return (cmd + "\n").encode('utf-8')
+        return (cmd + "\nping\n").encode('utf-8')
+
+    def expect(self, cmd, waiter):
+        """Records cmd for waiter and returns the bytes to send now, empty
+        if it has to wait for the replies to earlier commands"""
+        if not self.fence and self.waiting:
+            self.queued.append((cmd, waiter))
+            return b""
+
+        sent = time.monotonic()
+        if cmd == "ping":
+            self.waiting.append((self.PING, waiter, sent))
         else:
-            return keys[0]
-
-    def short(self):
-        keys = [key for key, val in PodState.SHORT_MAP.items()
-                if val == self.state]
-        if not keys:
-            return "----"
+            self.waiting.append((self.COMMAND, waiter, sent))
+            if self.fence:
+                self.waiting.append((self.FENCE, None, sent))
+        return self.message(cmd)
+
+    def next_message(self):
+        """Returns the bytes of the next queued command if it can be sent
+        now, otherwise empty"""
+        if self.waiting or not self.queued:
+            return b""
+        return self.expect(*self.queued.popleft())
+
+    def feed(self, data):
+        self.buffer += data
+        if self.fence:
+            replies = self.feed_fenced()
         else:
-            return keys[0]
+            replies = self.feed_single()
+        if not self.waiting:
+            self.drop(self.buffer)
+            self.buffer = b""
+        return replies
+
+    def feed_single(self):
+        """Takes the buffer as the reply to the command waiting"""
+        if not self.waiting:
+            return []
+        kind, waiter, sent = self.waiting[0]
+        if kind == self.COMMAND:
+            reply = self.buffer
+            self.buffer = b""
+        else:
+            before, reply = self.take_pong()
+            if reply is None:
+                return []
+            self.drop(before)
+        self.waiting.popleft()
+        return [(kind, waiter, sent, reply.decode('utf-8', 'replace'))]
+
+    def feed_fenced(self):
+        """Splits the buffer at each PONG"""
+        replies = []
+        while self.waiting:
+            before, pong = self.take_pong()
+            if pong is None:
+                break
+
+            kind, waiter, sent = self.waiting.popleft()
+            if kind == self.COMMAND:
+                replies.append((kind, waiter, sent,
+                                before.decode('utf-8', 'replace')))
+                kind, waiter, sent = self.waiting.popleft()
+            else:
+                self.drop(before)
+            replies.append((kind, waiter, sent,
+                            pong.decode('utf-8', 'replace')))
+        return replies
+
+    def take_pong(self):
+        """Removes everything up to the first complete PONG line from the
+        buffer and returns (what came before, the PONG line), or (None,
+        None) if there is no complete PONG yet"""
+        end = self.buffer.find(b"PONG:")
+        if end < 0:
+            return None, None
+        newline = self.buffer.find(b"\n", end)
+        if newline < 0:
+            return None, None
+        before = self.buffer[:end]
+        pong = self.buffer[end:newline + 1]
+        self.buffer = self.buffer[newline + 1:]
+        return before, pong
+
+    def drop(self, data):
+        if data:
+            self.unsolicited += 1
+            logging.debug("[Pod] Unsolicited data: %r", data)
+
+    def outstanding(self):
+        """Returns the waiters of every reply still outstanding"""
+        # Copied first as stats() calls this from other threads
+        return [waiter for _, waiter, _ in list(self.waiting)
+                if waiter is not None] + \
+            [waiter for _, waiter in list(self.queued)]
+
+    def clear(self):
+        """Forgets what is outstanding and returns its waiters"""
+        waiters = self.outstanding()
+        self.waiting.clear()
+        self.queued.clear()
+        self.buffer = b""
+        return waiters
+
+
+def quickack(sock):
+    """
+    Acknowledges what sock has received straight away. A reply and its
+    fence's PONG are often two small writes, and with Nagle's algorithm on
+    the pod the PONG waits for the reply to be acknowledged, which a delayed
+    ACK holds up by 40 ms. Linux only, and has to be set again after every
+    read.
+    """
+    if QUICKACK is not None:
+        try:
+            sock.setsockopt(socket.IPPROTO_TCP, QUICKACK, 1)
+        except OSError:
+            pass
+
 
-    def __eq__(self, other):
-        if isinstance(other, self.__class__):
-            return self.state == other.state
-        return False
+def parse_pong(reply):
+    """Returns the PodState in a PONG reply"""
+    return PodState.parse(reply.strip().split(':', 1)[1])
 
 
 class Pod:
-    def __init__(self, addr):
+    """
+    Client for the pod command server.
+
+    Commands are queued as pending futures as they are submitted, and a
+    reader thread hands what the pod sends back to a `ReplyFramer`, which
+    resolves the futures in order. By default one command is on the link
+    at a time and a timeout closes the connection, as a late reply could
+    not be told apart from the next one.
+
+    With `fence` commands are written as they are submitted, without
+    waiting for earlier ones to be answered, and each reply is framed in
+    full by a ping fence, however many lines it is. Every reply then ends
+    with a PONG, so the pod state is refreshed by each one, and a command
+    that times out is cancelled but keeps its place in line, so its late
+    reply is discarded instead of answering the next command. Only a ping
+    timeout (or a socket error) closes the connection.
+    """
+
+    def __init__(self, addr, fence=False):
         self.sock = None
         self.addr = addr
         self.recieved = 0
         self.state = None
-        self.lock = threading.Lock()
+        # Reentrant as send() closes the connection on error
+        self.lock = threading.RLock()
+        self.framer = ReplyFramer(fence)
         self.timeout_handler = None
+        self.metrics = LinkMetrics()
 
     def ping(self, _):
         if not self.is_connected():
@@ -100,24 +307,44 @@ class Pod:
             self.state = None
         else:
             if 'PONG:' in response:
-                self.state = PodState(response.strip().split(':')[1])
+                self.state = parse_pong(response)
+
+    def submit(self, cmd):
+        """
+        Sends a command and returns a Future for its response, or None if
+        the pod is not connected. The result is None if the connection
+        closes first.
+        """
+        future = Future()
+        with self.lock:
+            if not self.is_connected():
+                return None
+            message = self.framer.expect(cmd, future)
+            if message:
+                self.send(message)
+        return future
 
     def run(self, cmd, timeout=None):
+        """Runs a command and returns its response, or None on timeout or
+        disconnect"""
         if timeout is None:
             timeout = timedelta(seconds=1)
 
-        if not self.is_connected():
+        future = self.submit(cmd)
+        if future is None:
             return None
 
-        if self.lock.acquire():
-            try:
-                self.send(cmd + "\n")
-                data = self.recv(timeout=timeout)
-            finally:
-                self.lock.release()
-            return data
-
-        raise RuntimeError("Failed to acquire Lock on Channel %s" % self)
+        try:
+            return future.result(timeout.total_seconds())
+        except TimeoutError:
+            if future.cancel():
+                self.metrics.timed_out(cmd == "ping")
+                logging.debug("[Pod] %s timed out", cmd)
+                if not self.framer.fence:
+                    self.close()
+                return None
+            # Answered as it timed out
+            return future.result()
 
     def transcribe(self, data):
         logging.info("[DATA] {}".format(data))
@@ -128,52 +355,113 @@ class Pod:
 
         try:
             logging.debug("Sending {}".format(data))
-            self.sock.send(data.encode('utf-8'))
+            self.sock.sendall(data)
+            self.metrics.sent(len(data))
         except Exception as e:
             self.close()
             raise e
 
-    def recv(self, timeout=None):
-        if not self.is_connected():
-            return
-
+    def read(self, sock):
+        """Reads responses from sock until it closes"""
         try:
-            (ready, _, _) = select.select([self.sock], [], [],
-                                          timeout.total_seconds())
-            if self.sock in ready:
-                data = self.sock.recv(MAX_MESSAGE_SIZE).decode('utf-8')
-                logging.debug("Sending {}".format(data))
-                return data
-
-        except Exception as e:
-            self.close()
-            raise e
+            while True:
+                data = sock.recv(MAX_MESSAGE_SIZE)
+                if not data:
+                    break
+                quickack(sock)
+                self.recieved += len(data)
+                self.metrics.received(len(data))
+                with self.lock:
+                    if self.sock is not sock:
+                        break
+                    replies = self.framer.feed(data)
+                    message = self.framer.next_message()
+                    if message:
+                        self.send(message)
+                for reply in replies:
+                    self.dispatch(*reply)
+        except OSError as e:
+            logging.debug("[Pod] Reader stopped: %s", e)
+
+        with self.lock:
+            if self.sock is sock:
+                self.close()
+
+    def dispatch(self, kind, future, sent, reply):
+        """Resolves the future for one complete reply"""
+        logging.debug("Received {}".format(reply))
+        if kind != ReplyFramer.COMMAND:
+            self.state = parse_pong(reply)
+        if future is None:
+            return
 
-        self.close()
-        return None
+        if future.set_running_or_notify_cancel():
+            rtt = self.metrics.ping if kind == ReplyFramer.PING else \
+                self.metrics.command
+            rtt.observe(time.monotonic() - sent)
+            future.set_result(reply)
 
     def connect(self):
+        start = time.monotonic()
         try:
             self.sock = socket.create_connection(self.addr, 1)
+            # Reads block in the reader thread, timeouts are per command
+            self.sock.settimeout(None)
 
             self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
             if getattr(socket, 'SO_REUSEPORT', None) is not None:
                 self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+            self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
 
             self.recieved = 0
             self.last_ping = datetime.now()
         except Exception as e:
+            self.metrics.connect_failed(time.monotonic() - start)
             self.close()
             raise e
+        self.metrics.connected(time.monotonic() - start)
+
+        threading.Thread(target=self.read, args=(self.sock,),
+                         daemon=True).start()
 
     def close(self):
-        if self.sock is not None:
-            self.state = None
-            self.sock.close()
-            self.sock = None
+        with self.lock:
+            if self.sock is not None:
+                self.state = None
+                try:
+                    # Wakes the reader
+                    self.sock.shutdown(socket.SHUT_RDWR)
+                except OSError:
+                    pass
+                self.sock.close()
+                self.sock = None
+                self.metrics.closed()
+
+            # Nothing more will be answered
+            for future in self.framer.clear():
+                if future.set_running_or_notify_cancel():
+                    future.set_result(None)
 
     def is_connected(self):
         return self.sock is not None and self.sock.fileno() >= 0
 
+    def is_moving(self):
+        """Returns whether the last ping reported a moving state"""
+        return self.state is not None and self.state.is_moving()
+
+    def stats(self):
+        with self.lock:
+            waiting = self.framer.outstanding()
+        abandoned = sum(1 for future in waiting if future.cancelled())
+        stats = self.metrics.stats()
+        stats.update({
+            "addr": "%s:%d" % self.addr,
+            "connected": self.is_connected(),
+            "in_flight": len(waiting) - abandoned,
+            "abandoned": abandoned,
+            "unsolicited": self.framer.unsolicited
+        })
+        return stats
+
     def __str__(self):
-        return "%s:%d" % self.addrport
+        return "%s:%d" % self.addr
@@ -0,0 +1,88 @@
+"""
+Preallocated ring of fixed-size datagram slots.
+
+The receive thread writes datagrams straight into free slots (see
+`DatagramReceiver`) and publishes them; a single consumer reads each slot in
+place, by offset into `buffer`, and releases it once it is done. Slots are
+never reallocated, so handing a datagram from the socket to the decoder,
+capture recorder and Influx encoder involves no per-packet buffers.
+
+The ring has one producer and one consumer. When it is full the producer
+waits for the consumer instead of overwriting unread slots, leaving bursts to
+queue in the socket's receive buffer.
+"""
+import threading
+from array import array
+from openloop.telemetry import PACKET_LENGTH
+
+
+class PacketRing:
+    def __init__(self, slots=4096, slot_size=PACKET_LENGTH):
+        self.slots = slots
+        self.slot_size = slot_size
+        self.buffer = bytearray(slots * slot_size)
+        self.view = memoryview(self.buffer)
+        self.lengths = array("H", [0]) * slots
+        self.addrs = [None] * slots
+        self.cond = threading.Condition()
+
+        # Sequence numbers of the next slot to write and to release
+        self.head = 0
+        self.tail = 0
+        self.high_water = 0
+        self.full_waits = 0
+
+    def offset(self, seq):
+        return (seq % self.slots) * self.slot_size
+
+    def payload(self, seq):
+        """Returns a memoryview of the datagram in slot seq"""
+        index = seq % self.slots
+        offset = index * self.slot_size
+        return self.view[offset:offset + self.lengths[index]]
+
+    def reserve(self, count):
+        """
+        Waits until a slot is free, then returns (seq, n): the next n <= count
+        slots from seq are free and contiguous in buffer.
+        """
+        with self.cond:
+            if self.head - self.tail == self.slots:
+                self.full_waits += 1
+                while self.head - self.tail == self.slots:
+                    self.cond.wait()
+            free = self.slots - (self.head - self.tail)
+
+        index = self.head % self.slots
+        return self.head, min(count, free, self.slots - index)
+
+    def publish(self, count):
+        """Makes the next count reserved slots visible to the consumer"""
+        with self.cond:
+            self.head += count
+            used = self.head - self.tail
+            if used > self.high_water:
+                self.high_water = used
+            self.cond.notify_all()
+
+    def wait(self, seq, timeout=None):
+        """Waits until slot seq is published, returns the head sequence"""
+        with self.cond:
+            while self.head <= seq:
+                if not self.cond.wait(timeout):
+                    break
+            return self.head
+
+    def release(self, seq):
+        """Frees every slot before seq for the producer"""
+        with self.cond:
+            self.tail = seq
+            self.cond.notify_all()
+
+    def stats(self):
+        return {
+            "slots": self.slots,
+            "used": self.head - self.tail,
+            "high_water": self.high_water,
+            "full_waits": self.full_waits
+        }
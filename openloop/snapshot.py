@@ -0,0 +1,109 @@
+"""
+Versioned, pre-encoded snapshots of the latest telemetry for /state.
+
+`SnapshotPublisher.latest()` returns a `StateSnapshot` that never changes once
+published. A new one is only published when the server's state has been
+replaced and at most `max_rate` times a second, so every poll in between
+shares the same snapshot, its JSON bytes and its ETag.
+
+Encodings (a field subset, gzipped or not) are built the first time they are
+asked for and cached on the snapshot they belong to, so they are dropped as
+soon as a newer snapshot replaces it.
+"""
+import json
+import time
+import zlib
+import threading
+from openloop.telemetry import FIELD_NAMES, SOLENOIDS
+
+DEFAULT_RATE = 20.0
+
+# Bodies smaller than this are not worth compressing
+GZIP_MIN = 256
+
+STATE_FIELDS = frozenset(FIELD_NAMES + tuple(name for name, _ in SOLENOIDS))
+
+_encode = json.JSONEncoder(separators=(',', ':'), sort_keys=True).encode
+
+
+def gzip(body):
+    """Returns body gzipped, byte for byte the same for the same input"""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+    return compressor.compress(body) + compressor.flush()
+
+
+class StateSnapshot:
+    def __init__(self, version, state, token):
+        self.version = version
+        self.state = state
+        self.tag = "%s-%d" % (token, version)
+        self.data = {} if state is None else state.as_dict()
+        self.encodings = {}
+
+    def encode(self, fields=None, compress=False):
+        """
+        Returns (body, etag, gzipped) for fields (every field if None), with
+        the body gzipped if compress is set and it is large enough.
+
+        Raises KeyError for an unknown field.
+        """
+        key = (fields, compress)
+        encoding = self.encodings.get(key)
+        if encoding is None:
+            encoding = self.encodings[key] = self.build(fields, compress)
+        return encoding
+
+    def build(self, fields, compress):
+        tag = self.tag
+        data = self.data
+        if fields is not None:
+            for name in fields:
+                if name not in STATE_FIELDS:
+                    raise KeyError(name)
+            if data:
+                data = dict((name, data[name]) for name in fields)
+            # A distinct tag for every subset
+            tag += "-%08x" % zlib.crc32(",".join(fields).encode())
+
+        body = _encode(data).encode()
+        if compress and len(body) >= GZIP_MIN:
+            return gzip(body), tag + "-gz", True
+        return body, tag, False
+
+
+class SnapshotPublisher:
+    def __init__(self, server, max_rate=DEFAULT_RATE):
+        self.server = server
+        self.min_interval = 1.0 / max_rate if max_rate > 0 else 0.0
+        # Keeps ETags from one run from matching those of another
+        self.token = "%x" % int(time.time() * 1000)
+        self.current = StateSnapshot(0, None, self.token)
+        self.published = time.monotonic()
+        self.lock = threading.Lock()
+
+    def latest(self):
+        """Returns the current snapshot, publishing a new one first if the
+        state has changed and min_interval has passed"""
+        snapshot = self.current
+        state = self.server.state
+        if state is snapshot.state:
+            return snapshot
+
+        now = time.monotonic()
+        if snapshot.version and now - self.published < self.min_interval:
+            return snapshot
+
+        with self.lock:
+            if self.current is snapshot:
+                self.current = StateSnapshot(snapshot.version + 1, state,
+                                             self.token)
+                self.published = now
+            return self.current
+
+    def stats(self):
+        snapshot = self.current
+        return {
+            "version": snapshot.version,
+            "age": time.monotonic() - self.published,
+            "encodings": len(snapshot.encodings)
+        }
@@ -0,0 +1,182 @@
+"""
+SpaceX telemetry encoding and timer-driven forwarding.
+
+`SpaceXEncoder` packs the latest TelemetryPacket into the SpaceX status
+format with a precompiled struct, into one reused buffer.
+
+`SpaceXForwarder` sends the server's latest state to SpaceX every `interval`
+seconds, whether or not new telemetry has arrived. Its `heart.Schedule`
+computes deadlines from the start time on the monotonic clock (start + n *
+interval), so lateness in one tick does not push back the ones after it. Ticks
+that are already a whole interval late are skipped and counted as missed
+instead of being sent in a burst.
+
+Lateness of each send against its deadline is kept for the last `window`
+sends and reported by `stats()` as jitter.
+"""
+import math
+import time
+import struct
+import logging
+from operator import attrgetter
+from openloop.heart import Schedule
+from openloop.pod import PodState
+
+DEFAULT_INTERVAL = 0.3
+
+# team id, status, acceleration (cm/s^2), position (cm), velocity (cm/s),
+# battery voltage (mV), battery current (mA), battery temperature (0.1 C),
+# pod temperature (0.1 C), stripe count
+PACKET = struct.Struct('!BB7iI')
+
+# Values that do not fit their field are sent as 0
+LIMIT = 2 ** 31
+MAX_STRIPES = 2 ** 32 - 1
+
+# Distance between the tube's reflective stripes (100 ft)
+STRIPE_SPACING = 30.48
+
+
+class SpaceXStatus:
+    FAULT = 0
+    IDLE = 1
+    READY = 2
+    PUSHING = 3
+    COASTING = 4
+    BRAKING = 5
+
+
+# SpaceX status for each PodState, also looked up by raw state number
+STATUS_BY_STATE = dict((state, SpaceXStatus.IDLE) for state in PodState)
+STATUS_BY_STATE.update({
+    PodState.UNKNOWN: SpaceXStatus.FAULT,
+    PodState.ARMED: SpaceXStatus.READY,
+    PodState.PUSHING: SpaceXStatus.PUSHING,
+    PodState.COASTING: SpaceXStatus.COASTING,
+    PodState.BRAKING: SpaceXStatus.BRAKING,
+    PodState.EMERGENCY: SpaceXStatus.FAULT
+})
+
+# (field, scale) for the seven signed fields, in packet order
+FIELDS = (
+    ("acceleration_x", 100),
+    ("position_x", 100),
+    ("velocity_x", 100),
+    ("voltage_0", 1000),
+    ("current_0", 1000),
+    ("power_thermo_0", 10),
+    ("frame_thermo", 10),
+)
+
+
+def _clamp(value):
+    if -LIMIT < value < LIMIT:
+        return value
+    return 0
+
+
+class SpaceXEncoder:
+    """
+    Packs TelemetryPackets into SpaceX status packets.
+
+    `encode` returns the same bytearray every call, overwritten in place, so
+    send it before encoding the next state.
+    """
+
+    def __init__(self, team_id, stripe_spacing=STRIPE_SPACING):
+        self.team_id = team_id
+        self.stripe_spacing = stripe_spacing
+        self.buffer = bytearray(PACKET.size)
+        self.fields = attrgetter("state", *(name for name, _ in FIELDS))
+        self.idle = PACKET.pack(team_id, SpaceXStatus.IDLE, 0, 0, 0, 0, 0,
+                                0, 0, 0)
+
+    def encode(self, state):
+        """Packs state (or IDLE if None) into the buffer and returns it"""
+        if state is None:
+            # Nothing heard from the pod yet
+            self.buffer[:] = self.idle
+            return self.buffer
+
+        (state_number, acceleration, position, velocity, voltage, current,
+         battery_temperature, pod_temperature) = self.fields(state)
+
+        status = STATUS_BY_STATE.get(state_number, SpaceXStatus.FAULT)
+
+        try:
+            PACKET.pack_into(self.buffer, 0, self.team_id, status,
+                             int(acceleration * 100),
+                             int(position * 100),
+                             int(velocity * 100),
+                             int(voltage * 1000),
+                             int(current * 1000),
+                             int(battery_temperature * 10),
+                             int(pod_temperature * 10),
+                             int(position // self.stripe_spacing))
+        except (struct.error, ValueError, OverflowError):
+            # A NaN, infinite or out of range reading
+            values, stripes = self.sanitize(state)
+            PACKET.pack_into(self.buffer, 0, self.team_id, status, *values,
+                             stripes)
+        return self.buffer
+
+    def sanitize(self, state):
+        """Returns the scaled values and stripe count with readings that are
+        not finite or do not fit their field replaced by 0"""
+        values = []
+        for name, scale in FIELDS:
+            value = getattr(state, name)
+            values.append(_clamp(int(value * scale))
+                          if math.isfinite(value) else 0)
+
+        stripes = 0
+        if math.isfinite(state.position_x):
+            stripes = int(state.position_x // self.stripe_spacing)
+        return tuple(values), min(max(stripes, 0), MAX_STRIPES)
+
+
+class SpaceXForwarder:
+    def __init__(self, server, interval=DEFAULT_INTERVAL, window=1000):
+        self.server = server
+        self.interval = interval
+        self.schedule = Schedule(interval, window)
+        self.sent = 0
+        self.errors = 0
+        self.running = False
+
+    def tick(self):
+        """Sends the latest state once"""
+        try:
+            self.server.send_to_spacex(self.server.make_spacex_packet())
+            self.sent += 1
+        except Exception as e:
+            self.errors += 1
+            logging.error("[SpaceXForwarder] Send failed: %s", e)
+
+    def step(self, now):
+        """Sends at the deadline reached at now and moves it on"""
+        self.schedule.begin(now)
+        self.tick()
+        self.schedule.end(time.monotonic())
+
+    def run(self):
+        """Forwards every interval seconds until stop() is called"""
+        self.running = True
+        self.schedule.deadline = time.monotonic()
+        while self.running:
+            delay = self.schedule.delay(time.monotonic())
+            if delay > 0:
+                time.sleep(delay)
+            self.step(time.monotonic())
+
+    def stop(self):
+        self.running = False
+
+    def stats(self):
+        return {
+            "interval": self.interval,
+            "sent": self.sent,
+            "missed": self.schedule.missed,
+            "errors": self.errors,
+            "jitter": self.schedule.jitter()
+        }
@@ -0,0 +1,226 @@
+import os
+import time
+import logging
+import threading
+
+SEGMENT_SUFFIX = ".lp"
+CHECKPOINT = "checkpoint"
+REJECTED = "rejected"
+
+
+class Spool:
+    """
+    Append-only write-ahead spool of line protocol bodies.
+
+    The InfluxWriter appends each batch to the active segment file in
+    `directory`, which only costs a buffered write. A drainer thread (`run`)
+    reads the segments back from the checkpointed (segment, offset) and posts
+    them to Influx in bulk with `post`. If Influx is down, the drainer keeps
+    retrying while the segments pile up on disk, and picks up where it left
+    off after a restart. Fully drained segments are deleted.
+
+    `prepare`, if given, is called (and retried) before the first post and
+    again whenever a post fails with a 404, e.g. to create the database if
+    Influx was down when ODS started. A chunk rejected with any other 4xx
+    will never be accepted, so it is moved to the `rejected` file in
+    `directory` and counted instead of blocking the drain. Influx has
+    already written whatever valid points the chunk held.
+
+    Line protocol is newline delimited, so segments need no framing: the
+    drainer only ever posts up to the last complete line it has read.
+    """
+
+    def __init__(self, directory, post, segment_size=64 * 1024 * 1024,
+                 drain_size=4 * 1024 * 1024, retry_interval=1.0,
+                 prepare=None):
+        self.directory = directory
+        self.post = post
+        self.prepare = prepare
+        self.prepared = prepare is None
+        self.segment_size = segment_size
+        self.drain_size = drain_size
+        self.retry_interval = retry_interval
+        self.running = False
+        self.lock = threading.Lock()
+        self.appended = threading.Condition(self.lock)
+
+        self.appended_bytes = 0
+        self.drained_bytes = 0
+        self.failures = 0
+        self.rejected = 0
+        self.rejected_bytes = 0
+        self.drain_rate = 0.0
+
+        os.makedirs(directory, exist_ok=True)
+
+        segments = self.segments()
+        (self.read_segment, self.read_offset) = self.load_checkpoint()
+        if segments and self.read_segment < segments[0]:
+            (self.read_segment, self.read_offset) = (segments[0], 0)
+        for segment in segments:
+            if segment < self.read_segment:
+                os.remove(self.path(segment))
+
+        # Never append to a segment left over from a previous run, it may end
+        # with a torn line
+        self.write_segment = max(segments + [self.read_segment - 1]) + 1
+        self.write_file = open(self.path(self.write_segment), "ab")
+        self.write_offset = 0
+
+    def path(self, segment):
+        return os.path.join(self.directory,
+                            "%08d%s" % (segment, SEGMENT_SUFFIX))
+
+    def segments(self):
+        """Returns the sorted segment numbers present on disk"""
+        return sorted(int(name[:-len(SEGMENT_SUFFIX)])
+                      for name in os.listdir(self.directory)
+                      if name.endswith(SEGMENT_SUFFIX))
+
+    def load_checkpoint(self):
+        try:
+            with open(os.path.join(self.directory, CHECKPOINT)) as f:
+                segment, offset = f.read().split()
+                return int(segment), int(offset)
+        except (IOError, ValueError):
+            return 0, 0
+
+    def save_checkpoint(self):
+        path = os.path.join(self.directory, CHECKPOINT)
+        with open(path + ".tmp", "w") as f:
+            f.write("%d %d\n" % (self.read_segment, self.read_offset))
+        os.replace(path + ".tmp", path)
+
+    def append(self, body):
+        """Appends a line protocol body to the active segment"""
+        with self.lock:
+            self.write_file.write(body)
+            self.write_file.flush()
+            self.write_offset += len(body)
+            self.appended_bytes += len(body)
+
+            if self.write_offset >= self.segment_size:
+                os.fsync(self.write_file.fileno())
+                self.write_file.close()
+                self.write_segment += 1
+                self.write_file = open(self.path(self.write_segment), "ab")
+                self.write_offset = 0
+
+            self.appended.notify()
+
+    def run(self):
+        """Drains the spool into Influx until stop() is called"""
+        self.running = True
+        while self.running:
+            with self.lock:
+                active = self.read_segment == self.write_segment
+                if active and self.read_offset >= self.write_offset:
+                    self.appended.wait(self.retry_interval)
+                    continue
+
+            if not self.prepared:
+                try:
+                    self.prepare()
+                    self.prepared = True
+                except Exception as e:
+                    logging.error("[Spool] Not ready to drain: %s", e)
+                    with self.lock:
+                        self.failures += 1
+                    time.sleep(self.retry_interval)
+                    continue
+
+            if not self.drain_once(active):
+                time.sleep(self.retry_interval)
+
+    def drain_once(self, active):
+        """Posts the next chunk of the current segment, returns False if the
+        post failed"""
+        with open(self.path(self.read_segment), "rb") as f:
+            f.seek(self.read_offset)
+            data = f.read(self.drain_size)
+
+        end = data.rfind(b"\n") + 1
+        if end == 0:
+            if not active and len(data) < self.drain_size:
+                # Torn tail of a segment from a crashed run
+                self.next_segment()
+            return True
+
+        start = time.monotonic()
+        try:
+            self.post(data[:end])
+        except Exception as e:
+            code = getattr(e, 'code', None)
+            if code == 404:
+                # e.g. database not found, prepare again before retrying
+                self.prepared = self.prepare is None
+            elif code is not None and 400 <= code < 500:
+                self.reject(data[:end], e)
+                return True
+            logging.error("[Spool] Failed to drain %d bytes: %s", end, e)
+            with self.lock:
+                self.failures += 1
+            return False
+
+        elapsed = time.monotonic() - start
+        with self.lock:
+            self.read_offset += end
+            self.drained_bytes += end
+            if elapsed > 0:
+                self.drain_rate = end / elapsed
+        self.save_checkpoint()
+        return True
+
+    def reject(self, chunk, error):
+        """Moves a chunk Influx will not accept to the rejected file and
+        skips past it"""
+        logging.error("[Spool] Influx rejected %d bytes, moved to %s: %s",
+                      len(chunk), REJECTED, error)
+        with open(os.path.join(self.directory, REJECTED), "ab") as f:
+            f.write(chunk)
+        with self.lock:
+            self.read_offset += len(chunk)
+            self.rejected += 1
+            self.rejected_bytes += len(chunk)
+        self.save_checkpoint()
+
+    def next_segment(self):
+        """Deletes the drained segment and moves on to the next one"""
+        with self.lock:
+            finished = self.read_segment
+            self.read_segment += 1
+            self.read_offset = 0
+            self.save_checkpoint()
+            os.remove(self.path(finished))
+
+    def backlog(self):
+        """Returns the number of spooled bytes that have not been drained"""
+        total = 0
+        with self.lock:
+            for segment in self.segments():
+                # next_segment() deletes under the lock, so every segment
+                # listed is still there
+                if segment >= self.read_segment:
+                    total += os.path.getsize(self.path(segment))
+            return total - self.read_offset
+
+    def stop(self):
+        self.running = False
+        with self.lock:
+            self.appended.notify()
+
+    def stats(self):
+        """Returns the spool counters"""
+        backlog = self.backlog()
+        with self.lock:
+            return {
+                "appended_bytes": self.appended_bytes,
+                "drained_bytes": self.drained_bytes,
+                "backlog_bytes": backlog,
+                "failures": self.failures,
+                "rejected": self.rejected,
+                "rejected_bytes": self.rejected_bytes,
+                "drain_rate": self.drain_rate,
+                "read_segment": self.read_segment,
+                "write_segment": self.write_segment,
+            }
@@ -0,0 +1,226 @@
+"""
+Live telemetry fan-out for Server-Sent Events.
+
+Clients subscribe with a set of fields and a rate. Subscribers asking for the
+same fields at the same rate share a `StreamGroup`: on each of its ticks the
+`StreamHub` thread encodes one frame holding only the fields that changed
+since the group's last frame, and every subscriber writes those same bytes.
+Encoding cost therefore grows with the number of distinct (fields, rate)
+groups, not with the number of clients.
+
+Subscribers only ever see a group's latest frame. One that falls behind (or
+has just joined) gets a full snapshot of the group's fields instead of the
+deltas it missed, so slow clients cannot hold frames in memory.
+
+The fields are those of /state, the expanded solenoid flags included. A
+field that stays NaN is not resent, and NaN (which JSON cannot hold) is sent
+as null.
+"""
+import json
+import math
+import time
+import threading
+from operator import attrgetter
+from openloop.telemetry import FIELD_NAMES, SOLENOIDS
+
+STREAM_FIELDS = FIELD_NAMES + tuple(name for name, _ in SOLENOIDS)
+
+DEFAULT_RATE = 10.0
+MAX_RATE = 50.0
+
+# Seconds between comments sent to idle subscribers so proxies and browsers
+# keep the connection open
+KEEPALIVE = 15.0
+
+_encode = json.JSONEncoder(separators=(',', ':')).encode
+
+
+def frame(seq, values):
+    """Returns one SSE event carrying values as JSON"""
+    for name, value in values.items():
+        if isinstance(value, float) and not math.isfinite(value):
+            values[name] = None
+    return ("id: %d\ndata: %s\n\n" % (seq, _encode(values))).encode()
+
+
+def same(value, old):
+    """Whether value is unchanged from old, NaN being unchanged from NaN"""
+    return value == old or (value != value and old != old)
+
+
+def make_getter(fields):
+    """Returns a function giving the tuple of fields' values in a
+    TelemetryPacket"""
+    masks = dict(SOLENOIDS)
+    if not any(name in masks for name in fields):
+        getter = attrgetter(*fields)
+        if len(fields) == 1:
+            return lambda state: (getter(state),)
+        return getter
+
+    def solenoid(mask):
+        return lambda state: 1 if state.solenoid_mask & mask else 0
+
+    getters = [solenoid(masks[name]) if name in masks else attrgetter(name)
+               for name in fields]
+    return lambda state: tuple(get(state) for get in getters)
+
+
+class StreamGroup:
+    def __init__(self, fields, interval):
+        self.fields = fields
+        self.interval = interval
+        self.getter = make_getter(fields)
+        self.subscribers = 0
+        self.deadline = time.monotonic()
+        self.cond = threading.Condition()
+        self.state = None
+        self.values = None
+        self.seq = 0
+        self.frame = None
+        self.snapshot_seq = 0
+        self.snapshot_frame = None
+
+    def tick(self, state):
+        """Encodes a frame of the fields that changed since the last one.
+        Returns the frame's size, or 0 if nothing changed."""
+        if state is None or state is self.state:
+            return 0
+        self.state = state
+
+        values = self.getter(state)
+
+        last = self.values
+        if last is None:
+            changed = dict(zip(self.fields, values))
+        else:
+            changed = dict((name, value) for name, value, old
+                           in zip(self.fields, values, last)
+                           if not same(value, old))
+        if not changed:
+            return 0
+
+        with self.cond:
+            self.values = values
+            self.seq += 1
+            self.frame = frame(self.seq, changed)
+            self.cond.notify_all()
+        return len(self.frame)
+
+    def snapshot(self):
+        """Returns (seq, frame) with every field of the latest values. Must be
+        called with cond held."""
+        if self.snapshot_seq != self.seq:
+            self.snapshot_frame = frame(
+                self.seq, dict(zip(self.fields, self.values)))
+            self.snapshot_seq = self.seq
+        return self.seq, self.snapshot_frame
+
+
+class StreamHub:
+    def __init__(self, server, max_rate=MAX_RATE):
+        self.server = server
+        self.max_rate = max_rate
+        self.groups = {}
+        self.cond = threading.Condition()
+        self.frames = 0
+        self.bytes = 0
+        # Set up front so subscribers that arrive before run() starts wait
+        self.running = True
+
+    def subscribe(self, fields=None, rate=DEFAULT_RATE):
+        """
+        Returns the StreamGroup for fields (all of STREAM_FIELDS if empty) at
+        rate Hz, capped to max_rate.
+
+        Raises KeyError for an unknown field and ValueError for a rate that
+        is not positive.
+        """
+        if not fields:
+            fields = STREAM_FIELDS
+        for name in fields:
+            if name not in STREAM_FIELDS:
+                raise KeyError(name)
+        if not rate > 0:
+            raise ValueError(rate)
+
+        # Order-insensitive key, interval rounded so similar rates share
+        fields = tuple(sorted(set(fields)))
+        interval = round(1.0 / min(rate, self.max_rate), 3)
+        key = (fields, interval)
+
+        with self.cond:
+            group = self.groups.get(key)
+            if group is None:
+                group = self.groups[key] = StreamGroup(fields, interval)
+                self.cond.notify()
+            group.subscribers += 1
+        return group
+
+    def unsubscribe(self, group):
+        with self.cond:
+            group.subscribers -= 1
+            if group.subscribers <= 0:
+                self.groups.pop((group.fields, group.interval), None)
+
+    def events(self, group):
+        """Yields SSE frames from group until the hub stops, then
+        unsubscribes. Meant to be the body of a streaming response."""
+        seen = 0
+        try:
+            yield b"retry: 1000\n\n"
+            while self.running:
+                with group.cond:
+                    if group.seq == seen:
+                        group.cond.wait(KEEPALIVE)
+                    if group.seq == seen:
+                        data = b": keepalive\n\n"
+                    elif group.seq == seen + 1:
+                        seen, data = group.seq, group.frame
+                    else:
+                        # Joined late or missed frames
+                        seen, data = group.snapshot()
+                yield data
+        finally:
+            self.unsubscribe(group)
+
+    def run(self):
+        """Ticks each group on its own interval until stop() is called"""
+        with self.cond:
+            while self.running:
+                now = time.monotonic()
+                state = self.server.state
+                timeout = None
+                for group in list(self.groups.values()):
+                    if group.deadline <= now:
+                        size = group.tick(state)
+                        if size:
+                            self.frames += 1
+                            self.bytes += size
+                        group.deadline += group.interval
+                        if group.deadline <= now:
+                            # Fell behind, skip rather than burst
+                            group.deadline = now + group.interval
+                    wait = group.deadline - now
+                    if timeout is None or wait < timeout:
+                        timeout = wait
+                self.cond.wait(timeout)
+
+    def stop(self):
+        with self.cond:
+            self.running = False
+            self.cond.notify()
+            groups = list(self.groups.values())
+        for group in groups:
+            with group.cond:
+                group.cond.notify_all()
+
+    def stats(self):
+        with self.cond:
+            groups = list(self.groups.values())
+        return {
+            "groups": len(groups),
+            "subscribers": sum(group.subscribers for group in groups),
+            "frames": self.frames,
+            "bytes": self.bytes
+        }
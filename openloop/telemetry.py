@@ -0,0 +1,181 @@
+"""
+Declarative description of the pod telemetry packet.
+
+The layout mirrors `struct telemetry_packet` in the core control code. The
+schema is compiled once into a `struct.Struct` and every datagram is decoded
+straight into a `TelemetryPacket` tuple; the flattened dict view (including the
+expanded solenoid flags) is only built when something asks for it.
+"""
+import struct
+from collections import namedtuple
+
+# (name, struct code, unit)
+FIELDS = (
+    ("version", "B", None),
+    ("size", "H", "bytes"),
+    ("state", "B", None),
+    ("solenoid_mask", "I", None),
+    ("timestamp", "Q", "us"),
+    ("position_x", "f", "m"),
+    ("position_y", "f", "m"),
+    ("position_z", "f", "m"),
+    ("velocity_x", "f", "m/s"),
+    ("velocity_y", "f", "m/s"),
+    ("velocity_z", "f", "m/s"),
+    ("acceleration_x", "f", "m/s^2"),
+    ("acceleration_y", "f", "m/s^2"),
+    ("acceleration_z", "f", "m/s^2"),
+    ("pusher_0", "f", "mm"),
+    ("pusher_1", "f", "mm"),
+    ("pusher_2", "f", "mm"),
+    ("pusher_3", "f", "mm"),
+    ("levitation_0", "f", "mm"),
+    ("levitation_1", "f", "mm"),
+    ("levitation_2", "f", "mm"),
+    ("levitation_3", "f", "mm"),
+    ("levitation_4", "f", "mm"),
+    ("levitation_5", "f", "mm"),
+    ("levitation_6", "f", "mm"),
+    ("levitation_7", "f", "mm"),
+    ("hp_pressure", "f", "psi"),
+    ("reg_pressure_0", "f", "psi"),
+    ("reg_pressure_1", "f", "psi"),
+    ("reg_pressure_2", "f", "psi"),
+    ("reg_pressure_3", "f", "psi"),
+    ("clamp_pressure_0", "f", "psi"),
+    ("clamp_pressure_1", "f", "psi"),
+    ("brake_tank_0", "f", "psi"),
+    ("brake_tank_1", "f", "psi"),
+    ("hp_thermo", "f", "C"),
+    ("reg_thermo_0", "f", "C"),
+    ("reg_thermo_1", "f", "C"),
+    ("reg_thermo_2", "f", "C"),
+    ("reg_thermo_3", "f", "C"),
+    ("reg_surf_thermo_0", "f", "C"),
+    ("reg_surf_thermo_1", "f", "C"),
+    ("reg_surf_thermo_2", "f", "C"),
+    ("reg_surf_thermo_3", "f", "C"),
+    ("power_thermo_0", "f", "C"),
+    ("power_thermo_1", "f", "C"),
+    ("power_thermo_2", "f", "C"),
+    ("power_thermo_3", "f", "C"),
+    ("clamp_thermo_0", "f", "C"),
+    ("clamp_thermo_1", "f", "C"),
+    ("frame_thermo", "f", "C"),
+    ("voltage_0", "f", "V"),
+    ("voltage_1", "f", "V"),
+    ("current_0", "f", "A"),
+    ("current_1", "f", "A"),
+)
+
+SKATE_0_MASK = 0x0001
+SKATE_1_MASK = 0x0002
+SKATE_2_MASK = 0x0004
+SKATE_3_MASK = 0x0008
+CLAMP_ENG_0_MASK = 0x0010
+CLAMP_REL_0_MASK = 0x0020
+CLAMP_ENG_1_MASK = 0x0040
+CLAMP_REL_1_MASK = 0x0080
+WHEEL_CAL_0_MASK = 0x0080
+HPFIL_MASK = 0x0100
+VENT_MASK = 0x0200
+PUSH_MASK = 0x0400
+PACK_A_ENG_MASK = 0x0800
+PACK_B_ENG_MASK = 0x1000
+
+# (name, mask) pairs expanded from `solenoid_mask` in the dict view
+SOLENOIDS = (
+    ("SOL_SKATE_0", SKATE_0_MASK),
+    ("SOL_SKATE_1", SKATE_1_MASK),
+    ("SOL_SKATE_2", SKATE_2_MASK),
+    ("SOL_SKATE_3", SKATE_3_MASK),
+    ("SOL_CLAMP_ENG_0", CLAMP_ENG_0_MASK),
+    ("SOL_CLAMP_REL_0", CLAMP_REL_0_MASK),
+    ("SOL_CLAMP_ENG_1", CLAMP_ENG_1_MASK),
+    ("SOL_CLAMP_REL_1", CLAMP_REL_1_MASK),
+    ("PACK_A_ENG", PACK_A_ENG_MASK),
+    ("PACK_B_ENG", PACK_B_ENG_MASK),
+    ("SOL_HPFIL", HPFIL_MASK),
+    ("SOL_VENT", VENT_MASK),
+    ("pusher_present", PUSH_MASK),
+)
+
+FIELD_NAMES = tuple(name for name, _, _ in FIELDS)
+UNITS = dict((name, unit) for name, _, unit in FIELDS if unit is not None)
+FORMAT = "<" + "".join(code for _, code, _ in FIELDS)
+
+# Influx measurement holding one multi-field point per packet
+MEASUREMENT = "telemetry"
+
+TELEMETRY_STRUCT = struct.Struct(FORMAT)
+PACKET_LENGTH = TELEMETRY_STRUCT.size
+
+_unpack = TELEMETRY_STRUCT.unpack
+_unpack_from = TELEMETRY_STRUCT.unpack_from
+_new = tuple.__new__
+
+
+class TelemetryPacket(namedtuple("TelemetryPacket", FIELD_NAMES)):
+    """A single decoded telemetry packet"""
+    __slots__ = ()
+
+    def solenoids(self):
+        """Returns the expanded solenoid flags as (name, 0/1) pairs"""
+        mask = self.solenoid_mask
+        return [(name, 1 if mask & bit else 0) for name, bit in SOLENOIDS]
+
+    def as_dict(self):
+        """Returns the flattened dict view of the packet"""
+        data = dict(zip(FIELD_NAMES, self))
+        mask = self.solenoid_mask
+        for name, bit in SOLENOIDS:
+            data[name] = 1 if mask & bit else 0
+        return data
+
+    def to_point(self, tags=None):
+        """
+        Returns the packet as a single Influx point in MEASUREMENT.
+
+        The time is the packet's own timestamp in nanoseconds, so the point
+        must be written with a time_precision of 'n'.
+        """
+        return {
+            "measurement": MEASUREMENT,
+            "tags": tags or {},
+            "time": self.timestamp * 1000,
+            "fields": self.as_dict()
+        }
+
+
+def decode(msg):
+    """Decodes a PACKET_LENGTH byte datagram into a TelemetryPacket"""
+    return _new(TelemetryPacket, _unpack(msg))
+
+
+def decode_from(buf, offset=0):
+    """Decodes the TelemetryPacket found at offset in buf without copying"""
+    return _new(TelemetryPacket, _unpack_from(buf, offset))
+
+
+def record_stride(buf):
+    """
+    Returns the distance between packets in a buffer of concatenated records.
+
+    Captures written by the core control code pad each record out to the
+    `size` declared in its header, so trust that when it tiles the buffer.
+    """
+    if len(buf) < PACKET_LENGTH:
+        return PACKET_LENGTH
+    (size,) = struct.unpack_from("<H", buf, 1)
+    if size >= PACKET_LENGTH and len(buf) % size == 0:
+        return size
+    return PACKET_LENGTH
+
+
+def iter_packets(buf, stride=None):
+    """Yields a memoryview of each packet in a buffer of concatenated records"""
+    if stride is None:
+        stride = record_stride(buf)
+    view = memoryview(buf)
+    for offset in range(0, len(view) - PACKET_LENGTH + 1, stride):
+        yield view[offset:offset + PACKET_LENGTH]
@@ -0,0 +1,258 @@
+"""
+Batched UDP receive.
+
+`DatagramReceiver` reads up to `batch_size` datagrams per call straight into
+the free slots of a `PacketRing`, with a single `recvmmsg` syscall where libc
+has it and a blocking `recvmsg_into` followed by a non-blocking drain
+otherwise.
+
+On Linux the socket is asked for `SO_RXQ_OVFL`, so every datagram carries the
+number of datagrams the kernel has dropped on that socket because its receive
+buffer was full. The count arrives with the datagrams, so drops after the last
+one read show up with the next. `configure_socket` sizes that buffer.
+"""
+import socket
+import ctypes
+import struct
+import logging
+from errno import EINTR
+
+# Not exported by the socket module
+SO_RXQ_OVFL = getattr(socket, "SO_RXQ_OVFL", 40)
+SO_RCVBUFFORCE = getattr(socket, "SO_RCVBUFFORCE", 33)
+MSG_WAITFORONE = 0x10000
+
+_SOCKADDR_SIZE = 16
+_CONTROL_SIZE = socket.CMSG_SPACE(4) if hasattr(socket, "CMSG_SPACE") else 0
+_CMSG_HEADER = struct.Struct("@NiiI")
+
+
+class iovec(ctypes.Structure):
+    _fields_ = [("iov_base", ctypes.c_void_p),
+                ("iov_len", ctypes.c_size_t)]
+
+
+class msghdr(ctypes.Structure):
+    _fields_ = [("msg_name", ctypes.c_void_p),
+                ("msg_namelen", ctypes.c_uint32),
+                ("msg_iov", ctypes.POINTER(iovec)),
+                ("msg_iovlen", ctypes.c_size_t),
+                ("msg_control", ctypes.c_void_p),
+                ("msg_controllen", ctypes.c_size_t),
+                ("msg_flags", ctypes.c_int)]
+
+
+class mmsghdr(ctypes.Structure):
+    _fields_ = [("msg_hdr", msghdr),
+                ("msg_len", ctypes.c_uint)]
+
+
+def _load_recvmmsg():
+    try:
+        libc = ctypes.CDLL(None, use_errno=True)
+        func = libc.recvmmsg
+    except (OSError, AttributeError):
+        return None
+    func.argtypes = [ctypes.c_int, ctypes.c_void_p, ctypes.c_uint,
+                     ctypes.c_int, ctypes.c_void_p]
+    func.restype = ctypes.c_int
+    return func
+
+
+_recvmmsg = _load_recvmmsg()
+
+
+def configure_socket(sock, rcvbuf=None):
+    """
+    Sets the receive buffer to rcvbuf bytes and enables kernel drop counters
+    where supported. Returns the receive buffer size the kernel granted.
+    """
+    if rcvbuf:
+        try:
+            # Not capped by net.core.rmem_max, but needs CAP_NET_ADMIN
+            sock.setsockopt(socket.SOL_SOCKET, SO_RCVBUFFORCE, rcvbuf)
+        except OSError:
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, rcvbuf)
+
+    granted = sock.getsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF)
+    if rcvbuf and granted < rcvbuf:
+        logging.warning("[udp] Asked for a %d byte receive buffer, got %d "
+                        "(see net.core.rmem_max)", rcvbuf, granted)
+
+    try:
+        sock.setsockopt(socket.SOL_SOCKET, SO_RXQ_OVFL, 1)
+    except OSError:
+        pass
+    return granted
+
+
+class DatagramReceiver:
+    """Receives datagrams from sock in batches straight into ring slots"""
+
+    def __init__(self, sock, ring, batch_size=64, use_recvmmsg=True):
+        self.sock = sock
+        self.ring = ring
+        self.batch_size = batch_size
+        self.slots = [ring.view[i * ring.slot_size:(i + 1) * ring.slot_size]
+                      for i in range(ring.slots)]
+        self.addresses = {}
+
+        self.received = 0
+        self.batches = 0
+        self.kernel_drops = 0
+
+        self.use_recvmmsg = use_recvmmsg and _recvmmsg is not None and \
+            sock.family == socket.AF_INET
+        if self.use_recvmmsg:
+            self._setup_recvmmsg()
+
+    def _setup_recvmmsg(self):
+        # One mmsghdr, iovec, address and control buffer per ring slot, so a
+        # batch is received with a pointer to the first free slot's header
+        n = self.ring.slots
+        base = ctypes.addressof(
+            (ctypes.c_char * len(self.ring.buffer)).from_buffer(
+                self.ring.buffer))
+        self.names = ctypes.create_string_buffer(n * _SOCKADDR_SIZE)
+        # sockaddr_in family, port and address as one integer
+        self.name_keys = (ctypes.c_uint64 * (n * _SOCKADDR_SIZE // 8)) \
+            .from_buffer(self.names)
+        self.control = ctypes.create_string_buffer(max(n * _CONTROL_SIZE, 1))
+        self.iovecs = (iovec * n)()
+        self.msgs = (mmsghdr * n)()
+        self.msgs_addr = ctypes.addressof(self.msgs)
+
+        # msg_len and msg_controllen of every header, accessed without
+        # creating ctypes objects
+        self.msg_words = (ctypes.c_uint * (ctypes.sizeof(self.msgs) // 4)) \
+            .from_buffer(self.msgs)
+        self.msg_sizes = (ctypes.c_size_t *
+                          (ctypes.sizeof(self.msgs) //
+                           ctypes.sizeof(ctypes.c_size_t))) \
+            .from_buffer(self.msgs)
+        self.msg_stride = ctypes.sizeof(mmsghdr)
+        self.word_stride = self.msg_stride // 4
+        self.size_stride = self.msg_stride // ctypes.sizeof(ctypes.c_size_t)
+        self.msg_len_index = mmsghdr.msg_len.offset // 4
+        self.controllen_index = msghdr.msg_controllen.offset // \
+            ctypes.sizeof(ctypes.c_size_t)
+
+        names = ctypes.addressof(self.names)
+        control = ctypes.addressof(self.control)
+        for i in range(n):
+            self.iovecs[i].iov_base = base + i * self.ring.slot_size
+            self.iovecs[i].iov_len = self.ring.slot_size
+            hdr = self.msgs[i].msg_hdr
+            hdr.msg_name = names + i * _SOCKADDR_SIZE
+            hdr.msg_namelen = _SOCKADDR_SIZE
+            hdr.msg_iov = ctypes.pointer(self.iovecs[i])
+            hdr.msg_iovlen = 1
+            if _CONTROL_SIZE:
+                hdr.msg_control = control + i * _CONTROL_SIZE
+
+    def receive(self):
+        """Blocks for at least one datagram, writes everything read into the
+        ring and publishes it. Returns the number of datagrams read."""
+        seq, count = self.ring.reserve(self.batch_size)
+        if self.use_recvmmsg:
+            n = self._receive_mmsg(seq, count)
+        else:
+            n = self._receive_drain(seq, count)
+
+        self.ring.publish(n)
+        self.received += n
+        self.batches += 1
+        return n
+
+    def _receive_mmsg(self, seq, count):
+        ring = self.ring
+        index = seq % ring.slots
+        end = index + count
+
+        # The kernel overwrites msg_controllen with what it used
+        sizes = self.msg_sizes
+        for i in range(index * self.size_stride + self.controllen_index,
+                       end * self.size_stride, self.size_stride):
+            sizes[i] = _CONTROL_SIZE
+
+        while True:
+            n = _recvmmsg(self.sock.fileno(),
+                          self.msgs_addr + index * self.msg_stride,
+                          count, MSG_WAITFORONE, None)
+            if n >= 0:
+                break
+            errno = ctypes.get_errno()
+            if errno != EINTR:
+                raise OSError(errno, "recvmmsg failed")
+            # Interrupted by a signal before anything arrived, retry as
+            # Python does for its own system calls (PEP 475)
+
+        lengths = ring.lengths
+        addrs = ring.addrs
+        words = self.msg_words
+        name_keys = self.name_keys
+        for i in range(index, index + n):
+            lengths[i] = words[i * self.word_stride + self.msg_len_index]
+            key = name_keys[i * 2]
+            addr = self.addresses.get(key)
+            if addr is None:
+                offset = i * _SOCKADDR_SIZE
+                addr = self.addresses[key] = self._address(
+                    self.names.raw[offset + 2:offset + 8])
+            addrs[i] = addr
+
+        last = index + n - 1
+        if n and sizes[last * self.size_stride + self.controllen_index]:
+            self._read_drops(self.control.raw[last * _CONTROL_SIZE:
+                                              (last + 1) * _CONTROL_SIZE])
+        return n
+
+    def _address(self, raw):
+        port, ip = struct.unpack("!H4s", raw)
+        return (socket.inet_ntoa(ip), port)
+
+    def _read_drops(self, control):
+        _, level, kind, drops = _CMSG_HEADER.unpack_from(control)
+        if level == socket.SOL_SOCKET and kind == SO_RXQ_OVFL:
+            self.kernel_drops = drops
+
+    def _receive_drain(self, seq, count):
+        ring = self.ring
+        index = seq % ring.slots
+        flags = 0
+        ancsize = _CONTROL_SIZE
+        n = 0
+        while n < count:
+            slot = self.slots[index + n]
+            try:
+                if ancsize:
+                    nbytes, ancdata, _, addr = self.sock.recvmsg_into(
+                        [slot], ancsize, flags)
+                    for level, kind, data in ancdata:
+                        if level == socket.SOL_SOCKET and \
+                                kind == SO_RXQ_OVFL:
+                            self.kernel_drops = struct.unpack("I", data)[0]
+                else:
+                    nbytes, addr = self.sock.recvfrom_into(slot, 0, flags)
+            except (BlockingIOError, InterruptedError):
+                break
+
+            ring.lengths[index + n] = nbytes
+            ring.addrs[index + n] = addr
+            n += 1
+            if not hasattr(socket, "MSG_DONTWAIT"):
+                break
+            flags = socket.MSG_DONTWAIT
+        return n
+
+    def stats(self):
+        return {
+            "received": self.received,
+            "batches": self.batches,
+            "mean_batch": self.received / self.batches if self.batches else 0,
+            "kernel_drops": self.kernel_drops,
+            "rcvbuf": self.sock.getsockopt(socket.SOL_SOCKET,
+                                           socket.SO_RCVBUF),
+            "recvmmsg": self.use_recvmmsg,
+            "ring": self.ring.stats()
+        }
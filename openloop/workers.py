@@ -0,0 +1,126 @@
+"""
+Multi-process telemetry ingestion.
+
+`WorkerPool` forks N worker processes. Each one builds its own ODSServer (and
+Influx writer) with `make_server(index)` and binds the telemetry port with
+SO_REUSEPORT, so the kernel spreads senders across the workers. Every
+`publish_interval` seconds a worker sends the pods it has heard from since the
+last update, plus its counters, to the parent over a multiprocessing queue.
+The parent's aggregator thread (`run`) merges those into the parent's
+ODSServer, which keeps serving /state, /pods and /stats, and whose SpaceX
+forwarder sends the merged state.
+
+The kernel hashes on the sender's address and port, so a single pod always
+lands on the same worker; the pool scales with the number of senders.
+"""
+import os
+import time
+import queue
+import logging
+import threading
+import multiprocessing
+
+
+def _publish(index, server, updates, interval):
+    """Runs in a worker: sends pod states and counters to the parent"""
+    published = {}
+    while True:
+        time.sleep(interval)
+        pods = {}
+        for name, pod in list(server.pods.items()):
+            if pod.state is None or published.get(name) == pod.last_seen:
+                continue
+            published[name] = pod.last_seen
+            pods[name] = (pod.state, pod.addr, pod.received, pod.invalid,
+                          pod.first_seen, pod.last_seen)
+
+        stats = {
+            "pid": os.getpid(),
+            "received": server.received,
+            "invalid": server.invalid,
+            "errors": server.errors,
+            "socket": server.get_socket_stats(),
+            "writer": server.writer.stats()
+        }
+        updates.put((index, pods, stats))
+
+
+def _worker_main(index, make_server, updates, interval):
+    server = make_server(index)
+    threading.Thread(target=server.run, daemon=True).start()
+    _publish(index, server, updates, interval)
+
+
+class WorkerPool:
+    def __init__(self, count, make_server, publish_interval=0.05):
+        self.count = count
+        self.make_server = make_server
+        self.publish_interval = publish_interval
+        self.context = multiprocessing.get_context("fork")
+        self.updates = self.context.Queue()
+        self.processes = []
+        self.workers = {}
+        self.pod_counts = {}
+        self.running = False
+
+    def start(self):
+        """Forks the workers. Call this before starting any threads."""
+        for index in range(self.count):
+            process = self.context.Process(
+                target=_worker_main, name="ods-worker-%d" % index,
+                args=(index, self.make_server, self.updates,
+                      self.publish_interval),
+                daemon=True)
+            process.start()
+            self.processes.append(process)
+
+    def run(self, server):
+        """Merges worker updates into server until stop() is called"""
+        self.running = True
+        while self.running:
+            try:
+                index, pods, stats = self.updates.get(timeout=1)
+            except queue.Empty:
+                continue
+
+            try:
+                self.merge(server, index, pods, stats)
+            except Exception as e:
+                logging.exception(e)
+
+    def merge(self, server, index, pods, stats):
+        self.workers[index] = stats
+        server.received = sum(w["received"] for w in self.workers.values())
+        server.invalid = sum(w["invalid"] for w in self.workers.values())
+        server.errors = sum(w["errors"] for w in self.workers.values())
+
+        for name, update in pods.items():
+            (packet, addr, received, invalid, first_seen, last_seen) = update
+            self.pod_counts[(name, index)] = (received, invalid)
+
+            pod = server.get_sender(addr)
+            pod.received = sum(r for (n, _), (r, _) in self.pod_counts.items()
+                               if n == name)
+            pod.invalid = sum(i for (n, _), (_, i) in self.pod_counts.items()
+                              if n == name)
+            pod.first_seen = min(pod.first_seen, first_seen)
+
+            if pod.state is None or packet.timestamp >= pod.state.timestamp:
+                pod.update(packet, addr)
+                pod.last_seen = last_seen
+                # Only the published states reach the parent's history
+                if server.history is not None:
+                    server.history.append(packet, addr[0])
+            if server.state is None or \
+                    packet.timestamp >= server.state.timestamp:
+                server.state = packet
+
+    def stop(self):
+        self.running = False
+        for process in self.processes:
+            process.terminate()
+
+    def stats(self):
+        """Returns the latest counters reported by each worker"""
+        return [dict(self.workers[index], index=index)
+                for index in sorted(self.workers)]
@@ -0,0 +1,184 @@
+import time
+import queue
+import logging
+import threading
+from influxdb.line_protocol import make_lines
+
+WRITE_HEADERS = {
+    'Content-Type': 'application/octet-stream',
+    'Accept': 'text/plain'
+}
+
+
+def create_database(influx, database):
+    """Creates the database unless Influx already has it"""
+    if {'name': database} not in influx.get_list_database():
+        influx.create_database(database)
+
+
+class InfluxWriter:
+    """
+    Storage stage between the receive loops and InfluxDB.
+
+    Producers hand over the data for one packet with `submit` (point dicts) or
+    `submit_lines` (pre-encoded line protocol), neither of which blocks: if the
+    bounded queue is full the points are dropped and counted. A background
+    thread (`run`) collects submissions and posts them to Influx as one line
+    protocol body once `batch_size` packets are waiting or the oldest one is
+    `flush_interval` seconds old.
+
+    With a `Spool`, batches are appended to it instead and its drainer posts
+    them, so a slow or unreachable Influx never backs up the queue.
+    """
+
+    def __init__(self, influx, database, batch_size=500, flush_interval=0.1,
+                 max_queue=10000, time_precision='n', spool=None):
+        self.influx = influx
+        self.database = database
+        self.spool = spool
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.time_precision = time_precision
+        self.queue = queue.Queue(maxsize=max_queue)
+        self.running = False
+        self.lock = threading.Lock()
+
+        self.submitted = 0
+        self.dropped = 0
+        self.written = 0
+        self.failed = 0
+        self.flushes = 0
+        self.bytes_written = 0
+        self.high_water = 0
+        self.last_flush_duration = 0.0
+
+    def submit(self, points):
+        """Queues the point dicts for one packet, returns False if they were
+        dropped"""
+        return self._put(points, len(points))
+
+    def submit_lines(self, lines, points=1):
+        """Queues encoded line protocol bytes for one packet, returns False if
+        they were dropped"""
+        return self._put(lines, points)
+
+    def _put(self, item, points):
+        with self.lock:
+            self.submitted += points
+
+        try:
+            self.queue.put_nowait((item, points))
+        except queue.Full:
+            with self.lock:
+                self.submitted -= points
+                self.dropped += points
+            return False
+
+        with self.lock:
+            depth = self.queue.qsize()
+            if depth > self.high_water:
+                self.high_water = depth
+        return True
+
+    def run(self):
+        """Runs the writer loop until stop() is called"""
+        self.running = True
+        batch = []
+        points = 0
+        deadline = None
+
+        while self.running or not self.queue.empty():
+            timeout = self.flush_interval
+            if deadline is not None:
+                timeout = max(0, deadline - time.monotonic())
+
+            try:
+                item, count = self.queue.get(timeout=timeout)
+            except queue.Empty:
+                item = None
+
+            if item is not None:
+                if deadline is None:
+                    deadline = time.monotonic() + self.flush_interval
+                batch.append(item)
+                points += count
+
+            if batch and (len(batch) >= self.batch_size or
+                          time.monotonic() >= deadline):
+                self.flush(batch, points)
+                batch = []
+                points = 0
+                deadline = None
+
+        if batch:
+            self.flush(batch, points)
+
+    def encode(self, batch):
+        """Joins a batch of submissions into one line protocol body"""
+        chunks = []
+        for item in batch:
+            if isinstance(item, bytes):
+                chunks.append(item)
+            else:
+                chunks.append(make_lines({"points": item},
+                                         self.time_precision).encode('utf-8'))
+        return b"".join(chunks)
+
+    def flush(self, batch, points):
+        """Writes a batch of submissions to Influx"""
+        start = time.monotonic()
+        try:
+            body = self.encode(batch)
+            if self.spool is not None:
+                self.spool.append(body)
+            else:
+                self.post(body)
+        except Exception as e:
+            logging.error("[InfluxWriter] Failed to write %d points: %s",
+                          points, e)
+            with self.lock:
+                self.failed += points
+        else:
+            with self.lock:
+                self.written += points
+                self.bytes_written += len(body)
+        finally:
+            with self.lock:
+                self.flushes += 1
+                self.last_flush_duration = time.monotonic() - start
+
+    def create_database(self):
+        create_database(self.influx, self.database)
+
+    def post(self, body):
+        """Sends a line protocol body through the client's raw write path"""
+        self.influx.request(url="write", method='POST',
+                            params={'db': self.database,
+                                    'precision': self.time_precision},
+                            data=body, expected_response_code=204,
+                            headers=WRITE_HEADERS)
+
+    def stop(self):
+        self.running = False
+
+    def stats(self):
+        """Returns the writer counters"""
+        spool = None
+        if self.spool is not None:
+            spool = self.spool.stats()
+
+        with self.lock:
+            return {
+                "spool": spool,
+                "submitted": self.submitted,
+                "queued": self.submitted - self.written - self.failed,
+                "written": self.written,
+                "dropped": self.dropped,
+                "failed": self.failed,
+                "flushes": self.flushes,
+                "bytes_written": self.bytes_written,
+                "queue_depth": self.queue.qsize(),
+                "queue_high_water": self.high_water,
+                "queue_capacity": self.queue.maxsize,
+                "last_flush_duration": self.last_flush_duration,
+            }
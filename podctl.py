@@ -31,6 +31,9 @@ from openloop.heart import Heart
 PROMPT_TRACK = 0
 LAST_PROMPT = ""
 
+# Commands handled by podctl itself rather than sent to the pod
+STATUS_COMMAND = ".status"
+
 
 def progress():
     global PROMPT_TRACK
@@ -68,7 +71,38 @@ def make_prompt(pod, extra="> "):
     return text
 
 
-def loop(pod):
+def format_ms(stats):
+    return "n=%d mean=%.1fms p50=%.1fms p99=%.1fms max=%.1fms" % (
+        stats["count"], stats["mean"] * 1000, stats["p50"] * 1000,
+        stats["p99"] * 1000, stats["max"] * 1000)
+
+
+def format_status(stats, heart=None):
+    """Returns the link metrics from Pod.stats() (and the heartbeat's
+    Heart.stats()) as readable lines"""
+    lines = [
+        "Link %s %s, up %.0fs, %d reconnects (%d failed attempts)" % (
+            stats["addr"],
+            "connected" if stats["connected"] else "disconnected",
+            stats["uptime"], stats["reconnects"], stats["connect_failures"]),
+        "  ping     %s, %d timeouts" % (format_ms(stats["ping"]),
+                                        stats["ping_timeouts"]),
+        "  command  %s, %d timeouts" % (format_ms(stats["command"]),
+                                        stats["command_timeouts"]),
+        "  connect  %s" % format_ms(stats["connect_time"]),
+        "  down     %s" % format_ms(stats["downtime"]),
+        "  %d bytes out, %d bytes in, %d in flight" % (
+            stats["bytes_out"], stats["bytes_in"], stats["in_flight"]),
+    ]
+    if heart is not None:
+        lines.append("  heart    every %gs (%s), %d beats, %d missed, "
+                     "%.1fms max late" % (
+                         heart["interval"], heart["mode"], heart["beats"],
+                         heart["missed"], heart["jitter"]["max"] * 1000))
+    return "\n".join(lines)
+
+
+def loop(pod, heart=None):
     cached_state = None
     user_write("\r" + make_prompt(pod))
 
@@ -97,7 +131,11 @@ def loop(pod):
                 logging.debug("EOF")
                 sys.exit(0)
 
-            print(pod.run(cmd))
+            if cmd.strip() == STATUS_COMMAND:
+                print(format_status(pod.stats(),
+                                    heart.stats() if heart else None))
+            else:
+                print(pod.run(cmd))
             user_write(make_prompt(pod))
 
         if pod.state != cached_state:
@@ -122,6 +160,10 @@ def main():
     parser.add_argument("-i", "--heartbeat-interval", default="200", type=int,
                         help="heartbeat interval (ms)")
 
+    parser.add_argument("-m", "--moving-interval", default="100", type=int,
+                        help="heartbeat interval while the pod is moving "
+                             "(ms)")
+
     args = parser.parse_args()
 
     if args.verbose:
@@ -136,13 +178,13 @@ def main():
         user_write("\r" + make_prompt(pod, Ansi.make_bold("> Ping Timeout!")))
     pod.timeout_handler = handle_timeout
 
-    heart = Heart(args.heartbeat_interval / 1000.0, pod.ping)
-
-    threading.Thread(target=heart.start).start()
+    heart = Heart(args.heartbeat_interval / 1000.0, pod.ping,
+                  args.moving_interval / 1000.0, pod.is_moving)
+    heart.start()
 
     while True:
         try:
-            loop(pod)
+            loop(pod, heart)
         except SystemExit:
             heart.stop()
             raise
@@ -1,47 +1,243 @@
+"""
+Reader for sensor boards (an Arduino, an MPU6050) that print one sample per
+line, either as bare numbers ("0.12 -0.98 9.81"), which are stored as raw_0,
+raw_1... or under the names of a header line ("ax ay az") sent before them,
+or as name=value pairs ("ax=0.12 ay=-0.98"). A line of words is only taken
+as the header once the line after it turns out to be a sample with as many
+columns, so a boot banner ("Initializing MPU6050") is skipped instead.
+
+Serial devices are opened with pyserial at `baudrate`; any other path (a
+capture file, a FIFO) is read as a plain file. Whatever has arrived is read
+in one chunk and split into lines as it comes, so a partial line waits for
+the rest of it instead of being parsed. The line protocol prefix for each
+column is rendered once per column layout and reused for every sample with
+that layout. Samples are submitted to the writer as one batch every
+`flush_interval` seconds rather than one call per value, and lines that do
+not parse are counted and skipped instead of restarting the reader.
+
+Each value is written as the 'value' field of a measurement named after its
+column, as before. Samples are timestamped when their line is assembled,
+kept strictly increasing so samples read in the same chunk do not
+overwrite each other in Influx.
+"""
 import os
+import math
+import stat
 import time
 import logging
-from datetime import datetime
+from openloop.line_protocol import escape_tag
+
+CHUNK_SIZE = 4096
+
+# Seconds a serial read waits for data before flushing what is batched
+READ_TIMEOUT = 0.05
+
+# Seconds between restarts after an error, doubling up to RETRY_MAX
+RETRY_MIN = 0.1
+RETRY_MAX = 5.0
+
+
+class ColumnLayout:
+    """The measurement names for the columns of a sample line and the line
+    protocol prefixes rendered for them"""
+
+    def __init__(self, names):
+        self.names = tuple(names)
+        self.prefixes = tuple(
+            ("%s value=" % escape_tag(name)).encode('utf-8')
+            for name in self.names)
+
+    def encode(self, values, timestamp):
+        """Returns the line protocol for one sample of float values"""
+        suffix = (" %d\n" % timestamp).encode('ascii')
+        return b"".join(prefix + repr(value).encode('ascii') + suffix
+                        for prefix, value in zip(self.prefixes, values))
 
 
 class RawReader:
-    def __init__(self, filename, baudrate=115200, influx=None):
+    def __init__(self, filename, baudrate=115200, writer=None,
+                 flush_interval=0.1):
         self.filename = filename
-        self.influx = influx
+        self.baudrate = baudrate
+        self.writer = writer
+        self.flush_interval = flush_interval
+        self.running = False
+        self.serial = None
+
+        self.header = None
+        self.candidate = None
+        self.layouts = {}
+        self.buffer = b""
+        self.batch = []
+        self.points = 0
+        self.deadline = None
+        self.last_time = 0
+
+        self.bytes_read = 0
+        self.samples = 0
+        self.invalid = 0
+        self.submits = 0
+        self.restarts = 0
 
     def run_safe(self):
-        """ Runs the RawReader and restarts it if there is an exception """
-        while True:
+        """Runs the RawReader, restarting it with backoff if there is an
+        exception, until stop() is called or a plain file ends"""
+        self.running = True
+        delay = RETRY_MIN
+        while self.running:
+            samples = self.samples
             try:
                 self.run()
+                return
             except Exception as e:
-                logging.exception(e)
+                logging.error("[RawReader] %s: %s", self.filename, e)
+
+            if self.samples > samples:
+                # It was working, start backing off again from scratch
+                delay = RETRY_MIN
+            self.restarts += 1
+            time.sleep(delay)
+            delay = min(delay * 2, RETRY_MAX)
 
     def run(self):
-        """Runs the RawReader"""
-        with open(self.filename) as f:
-            for line in f:
-                if line:
-                    logging.debug("[%s] %s" % (self.filename, line))
-                    data = {}
-                    for i, v in enumerate(line.split()):
-                        name = "raw_%d" % i
-                        if '=' in v:
-                            name = v.split('=')[0]
-                            v = v.split('=')[1]
-                        data[name] = float(v)
-
-                    print("%f %s" % (time.time(), data))
-                    self.store_metrics(data)
-
-    def store_metrics(self, data):
-        if self.influx:
-            measurements = []
-            for name, value in list(data.items()):
-                measurements.append({
-                        "measurement": name,
-                        "tags": {},
-                        "time":  datetime.utcnow().isoformat() + "Z",
-                        "fields": {"value": value}})
-            self.influx.write_points(measurements)
-            print("... Stored!")
+        """Reads samples until the source ends or stop() is called"""
+        self.running = True
+        self.buffer = b""
+        try:
+            self.serial = stat.S_ISCHR(os.stat(self.filename).st_mode)
+            if self.serial:
+                # pyserial is only needed for an actual serial port
+                import serial
+                with serial.Serial(self.filename, self.baudrate,
+                                   timeout=READ_TIMEOUT) as port:
+                    # Opened mid stream, the first line is likely partial
+                    port.reset_input_buffer()
+                    self.buffer = None
+                    while self.running:
+                        self.feed(port.read(port.in_waiting or 1))
+            else:
+                with open(self.filename, 'rb', buffering=0) as f:
+                    while self.running:
+                        data = f.read(CHUNK_SIZE)
+                        if not data:
+                            break
+                        self.feed(data)
+                    if self.buffer:
+                        # The last line had no newline
+                        self.parse(self.buffer)
+                        self.buffer = b""
+        finally:
+            self.flush()
+
+    def stop(self):
+        self.running = False
+
+    def feed(self, data):
+        """Parses the complete lines in data (plus what was left over from
+        the last chunk) and submits them when the batch is due"""
+        if data:
+            self.bytes_read += len(data)
+            if self.buffer is None:
+                if b"\n" not in data:
+                    return
+                data = data.split(b"\n", 1)[1]
+                self.buffer = b""
+            *lines, self.buffer = (self.buffer + data).split(b"\n")
+            for line in lines:
+                self.parse(line)
+
+        now = time.monotonic()
+        if self.deadline is not None and now >= self.deadline:
+            self.flush()
+
+    def parse(self, line):
+        """Adds the sample on one line to the batch"""
+        tokens = line.split()
+        if not tokens:
+            return
+
+        try:
+            if b"=" in line:
+                names = []
+                values = []
+                for i, token in enumerate(tokens):
+                    name, sep, value = token.partition(b"=")
+                    if not sep:
+                        name, value = ("raw_%d" % i).encode(), token
+                    elif not name:
+                        raise ValueError("empty name")
+                    names.append(name)
+                    values.append(float(value))
+                names = tuple(names)
+            else:
+                try:
+                    values = [float(token) for token in tokens]
+                except ValueError:
+                    if all(token[:1].isalpha() for token in tokens):
+                        # Perhaps the column names for the samples that
+                        # follow, sent again whenever the board resets
+                        self.propose_header(tuple(tokens))
+                        return
+                    raise
+                if self.candidate is not None:
+                    self.propose_header(None, len(values))
+                names = self.header
+                if names is None or len(names) != len(values):
+                    names = len(values)
+            if not all(map(math.isfinite, values)):
+                raise ValueError("not finite")
+        except ValueError:
+            self.invalid += 1
+            logging.debug("[RawReader] Invalid line %r", line)
+            return
+
+        layout = self.layouts.get(names)
+        if layout is None:
+            if isinstance(names, int):
+                layout = ColumnLayout("raw_%d" % i for i in range(names))
+            else:
+                layout = ColumnLayout(name.decode('utf-8', 'replace')
+                                      for name in names)
+            self.layouts[names] = layout
+
+        timestamp = max(int(time.time() * 1e9), self.last_time + 1)
+        self.last_time = timestamp
+        self.batch.append(layout.encode(values, timestamp))
+        self.points += len(values)
+        self.samples += 1
+        if self.deadline is None:
+            self.deadline = time.monotonic() + self.flush_interval
+
+    def propose_header(self, tokens, columns=None):
+        """Holds tokens as the header until the next sample, which adopts it
+        if it has as many columns (given as columns) and drops it
+        otherwise"""
+        candidate = self.candidate
+        self.candidate = tokens
+        if candidate is None:
+            return
+        if columns == len(candidate):
+            self.header = candidate
+        else:
+            self.invalid += 1
+            logging.debug("[RawReader] Not a header: %r", candidate)
+
+    def flush(self):
+        """Submits the batched samples to the writer"""
+        if self.batch and self.writer:
+            self.writer.submit_lines(b"".join(self.batch), self.points)
+            self.submits += 1
+        self.batch = []
+        self.points = 0
+        self.deadline = None
+
+    def stats(self):
+        return {
+            "source": self.filename,
+            "baudrate": self.baudrate if self.serial else None,
+            "bytes": self.bytes_read,
+            "samples": self.samples,
+            "invalid": self.invalid,
+            "submits": self.submits,
+            "restarts": self.restarts
+        }
@@ -0,0 +1,267 @@
+#!/usr/bin/env python3
+"""
+Replays captured telemetry into an ODS server over UDP.
+
+Reads either an ODS capture (`--capture` from ods.py) or a file of
+concatenated telemetry packets, and sends each packet as its own datagram with
+the original timing, a time multiplier, or as fast as possible. Where the
+platform has `sendmmsg`, due packets are sent in batches with one syscall.
+
+With `--influx` the capture is instead decoded in one go with
+`openloop.batch` and written straight to Influxdb, as ODS would have stored
+it, without going through a server.
+"""
+import sys
+import json
+import time
+import ctypes
+import socket
+import argparse
+from urllib.request import urlopen
+from openloop import telemetry
+from openloop.capture import CaptureReader, MAGIC
+from openloop.udp import iovec, mmsghdr
+
+# Packets per Influx write when importing
+INFLUX_CHUNK = 5000
+
+
+def load_packets(path):
+    """Returns a list of (seconds, payload) for each packet in the file"""
+    with open(path, "rb") as f:
+        magic = f.read(len(MAGIC))
+
+    if magic == MAGIC:
+        reader = CaptureReader(path)
+        return [(r.timestamp, bytes(r.payload)) for r in reader]
+
+    with open(path, "rb") as f:
+        data = f.read()
+    packets = []
+    for payload in telemetry.iter_packets(data):
+        timestamp = telemetry.decode_from(payload).timestamp
+        packets.append((timestamp / 1e6, bytes(payload)))
+    return packets
+
+
+def _load_sendmmsg():
+    try:
+        libc = ctypes.CDLL(None, use_errno=True)
+        func = libc.sendmmsg
+    except (OSError, AttributeError):
+        return None
+    func.argtypes = [ctypes.c_int, ctypes.POINTER(mmsghdr), ctypes.c_uint,
+                     ctypes.c_int]
+    func.restype = ctypes.c_int
+    return func
+
+
+_sendmmsg = _load_sendmmsg()
+
+
+class Sender:
+    """
+    Sends datagrams on a connected UDP socket, batch_size at a time with
+    sendmmsg when available and one send() per datagram otherwise.
+    """
+
+    def __init__(self, addr, batch_size=64, use_sendmmsg=True, source=None):
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        if source is not None:
+            self.sock.bind((source, 0))
+        self.sock.connect(addr)
+        self.batch_size = batch_size
+        self.use_sendmmsg = use_sendmmsg and _sendmmsg is not None
+
+        if self.use_sendmmsg:
+            slot = telemetry.PACKET_LENGTH
+            self.buffer = ctypes.create_string_buffer(batch_size * slot)
+            self.iovecs = (iovec * batch_size)()
+            self.msgs = (mmsghdr * batch_size)()
+            base = ctypes.addressof(self.buffer)
+            for i in range(batch_size):
+                self.iovecs[i].iov_base = base + i * slot
+                self.msgs[i].msg_hdr.msg_iov = ctypes.pointer(self.iovecs[i])
+                self.msgs[i].msg_hdr.msg_iovlen = 1
+
+    def send(self, payloads):
+        """Sends every payload, returns the number of datagrams sent"""
+        if not self.use_sendmmsg:
+            for payload in payloads:
+                self.sock.send(payload)
+            return len(payloads)
+
+        sent = 0
+        slot = telemetry.PACKET_LENGTH
+        for start in range(0, len(payloads), self.batch_size):
+            batch = payloads[start:start + self.batch_size]
+            for i, payload in enumerate(batch):
+                ctypes.memmove(ctypes.addressof(self.buffer) + i * slot,
+                               payload, len(payload))
+                self.iovecs[i].iov_len = len(payload)
+
+            done = 0
+            while done < len(batch):
+                n = _sendmmsg(self.sock.fileno(),
+                              ctypes.byref(self.msgs[done]),
+                              len(batch) - done, 0)
+                if n < 0:
+                    errno = ctypes.get_errno()
+                    raise OSError(errno, "sendmmsg failed")
+                done += n
+            sent += done
+        return sent
+
+    def close(self):
+        self.sock.close()
+
+
+def replay(packets, sender, speed=1.0):
+    """
+    Sends packets through sender and returns (sent, elapsed seconds).
+
+    speed scales the gaps between the packet timestamps; None sends as fast
+    as possible.
+    """
+    start = time.monotonic()
+    sent = 0
+
+    if speed is None:
+        payloads = [payload for _, payload in packets]
+        for i in range(0, len(payloads), sender.batch_size):
+            sent += sender.send(payloads[i:i + sender.batch_size])
+        return sent, time.monotonic() - start
+
+    origin = packets[0][0] if packets else 0
+    i = 0
+    while i < len(packets):
+        now = time.monotonic() - start
+        due = (packets[i][0] - origin) / speed
+        if due > now:
+            time.sleep(due - now)
+            now = due
+
+        # Everything that is due by now goes out in one batch
+        j = i
+        while j < len(packets) and j - i < sender.batch_size and \
+                (packets[j][0] - origin) / speed <= now:
+            j += 1
+        sent += sender.send([payload for _, payload in packets[i:j]])
+        i = j
+
+    return sent, time.monotonic() - start
+
+
+def import_capture(path, writer, pod=None, chunk=INFLUX_CHUNK):
+    """Decodes the whole capture and writes it to Influx through writer,
+    chunk packets per request. Returns the number of packets written."""
+    # NumPy is only needed here
+    from openloop import batch
+
+    lines = list(batch.to_lines(batch.load_capture(path), pod))
+    for start in range(0, len(lines), chunk):
+        writer.post(b"".join(lines[start:start + chunk]))
+    return len(lines)
+
+
+def fetch_received(stats_url):
+    """Returns the number of datagrams the ODS server has received"""
+    with urlopen(stats_url, timeout=5) as response:
+        stats = json.loads(response.read().decode("utf-8"))
+    return stats["packets"]["received"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay telemetry into ODS")
+    parser.add_argument("capture",
+                        help="ODS capture or file of concatenated packets")
+    parser.add_argument("--host", default="127.0.0.1",
+                        help="ODS server hostname")
+    parser.add_argument("-p", "--port", type=int, default=7778,
+                        help="ODS server telemetry port")
+    parser.add_argument("-s", "--speed", type=float, default=1.0,
+                        help="Time multiplier (2 replays twice as fast)")
+    parser.add_argument("--max", action="store_true",
+                        help="Send as fast as possible, ignoring timing")
+    parser.add_argument("-l", "--loop", type=int, default=1,
+                        help="Number of times to replay the capture")
+    parser.add_argument("--source", default=None,
+                        help="Local address to send from, so each replay "
+                             "shows up as a different pod")
+    parser.add_argument("-b", "--batch-size", type=int, default=64,
+                        help="Datagrams per sendmmsg call")
+    parser.add_argument("--no-sendmmsg", action="store_true",
+                        help="Send one datagram per syscall")
+    parser.add_argument("--stats-url", default=None,
+                        help="ODS /stats URL, used to report packet loss "
+                             "(http://127.0.0.1:7777/stats)")
+    parser.add_argument("--settle", type=float, default=1.0,
+                        help="Seconds to wait before reading the server's "
+                             "counters")
+    parser.add_argument("--influx", action="store_true",
+                        help="Write the capture to Influxdb instead of "
+                             "sending it to ODS (needs NumPy)")
+    parser.add_argument("--pod", default=None,
+                        help="pod tag for the points written with --influx")
+    parser.add_argument("--influx-host", default='127.0.0.1',
+                        help="Influxdb hostname")
+    parser.add_argument("--influx-port", default=8086, type=int,
+                        help="Influxdb port")
+    parser.add_argument("--influx-user", default='root',
+                        help="Influxdb username")
+    parser.add_argument("--influx-pass", default='root',
+                        help="Influxdb password")
+    parser.add_argument("--influx-name", default='example',
+                        help="Influxdb database name")
+    args = parser.parse_args()
+
+    if args.influx:
+        from influxdb import InfluxDBClient
+        from openloop.writer import InfluxWriter
+
+        influx = InfluxDBClient(args.influx_host, args.influx_port,
+                                args.influx_user, args.influx_pass,
+                                args.influx_name)
+        writer = InfluxWriter(influx, args.influx_name)
+        writer.create_database()
+        start = time.monotonic()
+        written = import_capture(args.capture, writer, args.pod)
+        print("Wrote %d packets to %s in %.3f s" % (
+            written, args.influx_name, time.monotonic() - start))
+        return
+
+    packets = load_packets(args.capture)
+    if not packets:
+        print("No packets in %s" % args.capture)
+        sys.exit(1)
+
+    sender = Sender((args.host, args.port), batch_size=args.batch_size,
+                    use_sendmmsg=not args.no_sendmmsg, source=args.source)
+
+    before = None
+    if args.stats_url:
+        before = fetch_received(args.stats_url)
+
+    speed = None if args.max else args.speed
+    sent = 0
+    elapsed = 0.0
+    for _ in range(args.loop):
+        n, t = replay(packets, sender, speed)
+        sent += n
+        elapsed += t
+    sender.close()
+
+    print("Sent %d packets in %.3f s: %.0f packets/sec (%s)" % (
+        sent, elapsed, sent / elapsed if elapsed else 0,
+        "sendmmsg" if sender.use_sendmmsg else "send"))
+
+    if before is not None:
+        time.sleep(args.settle)
+        received = fetch_received(args.stats_url) - before
+        lost = sent - received
+        print("Server received %d packets, lost %d (%.2f%%)" % (
+            received, lost, 100.0 * lost / sent))
+
+
+if __name__ == "__main__":
+    main()
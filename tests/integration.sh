@@ -5,6 +5,7 @@ SERVER="./ods.py"
 SERVER_OUT="server.out"
 SERVER_ERR="server.err"
 PORT=7778
+STATS_URL="http://127.0.0.1:7777/stats"
 
 MOCK_POD="./tests/mock_pod.py"
 FIFO="./data-fifo"
@@ -32,7 +33,7 @@ if [ $? -eq 0 ]; then
   trap cleanup EXIT
 
   # Run with the test data
-  cat $TEST_DATA_FILE | nc -u -4 -w 1 localhost $PORT
+  ./replay.py $TEST_DATA_FILE -p $PORT --max --stats-url "$STATS_URL"
 
   echo "=== Test Complete ==="
 else
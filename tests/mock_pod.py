@@ -2,7 +2,10 @@ import socketserver
 
 
 RESPONSES = {
-  b'ping': b'PONG:1\n'
+  b'ping': b'PONG:1\n',
+  # Replies may span several lines or lack a final newline
+  b'help': b'Commands:\n  ping\n  help\n  state\n',
+  b'state': b'STANDBY'
 }
 
 
@@ -0,0 +1,104 @@
+import sys
+import unittest
+
+if sys.version_info < (3, 5):
+    raise unittest.SkipTest("openloop.aio needs Python 3.5")
+
+import asyncio
+import threading
+from datetime import timedelta
+from openloop.aio import AsyncPod, AsyncInfluxWriter
+from openloop.pod import PodState
+from tests.mock_pod import MockPodHandler
+from tests.test_pod import LineMockPodHandler, MockPodServer, \
+    expected_replies
+
+
+class AsyncPodTests:
+    """Runs the AsyncPod client against handler"""
+    handler = MockPodHandler
+    fence = False
+
+    def setUp(self):
+        self.server = MockPodServer(("127.0.0.1", 0), self.handler)
+        threading.Thread(target=self.server.serve_forever,
+                         daemon=True).start()
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        self.pod = AsyncPod(self.server.server_address, fence=self.fence)
+        self.loop.run_until_complete(self.pod.connect())
+
+    def tearDown(self):
+        self.pod.close()
+        self.loop.run_until_complete(asyncio.sleep(0))
+        self.loop.close()
+        asyncio.set_event_loop(None)
+        self.server.shutdown()
+        self.server.server_close()
+
+    def gather(self, *commands):
+        return self.loop.run_until_complete(asyncio.gather(*commands))
+
+    def test_concurrent_commands(self):
+        cmds = ["help", "ping", "state"] * 5
+        replies = self.gather(*[self.pod.command(cmd) for cmd in cmds])
+        expected = expected_replies()
+        self.assertEqual(replies, [expected[cmd] for cmd in cmds])
+        self.assertIs(self.pod.state, PodState.BOOT)
+
+
+class AsyncPodTest(AsyncPodTests, unittest.TestCase):
+    """Runs the AsyncPod client against tests/mock_pod.py"""
+
+    def test_timeout_closes_link(self):
+        reply, = self.gather(self.pod.command("help", timedelta(0)))
+        self.assertIsNone(reply)
+        self.assertFalse(self.pod.is_connected())
+        self.assertEqual(self.pod.stats()["command_timeouts"], 1)
+
+
+class FencedAsyncPodTest(AsyncPodTests, unittest.TestCase):
+    """Runs the AsyncPod client with the ping fence"""
+    handler = LineMockPodHandler
+    fence = True
+
+    def test_unanswered_command(self):
+        self.assertEqual(self.gather(self.pod.command("bogus")), [""])
+
+    def test_timeout_keeps_link_and_order(self):
+        reply, = self.gather(self.pod.command("help", timedelta(0)))
+        self.assertIsNone(reply)
+        self.assertTrue(self.pod.is_connected())
+        self.assertEqual(self.gather(self.pod.command("state")),
+                         ["STANDBY"])
+        self.assertEqual(self.pod.stats()["command_timeouts"], 1)
+
+
+class AsyncInfluxWriterTest(unittest.TestCase):
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        self.writer = AsyncInfluxWriter(None, "test", flush_interval=0.01)
+        self.flushed = []
+        self.writer.flush = lambda batch, points: self.flushed.extend(batch)
+
+    def tearDown(self):
+        self.loop.close()
+        asyncio.set_event_loop(None)
+
+    def test_submit_from_thread_before_loop_runs(self):
+        submitter = threading.Thread(target=self.writer.submit_lines,
+                                     args=(b"m value=1 1\n",))
+        submitter.start()
+        submitter.join()
+        # Handed to the loop, not put on its queue from the other thread
+        self.assertEqual(self.writer.queue.qsize(), 0)
+
+        self.loop.call_later(0.1, self.writer.stop)
+        self.loop.run_until_complete(self.writer.run_async())
+        self.assertEqual(self.flushed, [b"m value=1 1\n"])
+        self.assertEqual(self.writer.stats()["submitted"], 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
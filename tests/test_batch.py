@@ -0,0 +1,99 @@
+import os
+import shutil
+import tempfile
+import unittest
+from openloop import telemetry
+from openloop.capture import CaptureRecorder
+from openloop.line_protocol import TelemetryEncoder
+
+try:
+    from openloop import batch
+except ImportError:
+    raise unittest.SkipTest("needs NumPy")
+
+import replay
+
+CAPTURE = os.path.join(os.path.dirname(__file__), "assets",
+                       "hyperloop-telemetry.log.bin")
+
+
+def same(a, b):
+    return a == b or (a != a and b != b)
+
+
+class Writer:
+    """Collects the bodies posted to it"""
+
+    def __init__(self):
+        self.bodies = []
+
+    def post(self, body):
+        self.bodies.append(body)
+
+
+class BatchTest(unittest.TestCase):
+    def setUp(self):
+        with open(CAPTURE, "rb") as f:
+            self.data = f.read()
+        self.packets = [telemetry.decode(bytes(payload))
+                        for payload in telemetry.iter_packets(self.data)]
+
+    def assertDecoded(self, rows):
+        self.assertEqual(len(rows), len(self.packets))
+        for row, packet in zip(rows, self.packets):
+            expected = packet.as_dict()
+            self.assertEqual(sorted(row), sorted(expected))
+            for name, value in expected.items():
+                self.assertTrue(same(row[name], value),
+                                "%s: %r != %r" % (name, row[name], value))
+
+    def test_decode_batch(self):
+        self.assertDecoded(list(batch.to_dicts(batch.decode_batch(self.data))))
+
+    def test_solenoid_columns(self):
+        decoded = batch.decode_batch(self.data)
+        for name, mask in telemetry.SOLENOIDS:
+            self.assertEqual(decoded[name].tolist(),
+                             [bool(p.solenoid_mask & mask)
+                              for p in self.packets])
+
+    def test_unpadded_records(self):
+        # The fixture pads each record to 240 bytes, pack them back to back
+        packed = b"".join(telemetry.iter_packets(self.data))
+        self.assertEqual(len(packed),
+                         len(self.packets) * telemetry.PACKET_LENGTH)
+        self.assertDecoded(list(batch.to_dicts(batch.decode_batch(packed))))
+
+    def test_empty(self):
+        self.assertEqual(len(batch.decode_batch(b"")), 0)
+
+    def test_load_ods_capture(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        path = os.path.join(directory, "run.cap")
+        recorder = CaptureRecorder(path, preallocate=1024 * 1024)
+        for i, packet in enumerate(telemetry.iter_packets(self.data)):
+            recorder.record(bytes(packet), ("10.0.0.2", 7778), float(i))
+            if i == 3:
+                recorder.record(b"short", ("10.0.0.2", 7778), float(i))
+        # Still preallocated past the last record
+        recorder.flush()
+
+        self.assertDecoded(list(batch.to_dicts(batch.load_capture(path))))
+
+    def test_to_lines(self):
+        encoder = TelemetryEncoder()
+        lines = list(batch.to_lines(batch.decode_batch(self.data), "pod"))
+        self.assertEqual(lines, [encoder.encode(packet, "pod")
+                                 for packet in self.packets])
+
+    def test_import_capture(self):
+        writer = Writer()
+        written = replay.import_capture(CAPTURE, writer, chunk=500)
+        self.assertEqual(written, len(self.packets))
+        self.assertEqual([body.count(b"\n") for body in writer.bodies],
+                         [500, 500, len(self.packets) - 1000])
+
+
+if __name__ == '__main__':
+    unittest.main()
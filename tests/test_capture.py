@@ -0,0 +1,86 @@
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+from openloop.capture import CaptureRecorder, CaptureReader
+
+ADDR = ("10.0.0.2", 7778)
+
+
+class CaptureTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.path = os.path.join(self.directory, "test.cap")
+        self.recorder = CaptureRecorder(self.path, index_interval=4,
+                                        buffer_records=8, flush_interval=0.01,
+                                        preallocate=0)
+
+    def read(self):
+        reader = CaptureReader(self.path)
+        self.addCleanup(reader.close)
+        return reader
+
+    def test_round_trip(self):
+        for i in range(20):
+            self.recorder.record(("packet %d" % i).encode(), ADDR,
+                                 timestamp=100.0 + i)
+        self.recorder.close()
+
+        reader = self.read()
+        self.assertEqual(len(reader), 20)
+        self.assertEqual(bytes(reader[3].payload), b"packet 3")
+        self.assertEqual(reader[3].addr, ADDR)
+        self.assertEqual(reader.find(110.0), 10)
+        self.assertEqual(reader.find(110.5), 11)
+        self.assertEqual([r.timestamp for r in reader.between(105, 107)],
+                         [105.0, 106.0])
+
+    def test_record_does_not_wait_for_disk(self):
+        # Hold the files as a slow write would, across several full buffers
+        with self.recorder.io_lock:
+            done = threading.Event()
+
+            def record():
+                for i in range(40):
+                    self.recorder.record(b"x", ADDR, timestamp=float(i))
+                done.set()
+
+            threading.Thread(target=record, daemon=True).start()
+            self.assertTrue(done.wait(2))
+        self.assertEqual(len(self.recorder.full), 5)
+
+        self.recorder.close()
+        self.assertEqual(len(self.read()), 40)
+
+    def test_background_flush(self):
+        thread = threading.Thread(target=self.recorder.run, daemon=True)
+        thread.start()
+        for i in range(3):
+            self.recorder.record(b"x", ADDR, timestamp=float(i))
+        for _ in range(200):
+            if self.recorder.written == 3:
+                break
+            threading.Event().wait(0.01)
+        self.assertEqual(len(self.read()), 3)
+        self.recorder.stop()
+        thread.join(1)
+        self.recorder.close()
+
+    def test_clock_stepping_back(self):
+        times = [10.0, 11.0, 12.0, 5.0, 6.0, 13.0, 14.0, 15.0, 16.0]
+        for t in times:
+            self.recorder.record(b"x", ADDR, timestamp=t)
+        self.recorder.close()
+
+        reader = self.read()
+        stored = [r.timestamp for r in reader]
+        self.assertEqual(stored, sorted(stored))
+        self.assertEqual(stored[3:5], [12.0, 12.0])
+        self.assertEqual(reader.find(13.0), 5)
+        self.assertEqual(reader.find(16.0), 8)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,81 @@
+import threading
+import unittest
+from openloop.heart import Heart, Schedule, Scheduler
+
+
+class ScheduleTest(unittest.TestCase):
+    def test_delay(self):
+        schedule = Schedule(1.0)
+        schedule.deadline = 10.0
+        self.assertEqual(schedule.delay(9.5), 0.5)
+        self.assertEqual(schedule.delay(10.5), 0)
+
+    def test_jitter(self):
+        schedule = Schedule(1.0)
+        self.assertEqual(schedule.jitter(),
+                         {"mean": 0.0, "p99": 0.0, "max": 0.0})
+        schedule.deadline = 0.0
+        for lateness in range(100):
+            schedule.begin(lateness / 1000)
+            schedule.deadline = 0.0
+        jitter = schedule.jitter()
+        self.assertAlmostEqual(jitter["mean"], 0.0495)
+        self.assertEqual(jitter["p99"], 0.099)
+        self.assertEqual(jitter["max"], 0.099)
+
+
+class HeartTest(unittest.TestCase):
+    def test_deadlines_advance_from_deadline(self):
+        heart = Heart(1.0, None)
+        heart.deadline = 10.0
+        self.assertTrue(heart.due(10.0))
+        heart.begin(10.2)
+        heart.end(10.5)
+        self.assertEqual(heart.deadline, 11.0)
+        self.assertFalse(heart.due(10.9))
+
+    def test_late_beats_are_skipped(self):
+        heart = Heart(1.0, None)
+        heart.deadline = 10.0
+        heart.begin(10.0)
+        heart.end(13.5)
+        self.assertEqual(heart.missed, 2)
+        self.assertEqual(heart.deadline, 13.0)
+
+    def test_fast_mode(self):
+        moving = [False]
+        heart = Heart(10.0, None, 0.5, lambda: moving[0])
+        heart.deadline = 20.0
+        self.assertFalse(heart.due(11.0))
+        self.assertEqual(heart.wake(11.0), 11.5)
+
+        # Starting to move beats at once, then every fast_interval
+        moving[0] = True
+        self.assertTrue(heart.due(11.5))
+        heart.begin(11.5)
+        heart.end(11.5)
+        self.assertEqual(heart.deadline, 12.0)
+        self.assertEqual(heart.stats()["mode"], "fast")
+
+    def test_failing_predicate_is_idle(self):
+        def fail():
+            raise RuntimeError("no telemetry")
+
+        heart = Heart(10.0, None, 0.5, fail)
+        heart.deadline = 20.0
+        self.assertFalse(heart.due(11.0))
+        self.assertFalse(heart.fast_mode)
+
+    def test_scheduler(self):
+        beats = threading.Semaphore(0)
+        heart = Heart(0.01, lambda heart: beats.release(),
+                      scheduler=Scheduler())
+        heart.start()
+        self.addCleanup(heart.stop)
+        for _ in range(3):
+            self.assertTrue(beats.acquire(timeout=2))
+        self.assertGreaterEqual(heart.stats()["beats"], 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,96 @@
+import os
+import json
+import unittest
+from openloop import history, telemetry
+from openloop.http.app import app, set_ods
+
+if not history.AVAILABLE:
+    raise unittest.SkipTest("needs NumPy")
+
+CAPTURE = os.path.join(os.path.dirname(__file__), "assets",
+                       "hyperloop-telemetry.log.bin")
+
+
+def packets(count):
+    with open(CAPTURE, 'rb') as f:
+        packet = telemetry.decode(f.read(telemetry.PACKET_LENGTH))
+    return [packet._replace(timestamp=(1000 + i) * 1000000,
+                            velocity_x=float(i)) for i in range(count)]
+
+
+class TelemetryHistoryTest(unittest.TestCase):
+    def setUp(self):
+        # Two pods interleaved, the second's readings 100 higher
+        self.history = history.TelemetryHistory(100)
+        for packet in packets(20):
+            self.history.append(packet, "10.0.0.2")
+            self.history.append(packet._replace(
+                velocity_x=packet.velocity_x + 100), "10.0.0.3")
+
+    def test_defaults_to_newest_sender(self):
+        result = self.history.query(["velocity_x"])
+        self.assertEqual(result["pod"], "10.0.0.3")
+        self.assertEqual(result["velocity_x"],
+                         [100.0 + i for i in range(20)])
+
+    def test_pod(self):
+        result = self.history.query(["velocity_x"], since=-4, pod="10.0.0.2")
+        self.assertEqual(result["time"], [1015.0, 1016.0, 1017.0, 1018.0,
+                                          1019.0])
+        self.assertEqual(result["velocity_x"], [15.0, 16.0, 17.0, 18.0,
+                                                19.0])
+        self.assertEqual(self.history.query(["velocity_x"], pod="10.0.0.9"),
+                         {"pod": "10.0.0.9", "time": [], "velocity_x": []})
+
+    def test_downsample_keeps_pods_apart(self):
+        result = self.history.query(["velocity_x"], buckets=2,
+                                    pod="10.0.0.2")
+        self.assertEqual(result["velocity_x"]["min"], [0.0, 10.0])
+        self.assertEqual(result["velocity_x"]["max"], [9.0, 19.0])
+        self.assertEqual(result["velocity_x"]["mean"], [4.5, 14.5])
+
+    def test_wraps(self):
+        for packet in packets(80):
+            self.history.append(packet._replace(
+                timestamp=packet.timestamp + 20000000), "10.0.0.2")
+        result = self.history.query(["velocity_x"], pod="10.0.0.2")
+        self.assertEqual(result["velocity_x"],
+                         [float(i) for i in range(10, 20)] +
+                         [float(i) for i in range(80)])
+
+    def test_non_finite_is_none(self):
+        packet = packets(1)[0]._replace(timestamp=2000 * 1000000)
+        self.history.append(packet._replace(velocity_x=float('nan')),
+                            "10.0.0.2")
+        self.history.append(packet._replace(
+            timestamp=packet.timestamp + 1000000,
+            velocity_x=float('inf')), "10.0.0.2")
+        result = self.history.query(["velocity_x"], since=2000)
+        self.assertEqual(result["velocity_x"], [None, None])
+        result = self.history.query(["velocity_x"], since=2000, buckets=1)
+        self.assertEqual(result["velocity_x"],
+                         {"min": [None], "max": [None], "mean": [None]})
+
+
+class HistoryRouteTest(unittest.TestCase):
+    def setUp(self):
+        server = type("Server", (), {})()
+        server.history = history.TelemetryHistory(10)
+        for packet in packets(2):
+            server.history.append(packet._replace(velocity_x=float('nan')),
+                                  "10.0.0.2")
+        set_ods(server)
+        self.addCleanup(set_ods, None)
+        self.client = app.test_client()
+
+    def test_nan_is_null(self):
+        response = self.client.get("/history?fields=velocity_x"
+                                   "&pod=10.0.0.2")
+        self.assertEqual(response.status_code, 200)
+        body = response.get_data().decode('utf-8')
+        self.assertNotIn("NaN", body)
+        self.assertEqual(json.loads(body)["velocity_x"], [None, None])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,100 @@
+import time
+import socket
+import threading
+import unittest
+from http.client import HTTPConnection
+from openloop.http.server import make_server
+
+
+def app(environ, start_response):
+    """Answers /stream with an unbounded body that runs until released,
+    anything else with a short fixed one"""
+    if environ['PATH_INFO'] == '/stream':
+        start_response('200 OK', [('Content-Type', 'text/event-stream')])
+        return stream()
+    body = environ['PATH_INFO'].encode()
+    start_response('200 OK', [('Content-Type', 'text/plain'),
+                              ('Content-Length', str(len(body)))])
+    return [body]
+
+
+RELEASE = threading.Event()
+
+
+def stream():
+    yield b"data: 1\n\n"
+    RELEASE.wait(5)
+
+
+class WSGIServerTest(unittest.TestCase):
+    def setUp(self):
+        RELEASE.clear()
+        self.httpd = make_server("127.0.0.1", 0, app, workers=1,
+                                 keepalive=5, streams=1)
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+        self.addCleanup(self.httpd.server_close)
+        self.addCleanup(self.httpd.shutdown)
+        self.addCleanup(RELEASE.set)
+
+    def connect(self):
+        conn = HTTPConnection(*self.httpd.server_address, timeout=2)
+        self.addCleanup(conn.close)
+        return conn
+
+    def get(self, conn, path):
+        conn.request("GET", path)
+        response = conn.getresponse()
+        return response.status, response.read()
+
+    def test_idle_connections_do_not_hold_workers(self):
+        # More kept-alive connections than workers, used in turn
+        conns = [self.connect() for _ in range(4)]
+        for _ in range(2):
+            for i, conn in enumerate(conns):
+                self.assertEqual(self.get(conn, "/%d" % i),
+                                 (200, ("/%d" % i).encode()))
+        self.assertEqual(self.httpd.stats()["connections"], 4)
+
+    def test_unsent_request_does_not_hold_worker(self):
+        idle = socket.create_connection(self.httpd.server_address)
+        self.addCleanup(idle.close)
+        self.assertEqual(self.get(self.connect(), "/a"), (200, b"/a"))
+
+    def test_pipelined_requests(self):
+        sock = socket.create_connection(self.httpd.server_address)
+        self.addCleanup(sock.close)
+        sock.sendall(b"GET /a HTTP/1.1\r\nHost: x\r\n\r\n"
+                     b"GET /b HTTP/1.1\r\nHost: x\r\n\r\n")
+        data = b""
+        while data.count(b"HTTP/1.1 200") < 2 or not data.endswith(b"/b"):
+            chunk = sock.recv(4096)
+            self.assertTrue(chunk)
+            data += chunk
+        self.assertLess(data.index(b"\r\n\r\n/a"), data.index(b"\r\n\r\n/b"))
+
+    def test_stream_does_not_hold_worker(self):
+        streaming = self.connect()
+        streaming.request("GET", "/stream")
+        response = streaming.getresponse()
+        self.assertEqual(response.status, 200)
+        self.assertEqual(response.readline(), b"data: 1\n")
+
+        # The only worker is free for other requests
+        self.assertEqual(self.get(self.connect(), "/a"), (200, b"/a"))
+        self.assertEqual(self.httpd.stats()["streams"], 1)
+
+        # Past the cap
+        status, _ = self.get(self.connect(), "/stream")
+        self.assertEqual(status, 503)
+        self.assertEqual(self.httpd.stats()["refused_streams"], 1)
+
+        RELEASE.set()
+        response.read()
+        deadline = time.monotonic() + 2
+        while self.httpd.stats()["streams"] and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(self.httpd.stats()["streams"], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
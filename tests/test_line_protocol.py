@@ -0,0 +1,86 @@
+import os
+import math
+import unittest
+from influxdb.line_protocol import make_lines
+from openloop import telemetry
+from openloop.line_protocol import TelemetryEncoder, escape_tag
+from openloop.pod import PodState
+
+CAPTURE = os.path.join(os.path.dirname(__file__), "assets",
+                       "hyperloop-telemetry.log.bin")
+POD = "192.168.0.10"
+
+
+def client_line(packet, pod=None):
+    """Returns the line the influxdb client writes for packet"""
+    tags = {"state": str(PodState.parse(packet.state))}
+    if pod is not None:
+        tags["pod"] = pod
+    point = packet.to_point(tags)
+    point["fields"] = dict(
+        (name, value) for name, value in point["fields"].items()
+        if not isinstance(value, float) or math.isfinite(value))
+    return make_lines({"points": [point]}, 'n').encode('utf-8')
+
+
+class TelemetryEncoderTest(unittest.TestCase):
+    def setUp(self):
+        with open(CAPTURE, 'rb') as f:
+            self.packets = [telemetry.decode(packet) for packet
+                            in telemetry.iter_packets(f.read())]
+        self.encoder = TelemetryEncoder()
+
+    def test_matches_client(self):
+        for packet in self.packets:
+            self.assertEqual(self.encoder.encode(packet, POD),
+                             client_line(packet, POD))
+        packet = self.packets[0]
+        self.assertEqual(self.encoder.encode(packet), client_line(packet))
+
+    def test_tag_escaping(self):
+        self.assertEqual(escape_tag("a b,c=d\\e"), "a\\ b\\,c\\=d\\\\e")
+        pod = "pod 1,a=b"
+        packet = self.packets[0]
+        line = self.encoder.encode(packet, pod)
+        self.assertTrue(line.startswith(
+            b"telemetry,pod=pod\\ 1\\,a\\=b,state=BOOT "))
+        self.assertEqual(line, client_line(packet, pod))
+
+        encoder = TelemetryEncoder("pod telemetry")
+        self.assertTrue(encoder.encode(packet).startswith(
+            b"pod\\ telemetry,state=BOOT "))
+
+    def test_non_finite_readings_are_left_out(self):
+        packet = self.packets[0]._replace(velocity_x=float('nan'),
+                                          position_x=float('inf'))
+        line = self.encoder.encode(packet, POD)
+        self.assertNotIn(b"velocity_x=", line)
+        self.assertNotIn(b"position_x=", line)
+        self.assertIn(b"velocity_y=", line)
+        self.assertEqual(line, client_line(packet, POD))
+
+        row = packet + tuple(flag for _, flag in packet.solenoids())
+        self.assertEqual(self.encoder.encode_row(row, POD), line)
+
+    def test_encode_row(self):
+        packet = self.packets[0]
+        row = packet + tuple(flag for _, flag in packet.solenoids())
+        self.assertEqual(self.encoder.encode_row(row, POD),
+                         self.encoder.encode(packet, POD))
+
+    def test_prefix_cache(self):
+        for packet in self.packets:
+            self.encoder.encode(packet, POD)
+        states = set(packet.state for packet in self.packets)
+        self.assertEqual(set(self.encoder.prefixes),
+                         set((POD, state) for state in states))
+
+        prefix = self.encoder.prefix(POD, self.packets[0].state)
+        self.assertIs(self.encoder.prefix(POD, self.packets[0].state),
+                      prefix)
+        self.assertEqual(self.encoder.prefix(None, 99),
+                         "telemetry,state=UNKNOWN ")
+
+
+if __name__ == '__main__':
+    unittest.main()
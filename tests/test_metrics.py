@@ -0,0 +1,89 @@
+import threading
+import unittest
+from openloop.metrics import Histogram, LinkMetrics, MEASUREMENT
+
+
+class HistogramTest(unittest.TestCase):
+    def test_empty(self):
+        stats = Histogram().stats()
+        self.assertEqual(stats["count"], 0)
+        self.assertEqual(stats["p99"], 0.0)
+        self.assertEqual(stats["buckets"], {})
+
+    def test_bucket_edges(self):
+        histogram = Histogram((1.0, 2.0))
+        # Bounds are inclusive upper bounds
+        for value in (0.5, 1.0, 1.5, 2.0, 3.0):
+            histogram.observe(value)
+        self.assertEqual(histogram.counts, [2, 2, 1])
+        self.assertEqual(histogram.stats()["buckets"],
+                         {"le_1": 2, "le_2": 2})
+
+    def test_percentiles(self):
+        histogram = Histogram((1.0, 2.0, 5.0))
+        for value in [0.5] * 50 + [1.5] * 40 + [4.0] * 10:
+            histogram.observe(value)
+        self.assertEqual(histogram.percentile(0.5), 1.0)
+        self.assertEqual(histogram.percentile(0.9), 2.0)
+        # The bound is capped at the largest value seen
+        self.assertEqual(histogram.percentile(0.99), 4.0)
+
+        stats = histogram.stats()
+        self.assertAlmostEqual(stats["mean"], 1.25)
+        self.assertEqual(stats["min"], 0.5)
+        self.assertEqual(stats["max"], 4.0)
+
+    def test_above_every_bound(self):
+        histogram = Histogram((1.0,))
+        histogram.observe(0.5)
+        histogram.observe(7.0)
+        self.assertEqual(histogram.percentile(0.5), 1.0)
+        self.assertEqual(histogram.percentile(1.0), 7.0)
+
+
+class LinkMetricsTest(unittest.TestCase):
+    def test_counters_from_threads(self):
+        metrics = LinkMetrics()
+
+        def update():
+            for _ in range(10000):
+                metrics.received(2)
+                metrics.sent(1)
+                metrics.timed_out(True)
+                metrics.timed_out(False)
+
+        threads = [threading.Thread(target=update) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        stats = metrics.stats()
+        self.assertEqual(stats["bytes_in"], 80000)
+        self.assertEqual(stats["bytes_out"], 40000)
+        self.assertEqual(stats["ping_timeouts"], 40000)
+        self.assertEqual(stats["command_timeouts"], 40000)
+
+    def test_to_point(self):
+        metrics = LinkMetrics()
+        metrics.connected(0.01)
+        metrics.closed()
+        metrics.connected(0.02)
+        metrics.sent(5)
+        metrics.ping.observe(0.003)
+
+        point = metrics.to_point({"pod": "10.0.0.2:7779"})
+        self.assertEqual(point["measurement"], MEASUREMENT)
+        self.assertEqual(point["tags"], {"pod": "10.0.0.2:7779"})
+        fields = point["fields"]
+        self.assertEqual(fields["connects"], 2)
+        self.assertEqual(fields["disconnects"], 1)
+        self.assertEqual(fields["bytes_out"], 5)
+        self.assertEqual(fields["ping_count"], 1)
+        self.assertEqual(fields["ping_p50"], 0.003)
+        self.assertTrue(fields["connected"])
+        self.assertEqual(metrics.stats()["reconnects"], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,34 @@
+import threading
+import unittest
+from ods import ODSServer
+from openloop.ring import PacketRing
+
+
+class ConsumeTest(unittest.TestCase):
+    def test_error_does_not_stop_consumer(self):
+        server = ODSServer(("127.0.0.1", 0), 0, ("127.0.0.1", 0), None)
+        handled = []
+
+        def handle_datagram(message, addr, offset=0, length=None):
+            if not handled:
+                handled.append(None)
+                raise ValueError("bad packet")
+            handled.append(addr)
+
+        server.handle_datagram = handle_datagram
+        ring = PacketRing(4)
+        for port in (1, 2):
+            seq, _ = ring.reserve(1)
+            ring.addrs[seq] = ("10.0.0.2", port)
+            ring.publish(1)
+
+        threading.Thread(target=server.consume, args=(ring,),
+                         daemon=True).start()
+        with ring.cond:
+            ring.cond.wait_for(lambda: ring.tail == 2, 2)
+        self.assertEqual(server.errors, 1)
+        self.assertEqual(handled, [None, ("10.0.0.2", 2)])
+
+
+if __name__ == '__main__':
+    unittest.main()
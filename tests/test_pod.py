@@ -0,0 +1,219 @@
+import socketserver
+import threading
+import unittest
+from datetime import timedelta
+from openloop.pod import MOVING_STATES, Pod, PodState, ReplyFramer
+from tests.mock_pod import RESPONSES, MockPodHandler
+
+
+class MockPodServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+class PodStateTest(unittest.TestCase):
+    def test_parse_number(self):
+        for state in PodState:
+            self.assertIs(PodState.parse(int(state)), state)
+            self.assertIs(PodState.parse(str(int(state))), state)
+        self.assertIs(PodState.parse(" 5\n"), PodState.ARMED)
+        self.assertIs(PodState.parse(PodState.ARMED), PodState.ARMED)
+
+    def test_parse_name(self):
+        for state in PodState:
+            self.assertIs(PodState.parse(state.name), state)
+        self.assertIs(PodState.parse("BRAKING\n"), PodState.BRAKING)
+        self.assertIs(PodState.parse("braking"), PodState.UNKNOWN)
+
+    def test_parse_short_name(self):
+        # Only where the short name is the name itself
+        self.assertIs(PodState.parse("VENT"), PodState.VENT)
+        self.assertIs(PodState.parse("STBY"), PodState.UNKNOWN)
+        self.assertIs(PodState.parse("ARMD"), PodState.UNKNOWN)
+
+    def test_parse_unknown(self):
+        for value in (13, -2, "13", "", "PONG", None, b"5"):
+            self.assertIs(PodState.parse(value), PodState.UNKNOWN, value)
+
+    def test_names(self):
+        self.assertEqual(str(PodState.ARMED), "ARMED")
+        self.assertEqual("%s" % PodState.parse(5), "ARMED")
+        self.assertEqual("{:>8}".format(PodState.ARMED), "   ARMED")
+        self.assertEqual(PodState.STANDBY.short(), "STBY")
+        self.assertEqual(len(set(state.short() for state in PodState)),
+                         len(PodState))
+
+    def test_moving_states(self):
+        self.assertEqual(MOVING_STATES, frozenset((
+            PodState.PUSHING, PodState.COASTING, PodState.BRAKING)))
+        self.assertEqual([state for state in PodState if state.is_moving()],
+                         [PodState.PUSHING, PodState.COASTING,
+                          PodState.BRAKING])
+        self.assertTrue(PodState.EMERGENCY.is_fault())
+        self.assertFalse(PodState.UNKNOWN.is_fault())
+
+
+class LineMockPodHandler(MockPodHandler):
+    """The mock pod for firmware that splits what it reads on newlines, as
+    the ping fence needs"""
+
+    def handle(self):
+        for line in self.request.makefile('rb'):
+            cmd = line.strip()
+            if cmd in RESPONSES:
+                self.request.sendall(RESPONSES[cmd])
+
+
+def expected_replies():
+    return {"help": RESPONSES[b"help"].decode('utf-8'),
+            "ping": "PONG:1\n", "state": "STANDBY", "bogus": ""}
+
+
+class PodTests:
+    """Runs the Pod client against handler"""
+    handler = MockPodHandler
+    fence = False
+
+    def setUp(self):
+        self.server = MockPodServer(("127.0.0.1", 0), self.handler)
+        threading.Thread(target=self.server.serve_forever,
+                         daemon=True).start()
+        self.pod = Pod(self.server.server_address, self.fence)
+        self.pod.connect()
+
+    def tearDown(self):
+        self.pod.close()
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_multi_line_reply(self):
+        self.assertEqual(self.pod.run("help"),
+                         RESPONSES[b"help"].decode('utf-8'))
+
+    def test_unterminated_reply(self):
+        self.assertEqual(self.pod.run("state"), "STANDBY")
+
+    def test_replies_stay_in_order(self):
+        cmds = ["help", "ping", "state", "ping", "help"] * 5
+        futures = [self.pod.submit(cmd) for cmd in cmds]
+        expected = expected_replies()
+        for cmd, future in zip(cmds, futures):
+            self.assertEqual(future.result(1), expected[cmd])
+        self.assertEqual(self.pod.stats()["unsolicited"], 0)
+        self.assertEqual(self.pod.stats()["in_flight"], 0)
+
+    def test_ping_sets_state(self):
+        self.pod.ping(None)
+        self.assertIs(self.pod.state, PodState.BOOT)
+
+
+class PodTest(PodTests, unittest.TestCase):
+    """Runs the Pod client against tests/mock_pod.py"""
+
+    def test_unanswered_command_closes_link(self):
+        self.assertIsNone(self.pod.run("bogus", timedelta(seconds=0.1)))
+        self.assertFalse(self.pod.is_connected())
+
+    def test_timeout_closes_link(self):
+        self.assertIsNone(self.pod.run("help", timedelta(0)))
+        self.assertFalse(self.pod.is_connected())
+        self.assertEqual(self.pod.stats()["command_timeouts"], 1)
+
+
+class FencedPodTest(PodTests, unittest.TestCase):
+    """Runs the Pod client with the ping fence"""
+    handler = LineMockPodHandler
+    fence = True
+
+    def test_unanswered_command(self):
+        self.assertEqual(self.pod.run("bogus"), "")
+
+    def test_pipelined_replies_stay_in_order(self):
+        cmds = ["help", "ping", "state", "bogus", "ping", "help"] * 5
+        futures = [self.pod.submit(cmd) for cmd in cmds]
+        expected = expected_replies()
+        for cmd, future in zip(cmds, futures):
+            self.assertEqual(future.result(1), expected[cmd])
+        self.assertEqual(self.pod.stats()["unsolicited"], 0)
+
+    def test_timeout_keeps_link_and_order(self):
+        self.assertIsNone(self.pod.run("help", timedelta(0)))
+        self.assertTrue(self.pod.is_connected())
+        self.assertEqual(self.pod.run("state"), "STANDBY")
+        self.assertEqual(self.pod.stats()["command_timeouts"], 1)
+
+
+class FramerTests:
+    def feed(self, *chunks):
+        replies = []
+        for chunk in chunks:
+            replies.extend((kind, waiter, reply) for kind, waiter, _, reply
+                           in self.framer.feed(chunk))
+        return replies
+
+
+class ReplyFramerTest(FramerTests, unittest.TestCase):
+    def setUp(self):
+        self.framer = ReplyFramer()
+
+    def test_one_command_at_a_time(self):
+        self.assertEqual(self.framer.expect("help", "help"), b"help\n")
+        self.assertEqual(self.framer.expect("state", "state"), b"")
+        self.assertEqual(self.framer.next_message(), b"")
+        self.assertEqual(self.framer.outstanding(), ["help", "state"])
+
+        replies = self.feed(b"line one\nline two\n")
+        self.assertEqual(replies, [
+            (ReplyFramer.COMMAND, "help", "line one\nline two\n")])
+        self.assertEqual(self.framer.next_message(), b"state\n")
+        self.assertEqual(self.feed(b"STANDBY"), [
+            (ReplyFramer.COMMAND, "state", "STANDBY")])
+
+    def test_ping_waits_for_its_pong(self):
+        self.framer.expect("ping", "ping")
+        replies = self.feed(b"noise\nPON", b"G:4\n")
+        self.assertEqual(replies, [(ReplyFramer.PING, "ping", "PONG:4\n")])
+        self.assertEqual(self.framer.unsolicited, 1)
+
+    def test_clear_forgets_queued_commands(self):
+        self.framer.expect("help", "help")
+        self.framer.expect("state", "state")
+        self.assertEqual(self.framer.clear(), ["help", "state"])
+        self.assertEqual(self.framer.next_message(), b"")
+
+
+class FencedReplyFramerTest(FramerTests, unittest.TestCase):
+    def setUp(self):
+        self.framer = ReplyFramer(fence=True)
+
+    def test_commands_are_not_queued(self):
+        self.assertEqual(self.framer.expect("help", "help"),
+                         b"help\nping\n")
+        self.assertEqual(self.framer.expect("state", "state"),
+                         b"state\nping\n")
+        self.assertEqual(self.framer.next_message(), b"")
+
+    def test_reply_split_across_reads(self):
+        self.framer.expect("help", "help")
+        replies = self.feed(b"line one\nli", b"ne two", b"\nPON", b"G:4\n")
+        self.assertEqual(replies, [
+            (ReplyFramer.COMMAND, "help", "line one\nline two\n"),
+            (ReplyFramer.FENCE, None, "PONG:4\n")])
+
+    def test_data_before_pong_is_not_given_to_a_ping(self):
+        self.framer.expect("ping", "ping")
+        replies = self.feed(b"noise\nPONG:4\n")
+        self.assertEqual(replies, [(ReplyFramer.PING, "ping", "PONG:4\n")])
+        self.assertEqual(self.framer.unsolicited, 1)
+
+    def test_data_with_nothing_waiting_is_dropped(self):
+        self.assertEqual(self.feed(b"hello\n"), [])
+        self.framer.expect("state", "state")
+        replies = self.feed(b"STANDBYPONG:4\n")
+        self.assertEqual(replies[0], (ReplyFramer.COMMAND, "state",
+                                      "STANDBY"))
+        self.assertEqual(self.framer.unsolicited, 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,97 @@
+import os
+import re
+import tempfile
+import unittest
+from raw_reader import RawReader
+
+# measurement value=<float> <timestamp>
+LINE = re.compile(rb"^[^ ,=]+ value=-?[0-9.e+-]+ [0-9]+$")
+
+
+class Sink:
+    """Collects the line protocol submitted by the reader"""
+
+    def __init__(self):
+        self.lines = []
+        self.points = 0
+
+    def submit_lines(self, lines, points=1):
+        self.lines.extend(lines.splitlines())
+        self.points += points
+
+    def measurements(self):
+        return [line.split(b" ", 1)[0] for line in self.lines]
+
+    def values(self):
+        return [float(line.split(b" ")[1][len(b"value="):])
+                for line in self.lines]
+
+
+class RawReaderTest(unittest.TestCase):
+    def read(self, text):
+        fd, path = tempfile.mkstemp(suffix=".txt")
+        self.addCleanup(os.unlink, path)
+        with os.fdopen(fd, "wb") as f:
+            f.write(text)
+
+        self.sink = Sink()
+        self.reader = RawReader(path, writer=self.sink)
+        self.reader.run()
+        for line in self.sink.lines:
+            self.assertRegex(line, LINE)
+        return self.sink.measurements()
+
+    def test_bare_values(self):
+        self.assertEqual(self.read(b"1 2\n"), [b"raw_0", b"raw_1"])
+        self.assertEqual(self.sink.values(), [1.0, 2.0])
+
+    def test_named_values(self):
+        self.assertEqual(self.read(b"ax=0.5 ay=-1\n"), [b"ax", b"ay"])
+        self.assertEqual(self.sink.values(), [0.5, -1.0])
+
+    def test_mixed_values(self):
+        self.assertEqual(self.read(b"a=1 b=2.5 7\n"),
+                         [b"a", b"b", b"raw_2"])
+        self.assertEqual(self.sink.values(), [1.0, 2.5, 7.0])
+
+    def test_header(self):
+        self.assertEqual(self.read(b"ax ay\n1 2\n3 4\n"),
+                         [b"ax", b"ay", b"ax", b"ay"])
+        self.assertEqual(self.reader.invalid, 0)
+
+    def test_banner_is_not_a_header(self):
+        self.assertEqual(self.read(b"Initializing MPU6050\n1 2 3\n"),
+                         [b"raw_0", b"raw_1", b"raw_2"])
+        self.assertEqual(self.reader.invalid, 1)
+
+    def test_banner_before_header(self):
+        self.assertEqual(self.read(b"Initializing MPU6050 v2\nax ay\n1 2\n"),
+                         [b"ax", b"ay"])
+
+    def test_empty_name_is_invalid(self):
+        self.assertEqual(self.read(b"=1.0\nx=1 =2\nx=3\n"), [b"x"])
+        self.assertEqual(self.reader.invalid, 2)
+
+    def test_not_finite_is_invalid(self):
+        self.assertEqual(self.read(b"1 nan\nx=inf\n2 3\n"),
+                         [b"raw_0", b"raw_1"])
+        self.assertEqual(self.reader.invalid, 2)
+
+    def test_garbage_is_invalid(self):
+        self.assertEqual(self.read(b"1 2\n\x00\xff 1\n3 4\n"),
+                         [b"raw_0", b"raw_1", b"raw_0", b"raw_1"])
+        self.assertEqual(self.reader.invalid, 1)
+
+    def test_last_line_without_newline(self):
+        self.assertEqual(self.read(b"1\n2"), [b"raw_0", b"raw_0"])
+        self.assertEqual(self.sink.values(), [1.0, 2.0])
+
+    def test_timestamps_increase(self):
+        self.read("".join("%d\n" % i for i in range(100)).encode())
+        times = [int(line.rsplit(b" ", 1)[1]) for line in self.sink.lines]
+        self.assertEqual(times, sorted(set(times)))
+        self.assertEqual(self.sink.points, 100)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,45 @@
+import threading
+import unittest
+from openloop.ring import PacketRing
+
+
+class PacketRingTest(unittest.TestCase):
+    def write(self, ring, payloads):
+        seq, count = ring.reserve(len(payloads))
+        for i, payload in enumerate(payloads[:count]):
+            offset = ring.offset(seq + i)
+            ring.buffer[offset:offset + len(payload)] = payload
+            ring.lengths[(seq + i) % ring.slots] = len(payload)
+        ring.publish(count)
+        return count
+
+    def test_publish_and_read(self):
+        ring = PacketRing(4, 8)
+        self.assertEqual(self.write(ring, [b"a", b"bc"]), 2)
+        self.assertEqual(ring.wait(0), 2)
+        self.assertEqual(bytes(ring.payload(1)), b"bc")
+
+    def test_reserve_stops_at_wrap(self):
+        ring = PacketRing(4, 8)
+        self.write(ring, [b"a", b"b", b"c"])
+        ring.release(3)
+        # Only the last slot is contiguous before the wrap
+        self.assertEqual(ring.reserve(4), (3, 1))
+
+    def test_full_ring_waits_for_consumer(self):
+        ring = PacketRing(2, 8)
+        self.write(ring, [b"a", b"b"])
+        released = threading.Timer(0.05, ring.release, args=(1,))
+        released.start()
+        self.addCleanup(released.cancel)
+        self.assertEqual(ring.reserve(2), (2, 1))
+        self.assertEqual(ring.stats()["full_waits"], 1)
+        self.assertEqual(ring.stats()["high_water"], 2)
+
+    def test_wait_timeout(self):
+        ring = PacketRing(2, 8)
+        self.assertEqual(ring.wait(0, timeout=0.01), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,66 @@
+import json
+import zlib
+import unittest
+from openloop.telemetry import FIELD_NAMES, TelemetryPacket
+from openloop.snapshot import SnapshotPublisher
+
+
+def packet(**values):
+    fields = dict.fromkeys(FIELD_NAMES, 0)
+    fields.update(values)
+    return TelemetryPacket(**fields)
+
+
+class Server:
+    state = None
+
+
+class SnapshotPublisherTest(unittest.TestCase):
+    def setUp(self):
+        self.server = Server()
+        self.publisher = SnapshotPublisher(self.server, max_rate=0)
+
+    def test_empty(self):
+        body, _, _ = self.publisher.latest().encode()
+        self.assertEqual(body, b"{}")
+
+    def test_new_state_new_version(self):
+        self.server.state = packet(velocity_x=1.0)
+        first = self.publisher.latest()
+        self.assertIs(self.publisher.latest(), first)
+
+        self.server.state = packet(velocity_x=2.0)
+        second = self.publisher.latest()
+        self.assertEqual(second.version, first.version + 1)
+        self.assertNotEqual(second.encode()[1], first.encode()[1])
+
+    def test_rate_limit(self):
+        publisher = SnapshotPublisher(self.server, max_rate=0.001)
+        self.server.state = packet(velocity_x=1.0)
+        first = publisher.latest()
+        self.server.state = packet(velocity_x=2.0)
+        self.assertIs(publisher.latest(), first)
+
+    def test_fields(self):
+        self.server.state = packet(velocity_x=1.5, state=4)
+        snapshot = self.publisher.latest()
+        body, tag, gzipped = snapshot.encode(("state", "velocity_x"))
+        self.assertEqual(json.loads(body.decode()),
+                         {"state": 4, "velocity_x": 1.5})
+        self.assertFalse(gzipped)
+        self.assertNotEqual(tag, snapshot.encode()[1])
+        self.assertIs(snapshot.encode(("state", "velocity_x"))[0], body)
+        self.assertRaises(KeyError, snapshot.encode, ("nope",))
+
+    def test_gzip(self):
+        self.server.state = packet()
+        snapshot = self.publisher.latest()
+        body, tag, _ = snapshot.encode()
+        gzipped, gzip_tag, compressed = snapshot.encode(compress=True)
+        self.assertTrue(compressed)
+        self.assertEqual(zlib.decompress(gzipped, 31), body)
+        self.assertEqual(gzip_tag, tag + "-gz")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,112 @@
+import os
+import unittest
+from openloop import telemetry
+from openloop.pod import PodState
+from openloop.spacex import PACKET, SpaceXEncoder, SpaceXForwarder, \
+    SpaceXStatus, STATUS_BY_STATE
+
+CAPTURE = os.path.join(os.path.dirname(__file__), "assets",
+                       "hyperloop-telemetry.log.bin")
+TEAM_ID = 11
+
+
+class SpaceXEncoderTest(unittest.TestCase):
+    def setUp(self):
+        with open(CAPTURE, 'rb') as f:
+            packet = telemetry.decode(f.read(telemetry.PACKET_LENGTH))
+        self.packet = packet._replace(
+            state=PodState.PUSHING, acceleration_x=9.81, position_x=100.0,
+            velocity_x=25.5, voltage_0=48.2, current_0=-12.5,
+            power_thermo_0=31.4, frame_thermo=22.0)
+        self.encoder = SpaceXEncoder(TEAM_ID)
+
+    def unpack(self, packet):
+        return PACKET.unpack(self.encoder.encode(packet))
+
+    def test_known_values(self):
+        self.assertEqual(bytes(self.encoder.encode(self.packet)),
+                         PACKET.pack(TEAM_ID, SpaceXStatus.PUSHING, 981,
+                                     10000, 2550, 48200, -12500, 314, 220,
+                                     3))
+
+    def test_status(self):
+        expected = {
+            PodState.UNKNOWN: SpaceXStatus.FAULT,
+            PodState.STANDBY: SpaceXStatus.IDLE,
+            PodState.ARMED: SpaceXStatus.READY,
+            PodState.PUSHING: SpaceXStatus.PUSHING,
+            PodState.COASTING: SpaceXStatus.COASTING,
+            PodState.BRAKING: SpaceXStatus.BRAKING,
+            PodState.EMERGENCY: SpaceXStatus.FAULT,
+            PodState.SHUTDOWN: SpaceXStatus.IDLE,
+        }
+        for state, status in expected.items():
+            # Packets carry the raw state number
+            self.assertEqual(self.unpack(self.packet._replace(
+                state=int(state)))[1], status, state)
+        self.assertEqual(len(STATUS_BY_STATE), len(PodState))
+        self.assertEqual(self.unpack(self.packet._replace(state=99))[1],
+                         SpaceXStatus.FAULT)
+
+    def test_no_state_is_idle(self):
+        self.assertEqual(bytes(self.encoder.encode(None)),
+                         PACKET.pack(TEAM_ID, SpaceXStatus.IDLE,
+                                     0, 0, 0, 0, 0, 0, 0, 0))
+
+    def test_stripes(self):
+        for position, stripes in ((0.0, 0), (30.47, 0), (30.48, 1),
+                                  (1000.0, 32)):
+            packet = self.packet._replace(position_x=position)
+            self.assertEqual(self.unpack(packet)[-1], stripes, position)
+        encoder = SpaceXEncoder(TEAM_ID, stripe_spacing=10.0)
+        self.assertEqual(PACKET.unpack(encoder.encode(self.packet))[-1], 10)
+
+    def test_negative_position_has_no_stripes(self):
+        values = self.unpack(self.packet._replace(position_x=-5.0))
+        self.assertEqual(values[3], -500)
+        self.assertEqual(values[-1], 0)
+
+    def test_not_finite_is_zero(self):
+        packet = self.packet._replace(velocity_x=float('nan'),
+                                      voltage_0=float('inf'))
+        self.assertEqual(self.unpack(packet),
+                         (TEAM_ID, SpaceXStatus.PUSHING, 981, 10000, 0, 0,
+                          -12500, 314, 220, 3))
+        values, stripes = self.encoder.sanitize(
+            self.packet._replace(position_x=float('nan')))
+        self.assertEqual(values[1], 0)
+        self.assertEqual(stripes, 0)
+
+    def test_overflow_is_zero(self):
+        packet = self.packet._replace(acceleration_x=1e8,
+                                      current_0=-3e6)
+        self.assertEqual(self.unpack(packet),
+                         (TEAM_ID, SpaceXStatus.PUSHING, 0, 10000, 2550,
+                          48200, 0, 314, 220, 3))
+
+    def test_buffer_is_reused(self):
+        first = self.encoder.encode(self.packet)
+        self.assertIs(self.encoder.encode(None), first)
+
+
+class SpaceXForwarderTest(unittest.TestCase):
+    def test_step(self):
+        sent = []
+        server = type("Server", (), {})()
+        server.make_spacex_packet = lambda: b"packet"
+        server.send_to_spacex = sent.append
+
+        forwarder = SpaceXForwarder(server, 1.0)
+        forwarder.schedule.deadline = 10.0
+        forwarder.step(10.25)
+        self.assertEqual(sent, [b"packet"])
+        self.assertEqual(forwarder.stats()["sent"], 1)
+        self.assertEqual(forwarder.stats()["jitter"]["max"], 0.25)
+
+        server.send_to_spacex = None
+        forwarder.step(11.0)
+        self.assertEqual(forwarder.stats()["errors"], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,137 @@
+import os
+import shutil
+import tempfile
+import unittest
+from openloop.spool import Spool, REJECTED
+
+
+class PostError(Exception):
+    """Stands in for InfluxDBClientError, which carries the HTTP code"""
+
+    def __init__(self, code=None):
+        super().__init__("HTTP %s" % code)
+        self.code = code
+
+
+class Influx:
+    """Collects the bodies posted to it, failing with the queued errors
+    first"""
+
+    def __init__(self):
+        self.bodies = []
+        self.errors = []
+        self.databases = 0
+
+    def post(self, body):
+        if self.errors:
+            raise self.errors.pop(0)
+        self.bodies.append(body)
+
+    def create_database(self):
+        if self.errors:
+            raise self.errors.pop(0)
+        self.databases += 1
+
+    def lines(self):
+        return b"".join(self.bodies).splitlines()
+
+
+class SpoolTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.influx = Influx()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def spool(self, **kwargs):
+        kwargs.setdefault("retry_interval", 0)
+        return Spool(self.directory, self.influx.post, **kwargs)
+
+    def drain(self, spool, attempts=20):
+        """Drains like Spool.run until nothing is left, or attempts run
+        out"""
+        for _ in range(attempts):
+            if spool.backlog() == 0:
+                return
+            if not spool.prepared:
+                try:
+                    spool.prepare()
+                    spool.prepared = True
+                except Exception:
+                    continue
+            spool.drain_once(spool.read_segment == spool.write_segment)
+
+    def test_drains_in_order(self):
+        spool = self.spool(drain_size=16)
+        for i in range(10):
+            spool.append(("m value=%d\n" % i).encode())
+        self.drain(spool, 100)
+        self.assertEqual(self.influx.lines(),
+                         [("m value=%d" % i).encode() for i in range(10)])
+        self.assertEqual(spool.stats()["backlog_bytes"], 0)
+
+    def test_replays_after_restart(self):
+        spool = self.spool()
+        spool.append(b"m value=1\n")
+        spool.append(b"m value=2\n")
+        spool.drain_once(True)
+        spool.append(b"m value=3\n")
+        spool.append(b"m value=4\n")
+        spool.write_file.close()
+
+        # Reopened, only what was not drained is posted again
+        spool = self.spool()
+        self.drain(spool)
+        self.assertEqual(self.influx.lines(), [b"m value=1", b"m value=2",
+                                               b"m value=3", b"m value=4"])
+
+    def test_retries_until_influx_is_back(self):
+        spool = self.spool()
+        spool.append(b"m value=1\n")
+        self.influx.errors = [ConnectionError(), PostError(500)]
+        self.drain(spool)
+        self.assertEqual(self.influx.lines(), [b"m value=1"])
+        self.assertEqual(spool.stats()["failures"], 2)
+
+    def test_creates_database_before_draining(self):
+        spool = self.spool(prepare=self.influx.create_database)
+        spool.append(b"m value=1\n")
+        self.influx.errors = [ConnectionError()]
+        self.drain(spool)
+        self.assertEqual(self.influx.databases, 1)
+        self.assertEqual(self.influx.lines(), [b"m value=1"])
+
+        # Dropped while ODS was running
+        spool.append(b"m value=2\n")
+        self.influx.errors = [PostError(404)]
+        self.drain(spool)
+        self.assertEqual(self.influx.databases, 2)
+        self.assertEqual(self.influx.lines(), [b"m value=1", b"m value=2"])
+
+    def test_quarantines_rejected_chunks(self):
+        spool = self.spool()
+        spool.append(b" value=1\n")
+        self.influx.errors = [PostError(400)]
+        self.drain(spool)
+        spool.append(b"m value=2\n")
+        self.drain(spool)
+
+        self.assertEqual(self.influx.lines(), [b"m value=2"])
+        self.assertEqual(spool.stats()["rejected"], 1)
+        with open(os.path.join(self.directory, REJECTED), "rb") as f:
+            self.assertEqual(f.read(), b" value=1\n")
+
+    def test_moves_through_segments(self):
+        spool = self.spool(segment_size=20)
+        for i in range(10):
+            spool.append(("m value=%d\n" % i).encode())
+        self.drain(spool, 100)
+        self.assertEqual(len(self.influx.lines()), 10)
+        # Drained segments are deleted
+        self.assertGreater(spool.read_segment, 0)
+        self.assertEqual(spool.segments()[0], spool.read_segment)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,69 @@
+import json
+import unittest
+from openloop.telemetry import FIELD_NAMES, TelemetryPacket, \
+    CLAMP_ENG_0_MASK
+from openloop.stream import StreamHub, STREAM_FIELDS
+
+
+def packet(**values):
+    fields = dict.fromkeys(FIELD_NAMES, 0)
+    fields.update(values)
+    return TelemetryPacket(**fields)
+
+
+def data(group):
+    """Returns the JSON carried by group's latest frame"""
+    lines = group.frame.decode().splitlines()
+    return json.loads(lines[1][len("data: "):])
+
+
+class StreamGroupTest(unittest.TestCase):
+    def setUp(self):
+        self.hub = StreamHub(None)
+
+    def test_deltas(self):
+        group = self.hub.subscribe(["velocity_x", "state"])
+        group.tick(packet(velocity_x=1.0, state=4))
+        self.assertEqual(data(group), {"velocity_x": 1.0, "state": 4})
+        self.assertEqual(group.tick(packet(velocity_x=1.0, state=4)), 0)
+        group.tick(packet(velocity_x=2.0, state=4))
+        self.assertEqual(data(group), {"velocity_x": 2.0})
+
+    def test_single_field(self):
+        group = self.hub.subscribe(["velocity_x"])
+        group.tick(packet(velocity_x=1.0))
+        self.assertEqual(data(group), {"velocity_x": 1.0})
+
+    def test_solenoids(self):
+        self.assertIn("SOL_CLAMP_ENG_0", STREAM_FIELDS)
+        group = self.hub.subscribe(["SOL_CLAMP_ENG_0", "state"])
+        group.tick(packet(solenoid_mask=CLAMP_ENG_0_MASK))
+        self.assertEqual(data(group), {"SOL_CLAMP_ENG_0": 1, "state": 0})
+        group.tick(packet(solenoid_mask=0))
+        self.assertEqual(data(group), {"SOL_CLAMP_ENG_0": 0})
+
+    def test_all_fields_match_state(self):
+        group = self.hub.subscribe([])
+        state = packet(solenoid_mask=CLAMP_ENG_0_MASK)
+        group.tick(state)
+        self.assertEqual(data(group), state.as_dict())
+
+    def test_nan(self):
+        group = self.hub.subscribe(["velocity_x", "hp_pressure"])
+        group.tick(packet(velocity_x=float("nan"), hp_pressure=1.0))
+        self.assertIn(b'"velocity_x":null', group.frame)
+        self.assertEqual(group.tick(packet(velocity_x=float("nan"),
+                                           hp_pressure=1.0)), 0)
+        group.tick(packet(velocity_x=float("nan"), hp_pressure=2.0))
+        self.assertEqual(data(group), {"hp_pressure": 2.0})
+
+        with group.cond:
+            _, snapshot = group.snapshot()
+        self.assertIn(b'"velocity_x":null', snapshot)
+
+    def test_unknown_field(self):
+        self.assertRaises(KeyError, self.hub.subscribe, ["nope"])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,115 @@
+import os
+import struct
+import unittest
+from openloop import telemetry
+from openloop.telemetry import PACKET_LENGTH
+
+CAPTURE = os.path.join(os.path.dirname(__file__), "assets",
+                       "hyperloop-telemetry.log.bin")
+
+# The fields as ods.py parsed them before the schema, which left out size
+# and power_thermo_3
+LEGACY_FORMAT = "<BHBIQ50f"
+LEGACY_MASKS = (
+    ("SOL_SKATE_0", 0x0001),
+    ("SOL_SKATE_1", 0x0002),
+    ("SOL_SKATE_2", 0x0004),
+    ("SOL_SKATE_3", 0x0008),
+    ("SOL_CLAMP_ENG_0", 0x0010),
+    ("SOL_CLAMP_REL_0", 0x0020),
+    ("SOL_CLAMP_ENG_1", 0x0040),
+    ("SOL_CLAMP_REL_1", 0x0080),
+    ("PACK_A_ENG", 0x0800),
+    ("PACK_B_ENG", 0x1000),
+    ("SOL_HPFIL", 0x0100),
+    ("SOL_VENT", 0x0200),
+    ("pusher_present", 0x0400),
+)
+
+
+def legacy_dict(msg):
+    values = dict(zip(telemetry.FIELD_NAMES,
+                      struct.unpack(LEGACY_FORMAT, msg)))
+    del values["size"]
+    del values["power_thermo_3"]
+    for name, mask in LEGACY_MASKS:
+        values[name] = 1 if values["solenoid_mask"] & mask else 0
+    return values
+
+
+class TelemetryTest(unittest.TestCase):
+    def setUp(self):
+        with open(CAPTURE, 'rb') as f:
+            self.capture = f.read()
+        self.first = self.capture[:PACKET_LENGTH]
+
+    def test_decode(self):
+        packet = telemetry.decode(self.first)
+        self.assertEqual(PACKET_LENGTH, 216)
+        self.assertEqual(packet.version, 2)
+        self.assertEqual(packet.size, 240)
+        self.assertEqual(packet.state, 1)
+        self.assertEqual(packet.solenoid_mask, 80)
+        self.assertEqual(packet.timestamp, 1493616224786707)
+        self.assertEqual(telemetry.TELEMETRY_STRUCT.pack(*packet), self.first)
+
+    def test_decode_from(self):
+        offset = 240 * 3
+        self.assertEqual(telemetry.decode_from(self.capture, offset),
+                         telemetry.decode(self.capture[offset:
+                                                       offset + 216]))
+        self.assertEqual(telemetry.decode_from(memoryview(self.capture)),
+                         telemetry.decode(self.first))
+
+    def test_wrong_length(self):
+        with self.assertRaises(struct.error):
+            telemetry.decode(self.first[:-1])
+        with self.assertRaises(struct.error):
+            telemetry.decode(self.first + b"\0")
+        with self.assertRaises(struct.error):
+            telemetry.decode_from(self.first[:-1])
+        # Only the packet at offset is read from a longer buffer
+        self.assertEqual(telemetry.decode_from(self.first + b"\0"),
+                         telemetry.decode(self.first))
+
+    def test_record_stride(self):
+        self.assertEqual(telemetry.record_stride(self.capture), 240)
+        self.assertEqual(telemetry.record_stride(self.first * 3),
+                         PACKET_LENGTH)
+        # A trailing partial record means the size does not tile the buffer
+        self.assertEqual(telemetry.record_stride(self.capture + b"\0"),
+                         PACKET_LENGTH)
+        self.assertEqual(telemetry.record_stride(b"\2"), PACKET_LENGTH)
+
+    def test_iter_packets(self):
+        packets = list(telemetry.iter_packets(self.capture))
+        self.assertEqual(len(packets), 1146)
+        self.assertTrue(all(len(packet) == PACKET_LENGTH
+                            for packet in packets))
+        self.assertEqual(bytes(packets[1]), self.capture[240:456])
+
+        unpadded = b"".join(bytes(packet) for packet in packets[:3])
+        self.assertEqual([bytes(packet) for packet
+                          in telemetry.iter_packets(unpadded + b"\0" * 10)],
+                         [bytes(packet) for packet in packets[:3]])
+
+    def test_as_dict_matches_legacy(self):
+        for packet in telemetry.iter_packets(self.capture):
+            decoded = telemetry.decode(packet)
+            expected = legacy_dict(packet)
+            expected["size"] = decoded.size
+            expected["power_thermo_3"] = decoded.power_thermo_3
+            self.assertEqual(decoded.as_dict(), expected)
+
+    def test_to_point(self):
+        packet = telemetry.decode(self.first)
+        point = packet.to_point({"pod": "10.0.0.2"})
+        self.assertEqual(point["measurement"], telemetry.MEASUREMENT)
+        self.assertEqual(point["tags"], {"pod": "10.0.0.2"})
+        self.assertEqual(point["time"], 1493616224786707000)
+        self.assertEqual(point["fields"], packet.as_dict())
+        self.assertEqual(packet.to_point()["tags"], {})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,48 @@
+import signal
+import socket
+import unittest
+from openloop.ring import PacketRing
+from openloop.udp import DatagramReceiver
+
+
+class DatagramReceiverTest(unittest.TestCase):
+    def setUp(self):
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.bind(("127.0.0.1", 0))
+        self.addCleanup(self.sock.close)
+        self.sender = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sender.bind(("127.0.0.1", 0))
+        self.addCleanup(self.sender.close)
+        self.ring = PacketRing(16)
+
+    def test_receive(self):
+        receiver = DatagramReceiver(self.sock, self.ring, 8)
+        self.sender.sendto(b"one", self.sock.getsockname())
+        self.sender.sendto(b"two", self.sock.getsockname())
+        received = 0
+        while received < 2:
+            received += receiver.receive()
+        self.assertEqual(received, 2)
+        self.assertEqual(bytes(self.ring.payload(1)), b"two")
+        self.assertEqual(self.ring.addrs[0], self.sender.getsockname())
+
+    @unittest.skipUnless(hasattr(signal, "setitimer"), "needs setitimer")
+    def test_interrupted_receive_is_retried(self):
+        receiver = DatagramReceiver(self.sock, self.ring, 8)
+
+        def interrupt(signum, frame):
+            # Arrives while receive() is blocked, then the datagram does
+            self.sender.sendto(b"late", self.sock.getsockname())
+
+        previous = signal.signal(signal.SIGALRM, interrupt)
+        self.addCleanup(signal.signal, signal.SIGALRM, previous)
+        signal.siginterrupt(signal.SIGALRM, True)
+        signal.setitimer(signal.ITIMER_REAL, 0.05)
+        self.addCleanup(signal.setitimer, signal.ITIMER_REAL, 0)
+
+        self.assertEqual(receiver.receive(), 1)
+        self.assertEqual(bytes(self.ring.payload(0)), b"late")
+
+
+if __name__ == '__main__':
+    unittest.main()
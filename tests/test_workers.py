@@ -0,0 +1,81 @@
+import os
+import unittest
+from ods import ODSServer
+from openloop import telemetry
+from openloop.workers import WorkerPool
+
+CAPTURE = os.path.join(os.path.dirname(__file__), "assets",
+                       "hyperloop-telemetry.log.bin")
+
+
+def worker_stats(received, invalid, errors=0):
+    return {"pid": 1, "received": received, "invalid": invalid,
+            "errors": errors, "socket": {}, "writer": {}}
+
+
+class WorkerPoolTest(unittest.TestCase):
+    def setUp(self):
+        self.server = ODSServer(("127.0.0.1", 0), 0, ("127.0.0.1", 0), None)
+        self.addCleanup(self.server.spacex_sock.close)
+        # Never started, merge() is driven directly
+        self.pool = WorkerPool(2, None)
+        with open(CAPTURE, 'rb') as f:
+            self.packet = telemetry.decode(f.read(telemetry.PACKET_LENGTH))
+
+    def update(self, timestamp, received, invalid, first_seen, last_seen,
+               addr=("10.0.0.2", 4000)):
+        return (self.packet._replace(timestamp=timestamp), addr, received,
+                invalid, first_seen, last_seen)
+
+    def test_merges_counters(self):
+        self.pool.merge(self.server, 0, {
+            "10.0.0.2": self.update(1000, 10, 1, 50.0, 60.0)
+        }, worker_stats(12, 1))
+        self.pool.merge(self.server, 1, {
+            "10.0.0.2": self.update(2000, 5, 2, 40.0, 70.0,
+                                    ("10.0.0.2", 4001)),
+            "10.0.0.3": self.update(1500, 7, 0, 45.0, 65.0,
+                                    ("10.0.0.3", 4000))
+        }, worker_stats(12, 2, errors=1))
+
+        self.assertEqual(self.server.received, 24)
+        self.assertEqual(self.server.invalid, 3)
+        self.assertEqual(self.server.errors, 1)
+
+        pod = self.server.pods["10.0.0.2"]
+        self.assertEqual((pod.received, pod.invalid), (15, 3))
+        self.assertEqual(pod.first_seen, 40.0)
+        self.assertEqual(pod.last_seen, 70.0)
+        self.assertEqual(pod.state.timestamp, 2000)
+        self.assertEqual(pod.addr, ("10.0.0.2", 4001))
+        self.assertEqual(self.server.pods["10.0.0.3"].received, 7)
+        # The newest packet from any pod
+        self.assertEqual(self.server.state.timestamp, 2000)
+        self.assertEqual([worker["index"] for worker in self.pool.stats()],
+                         [0, 1])
+
+    def test_later_update_replaces_counts(self):
+        self.pool.merge(self.server, 0, {
+            "10.0.0.2": self.update(1000, 10, 1, 50.0, 60.0)
+        }, worker_stats(10, 1))
+        self.pool.merge(self.server, 0, {
+            "10.0.0.2": self.update(1100, 20, 1, 50.0, 61.0)
+        }, worker_stats(20, 1))
+        self.assertEqual(self.server.received, 20)
+        self.assertEqual(self.server.pods["10.0.0.2"].received, 20)
+
+    def test_older_state_is_not_published(self):
+        self.pool.merge(self.server, 0, {
+            "10.0.0.2": self.update(2000, 10, 0, 50.0, 60.0)
+        }, worker_stats(10, 0))
+        self.pool.merge(self.server, 1, {
+            "10.0.0.2": self.update(1000, 5, 0, 40.0, 70.0)
+        }, worker_stats(5, 0))
+        pod = self.server.pods["10.0.0.2"]
+        self.assertEqual(pod.state.timestamp, 2000)
+        self.assertEqual(pod.last_seen, 60.0)
+        self.assertEqual(pod.received, 15)
+
+
+if __name__ == '__main__':
+    unittest.main()